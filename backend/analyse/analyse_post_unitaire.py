@@ -5,6 +5,13 @@ Analyse en boucle de posts Bluesky (unitaire)
 ────────────────────────────────────────────────────────────────────────────
 Entrez successivement les URLs de posts à analyser. Tapez « q » (ou Entrée
 sur une ligne vide) pour quitter.
+
+Importé par l’API (backend/main.py) : rien n’est initialisé à l’import. Le
+client Bluesky (get_client) et chaque modèle (get_pipe) le sont au premier
+usage, ou en fond par prechauffer_en_fond() ; etat_preparation() alimente
+le endpoint /ready. analyser_post ne lit que toxicité et émotions : seuls
+ces deux modèles (MODELES_UTILISES) sont chargés, les quatre autres ne le
+sont que si on les demande (get_pipe, pipe_topic…).
 ────────────────────────────────────────────────────────────────────────────
 """
 
@@ -12,18 +19,13 @@ from __future__ import annotations
 import os
 import re
 import sys
+import time
 import shutil
 import textwrap
+import threading
 from pathlib import Path
 from datetime import datetime, timezone
-from atproto import Client
 from dotenv import load_dotenv
-import torch
-from transformers import (
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-    pipeline
-)
 
 # ╭────────────────── 1. Auth Bluesky ──────────────────╮
 # Construire le chemin vers backend/.env10 à partir de ce fichier
@@ -31,17 +33,47 @@ BASE_DIR = Path(__file__).parent.parent  # remonte de 'analyse/' vers 'backend/'
 ENV_PATH = BASE_DIR / ".env10"
 load_dotenv(dotenv_path=str(ENV_PATH))
 
-HANDLE, PASSWORD = os.getenv("BLUESKY_HANDLE"), os.getenv("BLUESKY_PASSWORD")
-if not HANDLE or not PASSWORD:
-    sys.exit("BLUESKY_HANDLE / BLUESKY_PASSWORD manquants")
+try:
+    from ..trends.client_bluesky import creer_client
+except ImportError:  # exécution directe du fichier
+    sys.path.append(str(BASE_DIR / "trends"))
+    from client_bluesky import creer_client
 
-client = Client()
-client.login(HANDLE, PASSWORD)
 
-# ╭────────────────── 2. Modèles locaux ────────────────╮
-from pathlib import Path
-import torch
+class ServiceIndisponible(RuntimeError):
+    """Client Bluesky ou modèle impossible à initialiser (503 côté API)."""
 
+
+# État d'initialisation, lu par etat_preparation() : "non_initialise", "chargement",
+# "pret" ou "erreur : …", pour le client et pour chaque modèle
+_etat = {"client_bluesky": "non_initialise"}
+_client = None
+_verrou_client = threading.Lock()
+
+def get_client():
+    """
+    Client Bluesky, connecté au premier appel (login réseau) ; un échec est
+    retenté à l'appel suivant. BLUESKY_CLIENT_MODE=replay : cassette, sans
+    identifiants ni réseau.
+    """
+    global _client
+    if _client is None:
+        with _verrou_client:
+            if _client is None:
+                handle, password = os.getenv("BLUESKY_HANDLE"), os.getenv("BLUESKY_PASSWORD")
+                if os.getenv("BLUESKY_CLIENT_MODE", "live").lower() != "replay" and (not handle or not password):
+                    _etat["client_bluesky"] = "erreur : identifiants manquants"
+                    raise ServiceIndisponible("BLUESKY_HANDLE / BLUESKY_PASSWORD manquants")
+                _etat["client_bluesky"] = "chargement"
+                try:
+                    _client = creer_client(handle, password)
+                except Exception as e:
+                    _etat["client_bluesky"] = f"erreur : {e}"
+                    raise ServiceIndisponible(f"Connexion Bluesky impossible : {e}") from e
+                _etat["client_bluesky"] = "pret"
+    return _client
+
+# ╭────────────────── 2. Modèles locaux ────────────────╮
 # 2.1. Construire la racine du projet (jusqu’à 06_PIGMALION_V06/)
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 #    - __file__ est ".../backend/analyse/01_ANALYSE_POST_UNITAIRE.py"
@@ -67,8 +99,30 @@ FAKENEWS_PATH= MODELS_DIR / "ghanashyamvtatti_roberta-fake-news"
 EMO_PATH     = MODELS_DIR / "j-hartmann_emotion-english-distilroberta-base"
 TOX_PATH     = MODELS_DIR / "unitary_toxic-bert"
 
-# 2.4. Détecter si on a un GPU disponible (pour le pipeline Hugging Face)
-device_id = 0 if torch.cuda.is_available() else -1
+# 2.4. Modèles par nom court : (dossier, activation). analyser_post ne lit que
+#      MODELES_UTILISES ; les autres ne sont chargés que sur demande explicite
+MODELES = {
+    "topic":    (TOPIC_PATH,    "softmax"),  # ex. topic classification
+    "irony":    (IRONY_PATH,    "softmax"),  # ex. irony detection
+    "senti":    (SENTI_PATH,    "softmax"),  # ex. sentiment analysis
+    "fakenews": (FAKENEWS_PATH, "softmax"),  # ex. fake-news detection
+    "emo":      (EMO_PATH,      "softmax"),  # ex. emotion classification
+    "tox":      (TOX_PATH,      "sigmoid"),  # ex. toxicité
+}
+MODELES_UTILISES = ("tox", "emo")
+
+def device_id() -> int:
+    """GPU si disponible (convention des pipelines : 0 = GPU, -1 = CPU)."""
+    import torch
+    return 0 if torch.cuda.is_available() else -1
+
+# 2.5. Backend d'inférence : "torch" (pipeline Hugging Face), "onnx" ou "onnx_int8"
+#      (ONNX Runtime, voir trends/inference_onnx.py ; export au premier lancement)
+BACKEND_INFERENCE = os.getenv("PIGMALION_BACKEND_INFERENCE", "torch").lower()
+
+# 2.6. Serveur de modèles partagé (trends/serveur_modeles.py) : si l'URL est définie,
+#      aucun modèle n'est chargé ici, les textes partent au serveur en priorité interactive
+SERVEUR_MODELES = os.getenv("PIGMALION_SERVEUR_MODELES")
 
 def load_pipe(path: Path, fn: str):
     """
@@ -76,26 +130,176 @@ def load_pipe(path: Path, fn: str):
     - path : objet Path pointant vers un dossier contenant config.json + pytorch_model.bin (ou équivalent)
     - fn   : nom de la fonction d'activation ('sigmoid', 'softmax', etc.)
     """
+    if SERVEUR_MODELES:
+        if str(BASE_DIR / "trends") not in sys.path:
+            sys.path.append(str(BASE_DIR / "trends"))
+        from client_modeles import ClientModeles
+        client_modeles = ClientModeles(SERVEUR_MODELES, timeout=30)
+        # Le serveur connaît chaque modèle par le nom de son dossier ; l'activation
+        # de MODELES est imposée comme en local (function_to_apply)
+        return lambda texte: [[{"label": lbl, "score": score} for lbl, score in
+                               client_modeles.predire(path.name, [texte], "interactif", fn)[0].items()]]
+
     if not path.exists() or not path.is_dir():
         raise FileNotFoundError(f"Dossier de modèle introuvable : {path}")
 
+    if BACKEND_INFERENCE != "torch":
+        # inference_onnx importe ses voisins de trends/ par leur nom
+        if str(BASE_DIR / "trends") not in sys.path:
+            sys.path.append(str(BASE_DIR / "trends"))
+        from inference_onnx import charger_modele
+        modele = charger_modele(str(path), device_id(), BACKEND_INFERENCE, activation=fn)
+        # Même forme de sortie que le pipeline : [[{"label": ..., "score": ...}, ...]]
+        return lambda texte: [[{"label": lbl, "score": score}
+                               for lbl, score in modele.predire_lot([texte])[0].items()]]
+
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+    # Poids safetensors lus par mmap si le dossier a été préparé (trends/artefacts_modeles.py)
+    if str(BASE_DIR / "trends") not in sys.path:
+        sys.path.append(str(BASE_DIR / "trends"))
+    from artefacts_modeles import options_chargement
     return pipeline(
         "text-classification",
-        model     = AutoModelForSequenceClassification.from_pretrained(str(path), local_files_only=True),
+        model     = AutoModelForSequenceClassification.from_pretrained(str(path), local_files_only=True,
+                                                                       **options_chargement(str(path))),
         tokenizer = AutoTokenizer.from_pretrained(str(path), local_files_only=True),
         top_k     = None,
         function_to_apply = fn,
-        device    = device_id
+        device    = device_id()
     )
 
-print("⌛  Chargement des modèles …")
-pipe_topic    = load_pipe(TOPIC_PATH,    "softmax")  # ex. topic classification
-pipe_irony    = load_pipe(IRONY_PATH,    "softmax")  # ex. irony detection
-pipe_senti    = load_pipe(SENTI_PATH,    "softmax")  # ex. sentiment analysis
-pipe_fakenews = load_pipe(FAKENEWS_PATH, "softmax")  # ex. fake-news detection
-pipe_emo      = load_pipe(EMO_PATH,      "softmax")  # ex. emotion classification
-pipe_tox      = load_pipe(TOX_PATH,      "sigmoid")  # ex. toxicité
-print("✅  Modèles prêts.\n")
+_pipes = {}
+_verrous_pipes = {nom: threading.Lock() for nom in MODELES}
+
+def get_pipe(nom: str):
+    """Pipeline du modèle `nom` (clé de MODELES), chargé au premier appel."""
+    pipe = _pipes.get(nom)
+    if pipe is None:
+        with _verrous_pipes[nom]:
+            pipe = _pipes.get(nom)
+            if pipe is None:
+                path, fn = MODELES[nom]
+                _etat[nom] = "chargement"
+                print(f"⌛  Chargement de {path.name} ({SERVEUR_MODELES or BACKEND_INFERENCE}) …")
+                t0 = time.time()
+                try:
+                    pipe = load_pipe(path, fn)
+                except Exception as e:
+                    _etat[nom] = f"erreur : {e}"
+                    raise ServiceIndisponible(f"Modèle {path.name} indisponible : {e}") from e
+                _pipes[nom] = pipe
+                _etat[nom] = "pret"
+                print(f"✅  {path.name} prêt en {time.time() - t0:.1f}s.")
+    return pipe
+
+# 2.7. Cache des scores (trends/cache_inference.py) : LRU en mémoire adossé à un
+#      fichier SQLite local ; PIGMALION_CACHE_INFERENCE=postgres utilise la table
+#      analyse_resultat_hash de 05, "memoire" désactive la persistance. La clé est le
+#      hash du texte envoyé aux modèles : les scores de 05 ne servent à l'API qu'avec
+#      PIGMALION_TEXTE_MODELES=post_clean (voir nettoyer)
+if str(BASE_DIR / "trends") not in sys.path:
+    sys.path.append(str(BASE_DIR / "trends"))
+from cache_inference import (
+    CacheInference, StockagePostgres, StockageSqlite, TAILLE_LRU, activation_modele, cle_modele,
+    revision_modele
+)
+from dedup_contenu import nettoyer_texte
+
+MODE_CACHE = os.getenv("PIGMALION_CACHE_INFERENCE", "sqlite").lower()
+
+def creer_cache() -> CacheInference:
+    # Le cache ne doit jamais faire échouer /analyze : stockage injoignable → mémoire seule
+    try:
+        if MODE_CACHE == "postgres":
+            import psycopg2
+            stockage = StockagePostgres(psycopg2.connect(
+                host=os.getenv("DB_HOST"), port=os.getenv("DB_PORT"), dbname=os.getenv("DB_NAME"),
+                user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD")))
+        elif MODE_CACHE == "sqlite":
+            stockage = StockageSqlite(os.getenv("PIGMALION_CACHE_SQLITE",
+                                                str(BASE_DIR / "cache" / "inference.sqlite3")))
+        else:
+            stockage = None
+    except Exception as e:
+        print(f"⚠️  Cache d'inférence {MODE_CACHE} indisponible ({e}), cache en mémoire seule")
+        stockage = None
+    return CacheInference(stockage, int(os.getenv("PIGMALION_CACHE_TAILLE", TAILLE_LRU)),
+                          max_lignes=int(os.getenv("PIGMALION_CACHE_MAX_LIGNES", 1_000_000)))
+
+_cache = None
+_verrou_cache = threading.Lock()
+
+def get_cache() -> CacheInference:
+    global _cache
+    if _cache is None:
+        with _verrou_cache:
+            if _cache is None:
+                _cache = creer_cache()
+    return _cache
+
+def scores_modele(nom: str, texte: str) -> dict:
+    """
+    {label: score} du modèle pour `texte`, servi par le cache
+    (modèle, révision, hash du texte) ; le modèle n'est chargé (et l'inférence
+    faite) qu'en cas de défaut.
+    """
+    path, fn = MODELES[nom]
+    cache_scores = get_cache()
+    modele = cle_modele(path.name, revision_modele(str(path)), BACKEND_INFERENCE,
+                        activation_modele(str(path), fn))
+    empreinte, resultat = cache_scores.get_texte(modele, texte)
+    if resultat is None:
+        t0 = time.time()
+        scores = {p["label"].lower(): float(p["score"]) for p in get_pipe(nom)(texte)[0]}
+        pred = max(scores, key=scores.get)
+        resultat = {"label_predominant": pred, "score_predominant": scores[pred],
+                    "scores": scores, "duree": round(time.time() - t0, 3)}
+        cache_scores.put(modele, empreinte, resultat)
+    return resultat["scores"]
+
+# 2.8. Préchauffage et état de préparation (endpoint /ready de l'API)
+def prechauffer(modeles=MODELES_UTILISES, client: bool = True):
+    """Initialise modèles et client sans attendre une requête ; un échec reste dans etat_preparation()."""
+    for nom in modeles:
+        try:
+            get_pipe(nom)
+        except ServiceIndisponible as e:
+            print(f"⚠️  {e}")
+    if client:
+        try:
+            get_client()
+        except ServiceIndisponible as e:
+            print(f"⚠️  {e}")
+
+def prechauffer_en_fond(modeles=MODELES_UTILISES, client: bool = True) -> threading.Thread:
+    fil = threading.Thread(target=prechauffer, args=(modeles, client), name="prechauffage", daemon=True)
+    fil.start()
+    return fil
+
+def etat_preparation() -> dict:
+    """Prêt quand le client Bluesky et les modèles de MODELES_UTILISES sont initialisés."""
+    modeles = {MODELES[nom][0].name: _etat.get(nom, "non_initialise") for nom in MODELES_UTILISES}
+    return {
+        "pret": _etat["client_bluesky"] == "pret" and all(e == "pret" for e in modeles.values()),
+        "client_bluesky": _etat["client_bluesky"],
+        "modeles": modeles,
+        "modeles_charges": sorted(MODELES[nom][0].name for nom in _pipes),
+    }
+
+# Anciens noms de module (pipe_tox, client, cache_scores…) : résolus au premier accès
+_ATTRIBUTS_PARESSEUX = {
+    "pipe_topic": "topic", "pipe_irony": "irony", "pipe_senti": "senti",
+    "pipe_fakenews": "fakenews", "pipe_emo": "emo", "pipe_tox": "tox",
+}
+
+def __getattr__(nom: str):
+    if nom in _ATTRIBUTS_PARESSEUX:
+        return get_pipe(_ATTRIBUTS_PARESSEUX[nom])
+    if nom == "client":
+        return get_client()
+    if nom == "cache_scores":
+        return get_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {nom!r}")
 # ╰─────────────────────────────────────────────────────╯
 
 
@@ -128,7 +332,15 @@ EMO_FR = {
 def wrap(txt: str, width: int) -> str:
     return textwrap.fill(txt, width=width, subsequent_indent=" " * 36)
 
+# Texte envoyé aux modèles : "api" (par défaut) garde la casse et les apostrophes,
+# la ponctuation devient une espace ; "post_clean" le normalise comme 04 / 05
+# (nettoyer_texte : minuscules, ponctuation supprimée) : les scores des modèles
+# sensibles à la casse changent, mais l'API relit alors les résultats de 05
+TEXTE_MODELES = os.getenv("PIGMALION_TEXTE_MODELES", "api").lower()
+
 def nettoyer(txt: str) -> str:
+    if TEXTE_MODELES == "post_clean":
+        return nettoyer_texte(txt)
     txt = re.sub(r"http\S+|[@#]\S+|[^\w\s’']", " ", txt)
     return re.sub(r"\s+", " ", txt).strip()
 
@@ -147,6 +359,7 @@ def analyser_post(url: str) -> dict:
     if not m:
         return {"error": "URL Bluesky invalide."}
     handle_in_url, rkey = m.groups()
+    client = get_client()
     try:
         did = client.com.atproto.identity.resolve_handle({"handle": handle_in_url}).did
     except Exception:
@@ -187,14 +400,14 @@ def analyser_post(url: str) -> dict:
     emo_dict = {k: 0.0 for k in emo_lbl}
 
     if text_raw:
+        texte_net = nettoyer(text_raw)
         # Analyse toxicité
-        for p in pipe_tox(nettoyer(text_raw))[0]:
-            tox_dict[p["label"].lower()] = round(float(p["score"]), 3)
+        for l, score in scores_modele("tox", texte_net).items():
+            tox_dict[l] = round(score, 3)
         # Analyse émotions
-        for p in pipe_emo(nettoyer(text_raw))[0]:
-            l = p["label"].lower()
+        for l, score in scores_modele("emo", texte_net).items():
             if l in emo_dict:
-                emo_dict[l] = round(float(p["score"]), 3)
+                emo_dict[l] = round(score, 3)
 
     # ─── Score bot (surface) ─────────────────────────────────────────
     motifs = []
@@ -295,6 +508,11 @@ def analyser_post(url: str) -> dict:
 
 # ╭────────────────── 5. Boucle interactive (standalone) ───────────╮
 if __name__ == "__main__":
+    try:
+        get_client()
+    except ServiceIndisponible as e:
+        sys.exit(str(e))
+    prechauffer(client=False)
     while True:
         try:
             url = input("📝  URL du post (ou q pour quitter) : ").strip()
@@ -305,7 +523,11 @@ if __name__ == "__main__":
             print("👋  Fin de session.")
             break
 
-        result = analyser_post(url)
+        try:
+            result = analyser_post(url)
+        except ServiceIndisponible as e:
+            print(f"⛔  {e}\n")
+            continue
         if "error" in result:
             print(f"⛔  {result['error']}\n")
             continue
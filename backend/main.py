@@ -1,12 +1,16 @@
 # backend/main.py
 import os
+from contextlib import asynccontextmanager
 from datetime import date, timedelta
 import psycopg2
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from .analyse.analyse_post_unitaire import analyser_post
+from .analyse.analyse_post_unitaire import (
+    ServiceIndisponible, analyser_post, etat_preparation, get_cache, prechauffer_en_fond
+)
 from .api_keywords import router as keywords_router
 
 # ───── config .env ───────────────────────────────────────────
@@ -19,6 +23,11 @@ PG_DSN = os.getenv("PG_DSN") or (
     f"port={os.getenv('DB_PORT')}"
 )
 
+# Client Bluesky et modèles sont initialisés à la première requête /analyze ;
+# PIGMALION_PRECHAUFFAGE=1 les charge en fond dès le démarrage (suivi par /ready).
+# Sans préchauffage, /ready répond 200 dès le démarrage (mode "paresseux")
+PRECHAUFFAGE = os.getenv("PIGMALION_PRECHAUFFAGE", "0") == "1"
+
 ALLOWED_CATEGORIES = {
     "news_social_concern", "arts_entertainment", "sports_gaming", "pop_culture",
     "learning_educational", "science_technology", "business_entrepreneurship",
@@ -26,7 +35,13 @@ ALLOWED_CATEGORIES = {
 }
 
 # ───── FastAPI + CORS ───────────────────────────────────────
-app = FastAPI(title="API Pigmalion – Analyse Bluesky")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PRECHAUFFAGE:
+        prechauffer_en_fond()
+    yield
+
+app = FastAPI(title="API Pigmalion – Analyse Bluesky", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://localhost:8501", "*"],
@@ -72,13 +87,32 @@ def count_posts(period: str, category: str) -> int:
 def health():
     return {"status": "ok", "version": "0.2"}
 
+@app.get("/ready")
+def ready():
+    # Préchauffage : 503 tant que le client Bluesky et les modèles d'/analyze ne sont
+    # pas initialisés. Paresseux : prêt d'emblée (la première /analyze les charge),
+    # 503 seulement si une initialisation a échoué
+    etat = etat_preparation()
+    if not PRECHAUFFAGE:
+        composants = [etat["client_bluesky"], *etat["modeles"].values()]
+        etat = {**etat, "mode": "paresseux",
+                "pret": not any(e.startswith("erreur") for e in composants)}
+    return JSONResponse(status_code=200 if etat["pret"] else 503, content=etat)
+
 @app.get("/analyze")
 def analyze(url: str):
-    r = analyser_post(url)
+    try:
+        r = analyser_post(url)
+    except ServiceIndisponible as e:
+        raise HTTPException(status_code=503, detail=str(e))
     if "error" in r:
         raise HTTPException(status_code=400, detail=r["error"])
     return r
 
+@app.get("/cache/stats")
+def cache_stats():
+    return get_cache().stats()
+
 @app.get("/trends/count")
 def trends_count(
     period: str = Query(..., pattern="^(today|week|all)$"),
@@ -0,0 +1,160 @@
+# backend/serveur_workers.py
+# -*- coding: utf-8 -*-
+"""
+API multi-process à poids partagés : chargement puis fork
+────────────────────────────────────────────────────────────────────────────
+`uvicorn backend.main:app --workers N` importe l’app dans chaque worker :
+chacun charge ses propres modèles, et la mémoire est multipliée par N.
+
+Ici les poids sont chargés une fois, avant le fork :
+ • le parent importe l’app puis charge les modèles d’/analyze
+   (prechauffer, sans client Bluesky ni cache : une session réseau ou une
+   connexion SQLite ne se partagent pas à travers un fork), puis gèle le
+   ramasse-miettes (gc.freeze) pour qu’il ne réécrive pas les objets hérités ;
+ • il ouvre la socket d’écoute et forke N workers. Chacun hérite des poids
+   en copie sur écriture : l’inférence ne les écrit jamais, leurs pages
+   restent partagées entre tous les process ;
+ • chaque worker fixe torch.set_num_threads(cœurs // N), ouvre son client
+   Bluesky en fond et sert la socket commune avec uvicorn ;
+ • le parent relance un worker mort (sauf mort au démarrage) et arrête tout
+   sur SIGINT / SIGTERM.
+
+Aucune inférence dans le parent avant le fork : les pools de threads
+(OpenMP) qu’elle démarrerait ne survivent pas au fork.
+
+Linux seulement : le partage repose sur fork et sur la copie sur écriture
+des pages des poids. Sous Windows, il n'y a pas de fork. Sous macOS, un fork
+après le chargement de torch n'est pas sûr. Là, --workers 1 lance un seul
+process uvicorn et --workers N>1 est refusé : il faut alors soit
+`uvicorn --workers N` (poids dupliqués), soit le serveur de modèles
+(trends/serveur_modeles.py, PIGMALION_SERVEUR_MODELES), qui partage les
+poids entre process sur tout système.
+    python -m backend.serveur_workers --workers 4 --port 8000
+Mémoire et débit selon le nombre de workers : trends/bench_workers_api.py.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+import traceback
+
+import uvicorn
+
+# Un worker qui meurt avant ce délai n'est pas relancé (erreur de démarrage)
+DELAI_RELANCE_MIN = 10
+
+
+def _servir(app, sock: socket.socket, nb_threads: int, log_level: str):
+    """Corps d'un worker (après fork) : budget de threads, uvicorn sur la socket héritée."""
+    # Gestionnaires du parent hérités : uvicorn installe les siens au démarrage
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    import torch
+    torch.set_num_threads(nb_threads)
+    # Le lifespan de l'app (PIGMALION_PRECHAUFFAGE=1) ouvre le client Bluesky en fond ;
+    # les modèles hérités du parent sont déjà prêts
+    serveur = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    serveur.run(sockets=[sock])
+
+
+def lancer(nb_workers: int, hote: str = "0.0.0.0", port: int = 8000,
+           nb_threads: int | None = None, log_level: str = "info"):
+    if not sys.platform.startswith("linux"):
+        if nb_workers > 1:
+            raise SystemExit(f"❌ Workers à poids partagés : Linux seulement (fork), pas {sys.platform}. "
+                             "Utiliser uvicorn --workers ou le serveur de modèles (PIGMALION_SERVEUR_MODELES).")
+        from .main import app
+        uvicorn.run(app, host=hote, port=port, log_level=log_level)
+        return
+
+    # Avant l'import de l'app : chaque worker préchauffe au démarrage (client Bluesky)
+    # et /ready suit ce préchauffage plutôt que de répondre en mode paresseux
+    os.environ.setdefault("PIGMALION_PRECHAUFFAGE", "1")
+    from .main import app
+    from .analyse.analyse_post_unitaire import etat_preparation, prechauffer
+
+    t0 = time.time()
+    prechauffer(client=False)
+    etat = etat_preparation()
+    print(f"📦 Modèles chargés dans le parent en {time.time() - t0:.1f}s : "
+          f"{', '.join(etat['modeles_charges']) or 'aucun'}")
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET6 if ":" in hote else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((hote, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    nb_threads = nb_threads or max(1, (os.cpu_count() or 1) // nb_workers)
+    workers = {}
+
+    def demarrer():
+        # Sans flush, chaque worker réécrirait le tampon de sortie hérité du parent
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _servir(app, sock, nb_threads, log_level)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        workers[pid] = time.time()
+
+    for _ in range(nb_workers):
+        demarrer()
+    print(f"🚀 {nb_workers} workers sur {hote}:{port} ({nb_threads} threads torch chacun) : "
+          f"{', '.join(map(str, workers))}")
+
+    arret = False
+
+    def arreter(signum, frame):
+        nonlocal arret
+        arret = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, arreter)
+    signal.signal(signal.SIGTERM, arreter)
+
+    while workers:
+        try:
+            pid, statut = os.wait()
+        except ChildProcessError:
+            break
+        debut = workers.pop(pid, None)
+        if arret or debut is None:
+            continue
+        if time.time() - debut < DELAI_RELANCE_MIN:
+            print(f"❌ Worker {pid} arrêté au démarrage (statut {statut}) : arrêt du serveur.")
+            arreter(signal.SIGTERM, None)
+            continue
+        print(f"⚠️  Worker {pid} arrêté (statut {statut}) : relance.")
+        demarrer()
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API Pigmalion multi-process, poids partagés par fork")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--hote", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--threads", type=int, help="Threads torch par worker (défaut : cœurs / workers)")
+    parser.add_argument("--log_level", default="info")
+    args = parser.parse_args()
+    lancer(args.workers, args.hote, args.port, args.threads, args.log_level)
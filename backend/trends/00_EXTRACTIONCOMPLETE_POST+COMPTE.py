@@ -1,14 +1,21 @@
 import os
-import time
+import asyncio
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine
-from atproto import Client
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
 from tqdm import tqdm
 import warnings
 
+from extraction_async import balayer_keywords
+from bulk_ingest import BulkWriter, resume_lot, lignes_depuis_post
+from index_urls import IndexUrlsConnues
+from client_bluesky import creer_client
+from telemetrie import metriques, instrumenter
+from enrichissement_comptes import enrichir_comptes
+from planificateur_keywords import PlanificateurKeywords
+from pipeline_extraction import PipelineExtraction
+
 # Masquer le warning Pandas sur psycopg2
 warnings.filterwarnings("ignore", category=UserWarning, module="pandas.io.sql")
 
@@ -18,7 +25,38 @@ warnings.filterwarnings("ignore", category=UserWarning, module="pandas.io.sql")
 # ======================
 TARGET_NEW_POSTS  = 12000      # Objectif de nouveaux tweets pour ce run
 PER_KEYWORD_LIMIT = 10         # Nb max de tweets à récupérer / mot-clé à chaque tour
-ENRICH_INTERVAL   = 100        # Tous les 100 posts, on exécute Étape 2+3
+ENRICH_INTERVAL   = 100        # Tous les 100 posts, on enrichit les comptes en attente
+
+# --- MODE D’EXTRACTION ---
+# "sync"  : un mot-clé après l’autre (comportement historique)
+# "async" : recherches concurrentes, bornées par le rate limit (voir extraction_async.py)
+# "pipeline" : recherche, filtrage, écriture et enrichissement découplés par des
+#              files bornées, chacun dans son thread (voir pipeline_extraction.py)
+EXTRACTION_MODE    = "async"
+MAX_CONCURRENCE    = 8         # Nb max de mots-clés recherchés en parallèle
+RATE_LIMIT_PAR_SEC = 8.0       # Appels search_posts autorisés par seconde (tous mots-clés)
+RATE_LIMIT_BURST   = 10        # Rafale maximale du seau à jetons
+
+BULK_BATCH_SIZE    = 200       # Nb de posts par lot COPY (1 commit par lot)
+
+# --- MODE "pipeline" ---
+NB_FETCHERS        = 4         # Threads de recherche search_posts
+TAILLE_QUEUE       = 500       # Taille max des files entre étapes (contre-pression)
+DELAI_FLUSH_SEC    = 2.0       # Écriture d’un lot partiel après ce délai sans nouveau post
+
+# --- PLANIFICATION DES MOTS-CLÉS ---
+# "round_robin" : chaque mot-clé reçoit PER_KEYWORD_LIMIT posts à chaque tour
+# "adaptatif"   : budget réparti selon le rendement observé (voir planificateur_keywords.py)
+SCHEDULER_MODE        = "adaptatif"
+APPELS_PAR_TOUR       = None   # Budget d’appels search_posts par tour (None = nb de mots-clés)
+PAGES_MAX_PAR_KEYWORD = 4      # Nb max de pages pour un même mot-clé dans un tour
+
+# --- TÉLÉMÉTRIE (voir telemetrie.py) ---
+# "prometheus" : fichier texte PROMETHEUS_PATH réécrit à chaque tour
+# "table"      : échantillons ajoutés à pipeline_metrics en fin de run
+# "les_deux" / None
+TELEMETRIE_EXPORT = "les_deux"
+PROMETHEUS_PATH   = r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMALIEN\06_pigmalion_v06\data\metrics_extraction.prom"
 
 # --- CHEMIN VERS LE FICHIER CSV DES MOTS-CLÉS ---
 CSV_KEYWORDS_PATH = r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMALIEN\06_pigmalion_v06\data\liste_keywords.csv"
@@ -26,6 +64,9 @@ CSV_KEYWORDS_PATH = r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMAL
 # --- CHEMIN VERS LE FICHIER CSV DES STOPWORDS ---
 CSV_STOPWORDS_PATH = r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMALIEN\06_pigmalion_v06\data\Liste_Stopwords_V01_24.05.2025.csv"
 
+# --- INDEX COMPACT DES URLS DÉJÀ CONNUES (hachages 64 bits, voir index_urls.py) ---
+URL_INDEX_PATH = r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMALIEN\06_pigmalion_v06\data\urls_connues.npy"
+
 # --- CHEMIN VERS LE FICHIER .env (".env07") ---
 ENV_PATH = r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMALIEN\06_pigmalion_v06\.env10"
 
@@ -33,30 +74,6 @@ ENV_PATH = r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMALIEN\06_pi
 MODEL_PATH = r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMALIEN\06_pigmalion_v06\models"
 
 
-# ==================================
-# === FONCTION DE PARSING DE DATE ===
-# ==================================
-def parse_created_at(createdAt_str: str) -> datetime | None:
-    """
-    Gère les formats :
-      - 'YYYY-MM-DDTHH:MM:SSZ'
-      - 'YYYY-MM-DDTHH:MM:SS.%fZ'
-      - avec fuseau (ex. '+00:00', '+09:00', '-07:00')
-    Retourne un datetime timezone-aware en UTC ou None si échec.
-    """
-    if not createdAt_str:
-        return None
-    try:
-        if "." in createdAt_str and createdAt_str.endswith("Z"):
-            return datetime.strptime(createdAt_str, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
-        elif createdAt_str.endswith("Z"):
-            return datetime.strptime(createdAt_str, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-        else:
-            return datetime.fromisoformat(createdAt_str).astimezone(timezone.utc)
-    except Exception:
-        return None
-
-
 # ===========================
 # === CONNEXION POSTGRESQL ===
 # ===========================
@@ -72,17 +89,7 @@ def get_connexion():
     )
 
 
-# =====================================
-# === CRÉATION D’UN MOTEUR SQLALCHEMY ===
-# =====================================
 load_dotenv(ENV_PATH)
-db_user = os.getenv("DB_USER")
-db_pass = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
-db_name = os.getenv("DB_NAME")
-DB_URL = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
-engine = create_engine(DB_URL)
 
 
 # ========================================
@@ -90,8 +97,8 @@ engine = create_engine(DB_URL)
 # ========================================
 handle   = os.getenv("BLUESKY_HANDLE")
 password = os.getenv("BLUESKY_PASSWORD")
-client   = Client()
-client.login(handle, password)
+client   = creer_client(handle, password)   # live / record / replay (voir client_bluesky.py)
+client   = instrumenter(client)             # latence / 429 par endpoint (voir telemetrie.py)
 
 
 # ============================
@@ -111,220 +118,59 @@ stopwords_list = df_stopwords["stopword"].astype(str).str.strip().tolist()
 # === REQUÊTES SQL ===
 # =====================
 
-# 1) Nouveau : on insère dès le départ la date de première analyse
-SQL_INSERT_COMPTE = """
-INSERT INTO compte_brut (
-    compte_did,
-    compte_brut_handle,
-    compte_date_premiere_analyse
-)
-VALUES (%s, %s, %s)
-ON CONFLICT (compte_did) DO NOTHING;
-"""
-
-SQL_INSERT_POST = """
-INSERT INTO post_brut (
-    post_brut_url, post_brut_date, post_brut_contenu,
-    compte_handle, post_brut_url_affichage,
-    post_brut_date_scrapping, categorie, keyword,
-    post_brut_poids, compte_did,
-    post_brut_presence_media, post_brut_temps_scraping
-)
-VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-ON CONFLICT (post_brut_url) DO NOTHING;
-"""
-
-# Étape 2 : enrichissement initial des comptes
-SQL_SELECT_COMPTES_INCOMPLETS = """
-SELECT compte_did, compte_brut_handle,
-       compte_brut_avatar_url,
-       compte_brut_is_verified,
-       compte_brut_bio,
-       compte_brut_banner_url
-FROM compte_brut
-WHERE compte_completion_01 IS DISTINCT FROM 'OK';
-"""
-
-SQL_MARK_COMPTE_OK_ETAPE1 = """
-UPDATE compte_brut
-SET compte_completion_01 = 'OK'
-WHERE compte_did = %s;
-"""
-
-SQL_INSERT_OR_UPDATE_COMPTE_BRUT = """
-INSERT INTO public.compte_brut (
-    compte_did,
-    compte_brut_handle,
-    compte_brut_avatar_url,
-    compte_brut_is_verified,
-    compte_brut_bio,
-    compte_brut_banner_url,
-    compte_completion_01
-) VALUES (%(compte_did)s, %(compte_brut_handle)s, %(compte_brut_avatar_url)s,
-          %(compte_brut_is_verified)s, %(compte_brut_bio)s, %(compte_brut_banner_url)s,
-          'OK')
-ON CONFLICT (compte_did) DO UPDATE SET
-    compte_brut_handle      = EXCLUDED.compte_brut_handle,
-    compte_brut_avatar_url  = COALESCE(compte_brut.compte_brut_avatar_url, EXCLUDED.compte_brut_avatar_url),
-    compte_brut_is_verified = COALESCE(compte_brut.compte_brut_is_verified, EXCLUDED.compte_brut_is_verified),
-    compte_brut_bio         = COALESCE(compte_brut.compte_brut_bio, EXCLUDED.compte_brut_bio),
-    compte_brut_banner_url  = COALESCE(compte_brut.compte_brut_banner_url, EXCLUDED.compte_brut_banner_url),
-    compte_completion_01    = 'OK';
-"""
-
-# Étape 3 : complément métadonnées comptes
-SQL_SELECT_COMPTES_INCOMPLETS_02 = """
-SELECT compte_did, compte_brut_handle,
-       compte_nombre_publication,
-       compte_brut_nombre_followers,
-       compte_brut_date_creation
-FROM compte_brut
-WHERE compte_completion_02 IS NULL;
-"""
-
-SQL_UPDATE_COMPTE_COMPLETION_02 = """
-UPDATE compte_brut
-SET {set_clause}
-WHERE compte_did = %s;
-"""
-
-SQL_MARK_COMPTE_INVALIDE_ETAPE3 = """
-UPDATE compte_brut
-SET compte_completion_02 = 'COMPTE INVALIDE'
-WHERE compte_did = %s;
-"""
-
-
-def enrich_if_null(old, new):
-    return new if old is None else old
+# Les insertions post_brut / compte_brut passent par bulk_ingest.BulkWriter,
+# l’enrichissement des comptes par enrichissement_comptes.enrichir_comptes.
 
 
 # ======================================
-# === FONCTIONS D’ENRICHISSEMENT 2 & 3 ===
+# === EXPORT DE LA TÉLÉMÉTRIE ===
 # ======================================
-def etape2_enrichissement(conn):
-    """
-    Charge tous les comptes où compte_completion_01 <> 'OK',
-    enrichit avatar, bio, banner, is_verified, puis marque 'OK'.
-    """
-    print("Chargement des comptes à enrichir (étape 2)…")
-    df_comptes_01 = pd.read_sql(SQL_SELECT_COMPTES_INCOMPLETS, engine)
-    count = len(df_comptes_01)
-    print(f"étape 2 : {count} comptes trouvés pour enrichissement.")
-    if count == 0:
-        return 0
-
-    cur = conn.cursor()
-    for _, row in tqdm(
-        df_comptes_01.iterrows(),
-        total=count,
-        desc="Étape 2 – Enrichissement comptes",
-        leave=False
-    ):
-        did = row["compte_did"]
-        try:
-            profile = client.app.bsky.actor.get_profile({"actor": did})
-            cur.execute("SELECT * FROM compte_brut WHERE compte_did = %s", (did,))
-            existing = cur.fetchone()
-            cols = [d[0] for d in cur.description]
-            data_dict = dict(zip(cols, existing))
-
-            new_data = {
-                "compte_did": did,
-                "compte_brut_handle": row.get("compte_brut_handle"),
-                "compte_brut_avatar_url": enrich_if_null(
-                    data_dict.get("compte_brut_avatar_url"),
-                    getattr(profile, "avatar", None)
-                ),
-                "compte_brut_is_verified": enrich_if_null(
-                    data_dict.get("compte_brut_is_verified"),
-                    getattr(profile, "labels", None) is not None
-                ),
-                "compte_brut_bio": enrich_if_null(
-                    data_dict.get("compte_brut_bio"),
-                    getattr(profile, "description", None)
-                ),
-                "compte_brut_banner_url": enrich_if_null(
-                    data_dict.get("compte_brut_banner_url"),
-                    getattr(profile, "banner", None)
-                ),
-            }
-        except Exception as e:
-            msg = str(e)
-            # Si le compte a disparu ou est suspendu, on marque quand même "OK" pour ne pas boucler
-            if 'Profile not found' in msg or 'Account has been suspended' in msg:
-                try:
-                    cur.execute(SQL_MARK_COMPTE_OK_ETAPE1, (did,))
-                    conn.commit()
-                except Exception:
-                    conn.rollback()
-                continue
-            else:
-                conn.rollback()
-                continue
-
-        try:
-            cur.execute(SQL_INSERT_OR_UPDATE_COMPTE_BRUT, new_data)
-            conn.commit()
-        except Exception:
-            conn.rollback()
-
-    cur.close()
-    return count
+def exporter_telemetrie(conn, fin_de_run: bool = False):
+    """Fichier Prometheus à chaque tour ; table pipeline_metrics et bilan en fin de run."""
+    if TELEMETRIE_EXPORT in ("prometheus", "les_deux"):
+        metriques.exporter_prometheus(PROMETHEUS_PATH)
+    if fin_de_run:
+        if TELEMETRIE_EXPORT in ("table", "les_deux"):
+            metriques.sauvegarder(conn)
+        print(metriques.resume())
 
 
-def etape3_complement(conn):
-    """
-    Charge tous les comptes où compte_completion_02 IS NULL,
-    complète posts_count, followers_count, date_creation, ou marque INVALIDE.
-    """
-    print("Chargement des comptes à compléter (étape 3)…")
-    df_comptes_02 = pd.read_sql(SQL_SELECT_COMPTES_INCOMPLETS_02, engine)
-    count = len(df_comptes_02)
-    print(f"étape 3 : {count} comptes trouvés pour complément.")
-    if count == 0:
-        return 0
-
-    cur = conn.cursor()
-    for _, row in tqdm(
-        df_comptes_02.iterrows(),
-        total=count,
-        desc="Étape 3 – Complément comptes",
-        leave=False
-    ):
-        did = row["compte_did"]
-        try:
-            profile = client.app.bsky.actor.get_profile({"actor": did})
-            p = profile.__dict__
-            posts_count     = p.get("posts_count")
-            followers_count = p.get("followers_count")
-            created_at      = p.get("created_at")
-
-            upd = {}
-            if row["compte_nombre_publication"] is None and posts_count is not None:
-                upd["compte_nombre_publication"] = posts_count
-            if row["compte_brut_nombre_followers"] is None and followers_count is not None:
-                upd["compte_brut_nombre_followers"] = followers_count
-            if row["compte_brut_date_creation"] is None and created_at is not None:
-                upd["compte_brut_date_creation"] = created_at
-            upd["compte_completion_02"] = 'OK'
-
-            set_clause = ", ".join([f"{k} = %s" for k in upd.keys()])
-            sql = SQL_UPDATE_COMPTE_COMPLETION_02.format(set_clause=set_clause)
-            vals = list(upd.values()) + [did]
-            cur.execute(sql, vals)
-            conn.commit()
-
-        except Exception:
-            conn.rollback()
-            try:
-                cur.execute(SQL_MARK_COMPTE_INVALIDE_ETAPE3, (did,))
-                conn.commit()
-            except Exception:
-                conn.rollback()
+# ======================================
+# === MODE PIPELINE (étapes découplées) ===
+# ======================================
+def main_pipeline(conn, urls_connues, keywords, planif):
+    """Boucle des tours quand EXTRACTION_MODE = "pipeline"."""
+    pipe = PipelineExtraction(
+        client, get_connexion, urls_connues,
+        cible             = TARGET_NEW_POSTS,
+        nb_fetchers       = NB_FETCHERS,
+        taille_file       = TAILLE_QUEUE,
+        taille_lot        = BULK_BATCH_SIZE,
+        delai_flush       = DELAI_FLUSH_SEC,
+        enrich_intervalle = ENRICH_INTERVAL,
+        debit             = RATE_LIMIT_PAR_SEC,
+        capacite          = RATE_LIMIT_BURST,
+        planif            = planif,
+    )
+    pipe.demarrer()
+    try:
+        while not pipe.termine:
+            seuil_date = datetime.now(timezone.utc) - timedelta(hours=24)
+            if planif is not None:
+                plan = planif.tour(APPELS_PAR_TOUR)
+            else:
+                plan = [(categorie, keyword, PER_KEYWORD_LIMIT) for categorie, keyword in keywords]
 
-    cur.close()
-    return count
+            pipe.executer_tour(plan, seuil_date)
+            if planif is not None:
+                planif.sauvegarder(conn)
+                print(planif.rapport())
+            exporter_telemetrie(conn)
+            print(f"Fin d’un tour complet de mots-clés. Total actuel : {pipe.inseres}/{TARGET_NEW_POSTS}\n")
+    finally:
+        # Vide les files : les posts déjà filtrés sont écrits avant la sortie
+        pipe.arreter()
+    return pipe.inseres
 
 
 # ======================================
@@ -335,9 +181,9 @@ def main():
     conn = get_connexion()
     cur = conn.cursor()
 
-    # 2) Charger la liste des URLs déjà connues pour éviter doublons
-    cur.execute("SELECT post_brut_url FROM post_brut")
-    urls_connues = set(row[0] for row in cur.fetchall())
+    # 2) Charger l’index compact des URLs déjà connues (delta depuis le dernier run)
+    urls_connues = IndexUrlsConnues.charger(conn, URL_INDEX_PATH)
+    print(f"{len(urls_connues)} URLs connues chargées depuis l’index.")
 
     # 3) Compteur principal et compteur intermédiaire
     nouveaux_posts_insérés = 0
@@ -346,114 +192,165 @@ def main():
     # 4) Barre de progression globale (0 → TARGET_NEW_POSTS)
     pbar = tqdm(total=TARGET_NEW_POSTS, initial=0, unit="tweet", desc="Extraction en cours")
 
+    # Writer par lots (COPY → table temporaire → INSERT … SELECT)
+    writer = BulkWriter(conn, taille_lot=BULK_BATCH_SIZE)
+
+    def ecrire_lot():
+        """Écrit le lot en file, met à jour les compteurs puis, si le palier est atteint, enrichit."""
+        nonlocal nouveaux_posts_insérés, since_last_enrich
+
+        stats = writer.flush()
+        print(resume_lot(stats))
+        # URLs connues seulement une fois écrites : un post rejeté sera retenté s'il réapparaît
+        for url in stats["urls_ecrites"]:
+            urls_connues.add(url)
+        nouveaux_posts_insérés += stats["posts_inseres"]
+        since_last_enrich      += stats["posts_inseres"]
+        pbar.update(stats["posts_inseres"])
+
+        # Dès que since_last_enrich ≥ ENRICH_INTERVAL, on enrichit les comptes en attente
+        if since_last_enrich >= ENRICH_INTERVAL:
+            print("\n--- Palier atteint : enrichissement des comptes avant de poursuivre ---")
+            st = enrichir_comptes(conn, client)
+            print(f"Enrichissement terminé en {st['duree']}s : {st['comptes']} comptes en attente, "
+                  f"{st['enrichis']} enrichis, {st['invalides']} invalides, "
+                  f"{st['appels']} appels get_profiles ({st['erreurs']} en erreur).")
+            since_last_enrich = 0
+            print("--- Reprise de la récupération des tweets ---\n")
+
+    def traiter_keyword(categorie, keyword, buffer_posts, erreur=None, appels=1):
+        """
+        Chemin d’insertion commun aux modes "sync" et "async" :
+        filtre les posts d’un mot-clé et les met en file dans le writer,
+        puis remonte son rendement au planificateur.
+        """
+        if erreur is not None:
+            print(f"Erreur récupération '{keyword}' → {erreur}")
+            # Les appels consommés comptent : un mot-clé qui échoue sans cesse est mis en pause
+            metriques.compter_keyword(categorie, keyword, 0, 0, 0, erreurs=1)
+            if planif is not None:
+                planif.enregistrer(categorie, keyword, appels, 0, 0)
+            return
+
+        nb_ins_pour_ce_keyword = 0
+        nb_doublons            = 0
+        nb_trop_anciens        = 0
+
+        # (b) Filtrage post par post
+        for post in buffer_posts:
+            if nouveaux_posts_insérés + len(writer) >= TARGET_NEW_POSTS:
+                break
+
+            uri = post.uri
+            if uri in urls_connues or uri in writer:
+                nb_doublons += 1
+                continue
+
+            lignes = lignes_depuis_post(post, categorie, keyword, seuil_date)
+            if lignes is None:
+                nb_trop_anciens += 1
+                continue  # date absente ou post trop ancien
+
+            # 1) Mise en file du post et de son compte (écrits par lots via COPY)
+            writer.ajouter(*lignes)
+            nb_ins_pour_ce_keyword += 1
+
+            # 2) Lot plein → écriture en base
+            if len(writer) >= BULK_BATCH_SIZE:
+                ecrire_lot()
+
+        metriques.compter_keyword(categorie, keyword, nb_ins_pour_ce_keyword, nb_doublons, nb_trop_anciens)
+        if planif is not None:
+            planif.enregistrer(categorie, keyword, appels, nb_ins_pour_ce_keyword, nb_doublons)
+
+        # (c) Affichage après chaque mot-clé
+        print(f"{nb_ins_pour_ce_keyword} posts mis en file pour le mot-clé : {keyword}")
+        print(f"Total cumulé de posts insérés : {nouveaux_posts_insérés}\n")
+
+    # Planificateur adaptatif (statistiques persistées dans keyword_stats)
+    keywords = list(zip(df_keywords["categorie"], df_keywords["keyword"]))
+    planif = None
+    if SCHEDULER_MODE == "adaptatif":
+        planif = PlanificateurKeywords.charger(conn, keywords, pages_max=PAGES_MAX_PAR_KEYWORD,
+                                               limite_temoin=PER_KEYWORD_LIMIT)
+
+    if EXTRACTION_MODE == "pipeline":
+        pbar.close()
+        total = main_pipeline(conn, urls_connues, keywords, planif)
+        exporter_telemetrie(conn, fin_de_run=True)
+        cur.close()
+        conn.close()
+        print(f"Extraction terminée : {total} nouveaux tweets insérés.")
+        return
+
     # 5) Boucle principale : tant que l’on n’a pas atteint TARGET_NEW_POSTS
     while nouveaux_posts_insérés < TARGET_NEW_POSTS:
         seuil_date = datetime.now(timezone.utc) - timedelta(hours=24)
 
-        # (a) Parcours de tous les mots-clés
-        for _, row in df_keywords.iterrows():
-            if nouveaux_posts_insérés >= TARGET_NEW_POSTS:
-                break  # on a atteint la cible
-
-            categorie    = row["categorie"]
-            keyword      = row["keyword"]
-            buffer_posts = []
-            cursor_token = None
-
-            print(f"Recherche [{keyword}] (catégorie : {categorie})...")
-
-            try:
-                # Récupérer jusqu’à PER_KEYWORD_LIMIT posts pour ce mot-clé
-                while len(buffer_posts) < PER_KEYWORD_LIMIT:
-                    result = client.app.bsky.feed.search_posts(
-                        params={"q": keyword, "cursor": cursor_token}
-                    )
-                    feed = result.posts
-                    if not feed:
-                        break
-                    buffer_posts.extend(feed)
-                    cursor_token = result.cursor
-                    if cursor_token is None:
-                        break
-
-                buffer_posts = buffer_posts[:PER_KEYWORD_LIMIT]
-            except Exception as e:
-                print(f"Erreur récupération '{keyword}' → {e}")
-                continue
-
-            nb_ins_pour_ce_keyword = 0
+        # Plan du tour : [(categorie, keyword, limite_posts)]
+        if planif is not None:
+            plan = planif.tour(APPELS_PAR_TOUR)
+        else:
+            plan = [(categorie, keyword, PER_KEYWORD_LIMIT) for categorie, keyword in keywords]
+
+        if EXTRACTION_MODE == "async":
+            # (a) Toutes les recherches du tour partent en parallèle, bornées par
+            #     MAX_CONCURRENCE et par le seau à jetons global
+            asyncio.run(balayer_keywords(
+                client, plan,
+                concurrence = MAX_CONCURRENCE,
+                debit       = RATE_LIMIT_PAR_SEC,
+                capacite    = RATE_LIMIT_BURST,
+                on_result   = traiter_keyword,
+                stop        = lambda: nouveaux_posts_insérés + len(writer) >= TARGET_NEW_POSTS
+            ))
+        else:
+            # (a) Parcours séquentiel de tous les mots-clés
+            for categorie, keyword, limite in plan:
+                if nouveaux_posts_insérés + len(writer) >= TARGET_NEW_POSTS:
+                    break  # on a atteint la cible
 
-            # (b) Insertion post par post
-            for post in buffer_posts:
-                if nouveaux_posts_insérés >= TARGET_NEW_POSTS:
-                    break
+                buffer_posts = []
+                cursor_token = None
+                appels       = 0
 
-                uri = post.uri
-                if uri in urls_connues:
-                    continue
+                print(f"Recherche [{keyword}] (catégorie : {categorie})...")
 
-                createdAt_str = getattr(post.record, "created_at", None)
-                createdAt     = parse_created_at(createdAt_str)
-                if createdAt is None or createdAt < seuil_date:
+                try:
+                    # Récupérer jusqu’à `limite` posts pour ce mot-clé
+                    while len(buffer_posts) < limite:
+                        appels += 1
+                        result = client.app.bsky.feed.search_posts(
+                            params={"q": keyword, "cursor": cursor_token}
+                        )
+                        feed = result.posts
+                        if not feed:
+                            break
+                        buffer_posts.extend(feed)
+                        cursor_token = result.cursor
+                        if cursor_token is None:
+                            break
+
+                    buffer_posts = buffer_posts[:limite]
+                except Exception as e:
+                    traiter_keyword(categorie, keyword, [], e, appels)
                     continue
 
-                text           = getattr(post.record, "text", "").replace("\n", " ").replace("\r", "").strip()
-                author_handle  = post.author.handle
-                url_affichage  = f"https://bsky.app/profile/{author_handle}/post/{uri.split('/')[-1]}"
-                date_scrap     = datetime.now(timezone.utc)
-                # Si vous voulez exclure les stopwords du calcul de "poids", vous pouvez filtrer ici :
-                # words = [w for w in text.split() if w.lower() not in stopwords_list]
-                # poids = len(words)
-                poids          = len(text.split())
-                compte_did     = post.author.did
-                has_media      = post.embed is not None
-                timestamp      = round(time.time(), 3)
+                traiter_keyword(categorie, keyword, buffer_posts, appels=appels)
 
-                try:
-                    # 1) Insertion du compte avec date première analyse
-                    cur.execute(SQL_INSERT_COMPTE, (compte_did, author_handle, date_scrap))
-                except Exception:
-                    conn.rollback()
+        # Fin du for mots-clés : on vide le lot en cours avant le bilan du tour
+        ecrire_lot()
+        if planif is not None:
+            planif.sauvegarder(conn)
+            print(planif.rapport())
+        exporter_telemetrie(conn)
 
-                # 2) Insertion du post
-                try:
-                    cur.execute(SQL_INSERT_POST, (
-                        uri, createdAt, text,
-                        author_handle, url_affichage,
-                        date_scrap, categorie, keyword,
-                        poids, compte_did,
-                        has_media, timestamp
-                    ))
-                    conn.commit()
-                    urls_connues.add(uri)
-                    nb_ins_pour_ce_keyword += 1
-                    nouveaux_posts_insérés += 1
-                    since_last_enrich += 1
-                    pbar.update(1)
-                except Exception:
-                    conn.rollback()
-
-                # 3) Dès que since_last_enrich ≥ ENRICH_INTERVAL, on déclenche Étape 2+3
-                if since_last_enrich >= ENRICH_INTERVAL:
-                    print("\n--- Palier atteint : exécution Étape 2 & 3 avant de poursuivre ---")
-                    # Étape 2
-                    count2 = etape2_enrichissement(conn)
-                    print(f"Étape 2 terminée, {count2} comptes enrichis.")
-                    # Étape 3
-                    count3 = etape3_complement(conn)
-                    print(f"Étape 3 terminée, {count3} comptes complétés.")
-                    since_last_enrich = 0
-                    print("--- Reprise de la récupération des tweets ---\n")
-
-            # (c) Affichage après chaque mot-clé
-            print(f"{nb_ins_pour_ce_keyword} posts insérés pour le mot-clé : {keyword}")
-            print(f"Total cumulé de posts insérés : {nouveaux_posts_insérés}\n")
-
-        # Fin du for mots-clés. On revient au while s’il reste des tweets à récupérer.
+        # On revient au while s’il reste des tweets à récupérer.
         print(f"Fin d’un tour complet de mots-clés. Total actuel : {nouveaux_posts_insérés}/{TARGET_NEW_POSTS}\n")
 
-    # 6) Fin de la boucle principale : on ferme tout
+    # 6) Fin de la boucle principale : bilan de télémétrie, puis on ferme tout
     pbar.close()
+    exporter_telemetrie(conn, fin_de_run=True)
     cur.close()
     conn.close()
     print(f"Extraction terminée : {TARGET_NEW_POSTS} nouveaux tweets insérés.")
@@ -2,10 +2,13 @@ import os
 import time
 import pandas as pd
 import psycopg2
-from atproto import Client
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 
+from bulk_ingest import BulkWriter, resume_lot, langs_declares
+from index_urls import IndexUrlsConnues
+from client_bluesky import creer_client
+
 # ──────────────────────────────────────────────────────────────────────
 # 1) Calcul dynamique de la racine du projet (05_PIGMALION_V05_DEF)
 # ──────────────────────────────────────────────────────────────────────
@@ -23,7 +26,10 @@ NB_POSTS_PAR_MOT_CLE = 10
 csv_folder = os.path.join(project_root, "data", "csv")
 CSV_KEYWORDS_PATH = os.path.join(csv_folder, "liste_keywords.csv")
 
-# b) Chemin vers le fichier d’environnement renommé .env07
+# b) Index compact des URLs déjà connues (voir index_urls.py)
+URL_INDEX_PATH = os.path.join(project_root, "data", "urls_connues.npy")
+
+# c) Chemin vers le fichier d’environnement renommé .env07
 ENV_PATH = os.path.join(project_root, ".env07")
 
 # ──────────────────────────────────────────────────────────────────────
@@ -45,8 +51,7 @@ def get_connexion():
 load_dotenv(ENV_PATH)
 handle   = os.getenv("BLUESKY_HANDLE")
 password = os.getenv("BLUESKY_PASSWORD")
-client   = Client()
-client.login(handle, password)
+client   = creer_client(handle, password)   # live / record / replay (voir client_bluesky.py)
 
 # ──────────────────────────────────────────────────────────────────────
 # 5) Lecture des mots-clés depuis data/csv/liste_keywords.csv
@@ -57,40 +62,18 @@ df_keywords = df_keywords.dropna(subset=["categories", "keyword"])
 df_keywords.rename(columns={"categories": "categorie"}, inplace=True)
 
 # ──────────────────────────────────────────────────────────────────────
-# 6) Connexion à la base PostgreSQL et préchargement des URLs existantes
+# 6) Connexion à la base PostgreSQL et chargement de l’index des URLs existantes
 # ──────────────────────────────────────────────────────────────────────
 conn = get_connexion()
 cur = conn.cursor()
 
-cur.execute("SELECT post_brut_url FROM post_brut;")
-urls_connues = set(row[0] for row in cur.fetchall())
+urls_connues = IndexUrlsConnues.charger(conn, URL_INDEX_PATH)
 
 # ──────────────────────────────────────────────────────────────────────
-# 7) Requêtes SQL
+# 7) Écriture par lots (COPY → table temporaire → INSERT … SELECT)
 # ──────────────────────────────────────────────────────────────────────
-insert_compte = """
-INSERT INTO compte_brut (compte_did, compte_brut_handle)
-VALUES (%s, %s)
-ON CONFLICT (compte_did) DO NOTHING;
-"""
-
-update_date_premiere_analyse = """
-UPDATE compte_brut
-SET compte_date_premiere_analyse = %s
-WHERE compte_did = %s AND compte_date_premiere_analyse IS NULL;
-"""
-
-insert_post = """
-INSERT INTO post_brut (
-    post_brut_url, post_brut_date, post_brut_contenu,
-    compte_handle, post_brut_url_affichage,
-    post_brut_date_scrapping, categorie, keyword,
-    post_brut_poids, compte_did,
-    post_brut_presence_media, post_brut_temps_scraping
-)
-VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-ON CONFLICT (post_brut_url) DO NOTHING;
-"""
+TAILLE_LOT = 200
+writer = BulkWriter(conn, taille_lot=TAILLE_LOT)
 
 # ──────────────────────────────────────────────────────────────────────
 # 8) Seuil temporel : 24 h en arrière
@@ -126,12 +109,12 @@ for loop_index in range(1, NB_BOUCLES + 1):
             print(f"❌ Erreur récupération : {keyword} → {e}")
             continue
 
-        valeurs_batch = []
+        nb_en_file = 0
 
         for post in posts[:NB_POSTS_PAR_MOT_CLE]:
             try:
                 uri = post.uri
-                if uri in urls_connues:
+                if uri in urls_connues or uri in writer:
                     continue
 
                 text = getattr(post.record, "text", "").replace("\n", " ").replace("\r", "").strip()
@@ -150,45 +133,40 @@ for loop_index in range(1, NB_BOUCLES + 1):
                 compte_did     = post.author.did
                 has_media      = post.embed is not None
                 timestamp      = round(time.time(), 3)
-
-                # Insertion ou mise à jour du compte
-                cur.execute(insert_compte, (compte_did, author_handle))
-                cur.execute(update_date_premiere_analyse, (date_scrap, compte_did))
-
-                # Préparation de la ligne à insérer
-                valeurs_batch.append((
-                    uri,
-                    createdAt,
-                    text,
-                    author_handle,
-                    url_affichage,
-                    date_scrap,
-                    categorie,
-                    keyword,
-                    poids,
-                    compte_did,
-                    has_media,
-                    timestamp
-                ))
-                urls_connues.add(uri)
+                langs          = langs_declares(getattr(post.record, "langs", None))
+
+                # Mise en file du post et de son compte (date de première analyse incluse)
+                writer.ajouter(
+                    (uri, createdAt, text,
+                     author_handle, url_affichage,
+                     date_scrap, categorie, keyword,
+                     poids, compte_did,
+                     has_media, timestamp, langs),
+                    (compte_did, author_handle, date_scrap)
+                )
+                nb_en_file += 1
 
             except Exception as e:
                 print(f"⚠️ Post ignoré : {e}")
 
-        # Insertion en batch
-        try:
-            if valeurs_batch:
-                cur.executemany(insert_post, valeurs_batch)
-                conn.commit()
-                nb_inserts = len(valeurs_batch)
-                total_posts_insérés += nb_inserts
-                print(f"✅ {nb_inserts} posts insérés pour le mot-clé : {keyword}")
-                print(f"🔄 Total cumulé : {total_posts_insérés}")
-            else:
-                print(f"ℹ️ Rien à insérer pour : {keyword}")
-        except Exception as e:
-            conn.rollback()
-            print(f"❌ Échec batch [{keyword}] → rollback : {e}")
+        print(f"📥 {nb_en_file} posts mis en file pour le mot-clé : {keyword}")
+
+        # Écriture en base dès qu’un lot est plein
+        if len(writer) >= TAILLE_LOT:
+            stats = writer.flush()
+            for url in stats["urls_ecrites"]:
+                urls_connues.add(url)
+            total_posts_insérés += stats["posts_inseres"]
+            print(f"✅ {resume_lot(stats)}")
+            print(f"🔄 Total cumulé : {total_posts_insérés}")
+
+# Dernier lot partiel
+stats = writer.flush()
+for url in stats["urls_ecrites"]:
+    urls_connues.add(url)
+total_posts_insérés += stats["posts_inseres"]
+print(f"✅ {resume_lot(stats)}")
+print(f"🔄 Total cumulé : {total_posts_insérés}")
 
 # ──────────────────────────────────────────────────────────────────────
 # 10) Fermeture des connexions
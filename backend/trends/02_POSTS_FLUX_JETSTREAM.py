@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Ingestion des posts par flux Jetstream (alternative à la recherche par mot-clé)
+────────────────────────────────────────────────────────────────────────────
+Au lieu d’interroger `search_posts` mot-clé par mot-clé (mêmes posts récents
+refetchés à chaque tour, tout ce qui dépasse la 1re page est perdu), on
+consomme le flux de tous les posts publiés sur Bluesky et on compare chacun
+aux ~420 mots-clés de liste_keywords.csv en un seul passage (automate
+d’Aho-Corasick, voir flux_jetstream.py).
+
+Les posts retenus vont dans post_brut avec la même attribution
+categorie / keyword, via le BulkWriter, l’index des URLs connues et
+l’enrichissement des comptes déjà utilisés par 00_EXTRACTIONCOMPLETE.
+
+Usage :
+    python 02_POSTS_FLUX_JETSTREAM.py                        # flux live
+    python 02_POSTS_FLUX_JETSTREAM.py --record flux.jsonl    # live + enregistrement
+    python 02_POSTS_FLUX_JETSTREAM.py --replay flux.jsonl    # rejoue un enregistrement
+    python 02_POSTS_FLUX_JETSTREAM.py --replay flux.jsonl --bench   # débit pur, sans BDD
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
+
+from bulk_ingest import BulkWriter, resume_lot, parse_created_at, langs_declares
+from index_urls import IndexUrlsConnues
+from client_bluesky import creer_client
+from enrichissement_comptes import enrichir_comptes
+from flux_jetstream import (
+    AutomateMotsCles, evenements_jetstream, evenements_replay, post_depuis_evenement
+)
+
+
+# ──────────────────────────────────────────────────────────────────────
+# 1) Paramètres
+# ──────────────────────────────────────────────────────────────────────
+current_file = os.path.abspath(__file__)
+project_root = os.path.abspath(os.path.join(current_file, "..", "..", ".."))
+
+CSV_KEYWORDS_PATH = os.path.join(project_root, "data", "liste_keywords.csv")
+URL_INDEX_PATH    = os.path.join(project_root, "data", "urls_connues.npy")
+ENV_PATH          = os.path.join(project_root, ".env10")
+
+BULK_BATCH_SIZE   = 200      # Nb de posts par lot COPY
+ENRICH_INTERVAL   = 100      # Enrichissement des comptes tous les N posts insérés
+MAX_AGE_HEURES    = 24       # Même seuil de fraîcheur que l’extraction par recherche
+
+
+# ──────────────────────────────────────────────────────────────────────
+# 2) Connexion PostgreSQL / Bluesky
+# ──────────────────────────────────────────────────────────────────────
+def get_connexion():
+    load_dotenv(ENV_PATH)
+    return psycopg2.connect(
+        dbname   = os.getenv("DB_NAME"),
+        user     = os.getenv("DB_USER"),
+        password = os.getenv("DB_PASSWORD"),
+        host     = os.getenv("DB_HOST"),
+        port     = os.getenv("DB_PORT")
+    )
+
+
+def get_client():
+    load_dotenv(ENV_PATH)
+    return creer_client()
+
+
+def charger_keywords():
+    df = pd.read_csv(CSV_KEYWORDS_PATH)
+    df.columns = df.columns.str.strip().str.lower()
+    df = df.dropna(subset=["categories", "keyword"])
+    return list(zip(df["categories"], df["keyword"]))
+
+
+# ──────────────────────────────────────────────────────────────────────
+# 3) Benchmark : décodage + correspondance seuls (sans BDD ni réseau)
+# ──────────────────────────────────────────────────────────────────────
+async def bench(source, automate: AutomateMotsCles):
+    nb_evt = nb_posts = nb_match = 0
+    t0 = time.perf_counter()
+    async for evt in source:
+        nb_evt += 1
+        post = post_depuis_evenement(evt)
+        if post is None:
+            continue
+        nb_posts += 1
+        if automate.premier_match(post["text"]) is not None:
+            nb_match += 1
+    duree = time.perf_counter() - t0
+    print(json.dumps({
+        "evenements": nb_evt, "posts": nb_posts, "posts_retenus": nb_match,
+        "duree_s": round(duree, 3),
+        "evenements_par_s": round(nb_evt / duree, 1) if duree else None,
+        "posts_par_s": round(nb_posts / duree, 1) if duree else None,
+    }, indent=2))
+
+
+# ──────────────────────────────────────────────────────────────────────
+# 4) Ingestion
+# ──────────────────────────────────────────────────────────────────────
+async def ingerer(source, automate: AutomateMotsCles, conn, client, max_posts: int | None):
+    urls_connues = IndexUrlsConnues.charger(conn, URL_INDEX_PATH)
+    writer       = BulkWriter(conn, taille_lot=BULK_BATCH_SIZE)
+    inseres = depuis_enrichissement = vus = 0
+
+    async def ecrire_lot():
+        nonlocal inseres, depuis_enrichissement
+        # Exécuté dans un thread : la boucle asyncio continue de répondre aux pings du WebSocket
+        stats = await asyncio.to_thread(writer.flush)
+        print(resume_lot(stats))
+        for url in stats["urls_ecrites"]:
+            urls_connues.add(url)
+        inseres += stats["posts_inseres"]
+        depuis_enrichissement += stats["posts_inseres"]
+        if depuis_enrichissement >= ENRICH_INTERVAL:
+            st = await asyncio.to_thread(enrichir_comptes, conn, client)
+            print(f"Enrichissement : {st['enrichis']} comptes enrichis, {st['invalides']} invalides "
+                  f"({st['appels']} appels get_profiles)")
+            depuis_enrichissement = 0
+        print(f"Total : {inseres} posts insérés / {vus} posts vus")
+
+    async for evt in source:
+        post = post_depuis_evenement(evt)
+        if post is None:
+            continue
+        vus += 1
+
+        match = automate.premier_match(post["text"])
+        if match is None or post["uri"] in urls_connues or post["uri"] in writer:
+            continue
+        createdAt = parse_created_at(post["created_at"])
+        # Fraîcheur jugée à l’heure de l’événement (time_us) et non à l’heure
+        # courante : un flux rejoué avec --replay garde ses posts
+        reference = (datetime.fromtimestamp(post["time_us"] / 1e6, timezone.utc) if post["time_us"]
+                     else datetime.now(timezone.utc))
+        if createdAt is None or createdAt < reference - timedelta(hours=MAX_AGE_HEURES):
+            continue
+
+        categorie, keyword = match
+        date_scrap = datetime.now(timezone.utc)
+        writer.ajouter(
+            (post["uri"], createdAt, post["text"],
+             post["did"], f"https://bsky.app/profile/{post['did']}/post/{post['rkey']}",
+             date_scrap, categorie, keyword,
+             len(post["text"].split()), post["did"],
+             post["has_media"], round(time.time(), 3), langs_declares(post["langs"])),
+            (post["did"], post["did"], date_scrap)
+        )
+
+        if len(writer) >= BULK_BATCH_SIZE:
+            await ecrire_lot()
+        if max_posts is not None and inseres + len(writer) >= max_posts:
+            break
+
+    await ecrire_lot()
+
+
+# ──────────────────────────────────────────────────────────────────────
+# 5) Point d’entrée
+# ──────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", help="Rejoue un flux enregistré (JSONL) au lieu du flux live")
+    parser.add_argument("--cadence", type=float, default=None,
+                        help="Avec --replay : respecte les écarts d’origine, accélérés x fois")
+    parser.add_argument("--record", help="Enregistre le flux live dans ce fichier JSONL")
+    parser.add_argument("--bench", action="store_true",
+                        help="Mesure le débit décodage + correspondance, sans BDD")
+    parser.add_argument("--max_posts", type=int, default=None,
+                        help="Arrêt après ce nombre de posts insérés")
+    args = parser.parse_args()
+
+    automate = AutomateMotsCles(charger_keywords())
+    print(f"Automate construit : {len(automate.keywords)} mots-clés.")
+
+    enregistrement = open(args.record, "a", encoding="utf-8") if args.record else None
+    source = (evenements_replay(args.replay, args.cadence) if args.replay
+              else evenements_jetstream(enregistrement=enregistrement))
+
+    try:
+        if args.bench:
+            asyncio.run(bench(source, automate))
+        else:
+            conn = get_connexion()
+            try:
+                asyncio.run(ingerer(source, automate, conn, get_client(), args.max_posts))
+            finally:
+                conn.close()
+    except KeyboardInterrupt:
+        print("\nArrêt demandé.")
+    finally:
+        if enregistrement is not None:
+            enregistrement.close()
@@ -1,90 +1,76 @@
 import os
-import re
 import time
-import pandas as pd
-from tqdm import tqdm
-from langdetect import detect
-from datetime import datetime
+import argparse
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
 import psycopg2
 
+from nettoyage_posts import (
+    nettoyer_posts, nettoyer_texte, detecter_langue, choisir_langue, TAILLE_CHUNK_NETTOYAGE
+)
+
+# Moteur : curseur serveur par paquets → pool de processus → COPY (voir nettoyage_posts.py)
+
 # === Connexion PostgreSQL ===
-def get_connexions():
+def get_connexion():
     load_dotenv(r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMALIEN\05_PIGMALION_V05_DEF\.env07")
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    port = os.getenv("DB_PORT")
-    db = os.getenv("DB_NAME")
+    return psycopg2.connect(
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT")
+    )
 
-    engine = create_engine(f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db}")
-    conn = psycopg2.connect(dbname=db, user=user, password=password, host=host, port=port)
-    return engine, conn
 
-# === Nettoyage texte brut ===
-def nettoyer_texte(texte):
-    # Passage en minuscules, suppression d'URLs, mentions, hashtags et ponctuation
-    texte = texte.lower()
-    texte = re.sub(r"http\S+|@\S+|#\S+|[^\w\s]", "", texte)
-    # Normalisation des espaces
-    return re.sub(r"\s+", " ", texte).strip()
+# === Benchmark : langdetect systématique vs langues déclarées + préfiltre + cache
+def bench_langue(conn, n: int):
+    cur = conn.cursor()
+    cur.execute("SELECT post_brut_contenu, post_brut_langs FROM post_brut "
+                "WHERE post_brut_contenu IS NOT NULL ORDER BY post_brut_date DESC LIMIT %s;", (n,))
+    textes = [(nettoyer_texte(brut), langs) for brut, langs in cur.fetchall()]
+    cur.close()
 
-# === Détection de la langue ===
-def detecter_langue(texte):
-    try:
-        return detect(texte)
-    except:
-        return "und"
+    t0 = time.perf_counter()
+    ancien = [detecter_langue(clean) for clean, _ in textes]
+    t_ancien = time.perf_counter() - t0
 
-# === Connexion
-print("📡 Connexion à la base...")
-engine, conn = get_connexions()
-cur = conn.cursor()
+    t0 = time.perf_counter()
+    nouveau = [choisir_langue(clean, langs) for clean, langs in textes]
+    t_nouveau = time.perf_counter() - t0
 
-# === Sélection des posts à nettoyer
-query = """
-SELECT pb.post_brut_url, pb.post_brut_contenu
-FROM post_brut pb
-LEFT JOIN post_clean pc ON pb.post_brut_url = pc.post_url
-WHERE pc.post_url IS NULL
-  AND pb.post_brut_contenu IS NOT NULL;
-"""
+    accord = sum(a == l for a, (l, _) in zip(ancien, nouveau)) / len(textes) if textes else 0
+    print(f"{len(textes)} posts | langdetect seul : {t_ancien:.2f}s | chemin rapide : {t_nouveau:.2f}s "
+          f"(x{t_ancien / t_nouveau if t_nouveau else 0:.1f}) | même langue : {accord:.1%}")
 
-df = pd.read_sql(query, engine)
-print(f"🚀 {len(df)} posts à nettoyer.")
 
-# === Traitement et insertion
-for _, row in tqdm(df.iterrows(), total=len(df), desc="Nettoyage"):
-    url = row["post_brut_url"]
-    brut = row["post_brut_contenu"]
-    start = time.time()
+# Garde indispensable : sous Windows, chaque process du pool ré-importe ce script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk", type=int, default=TAILLE_CHUNK_NETTOYAGE,
+                        help="Nb de posts lus et traités par paquet")
+    parser.add_argument("--process", type=int, default=None,
+                        help="Nb de process de nettoyage (défaut : nb de cœurs ; 1 = sans pool)")
+    parser.add_argument("--bench", type=int, default=None,
+                        help="Compare la détection de langue sur les N derniers posts, sans rien écrire")
+    args = parser.parse_args()
 
-    # Nettoyage et métriques
-    clean = nettoyer_texte(brut)
-    langue = detecter_langue(clean)
-    poids = len(clean.split())
-    duree = round(time.time() - start, 3)
-    now = datetime.utcnow()
+    if args.bench:
+        conn = get_connexion()
+        bench_langue(conn, args.bench)
+        conn.close()
+        raise SystemExit(0)
 
-    # Insertion dans post_clean
-    cur.execute(
-        """
-        INSERT INTO post_clean (
-            post_url,
-            post_clean_contenu,
-            post_clean_langue,
-            post_clean_poids,
-            post_clean_date_nettoyage,
-            post_clean_duree_nettoyage
-        ) VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (post_url) DO NOTHING;
-        """,
-        (url, clean, langue, poids, now, duree)
-    )
-    conn.commit()
+    # === Connexions : une pour le curseur serveur, une pour les écritures
+    print("📡 Connexion à la base...")
+    conn_lecture  = get_connexion()
+    conn_ecriture = get_connexion()
+
+    try:
+        stats = nettoyer_posts(conn_lecture, conn_ecriture, args.chunk, args.process)
+    finally:
+        conn_lecture.close()
+        conn_ecriture.close()
 
-# === Fermeture
-cur.close()
-conn.close()
-print("✅ Nettoyage terminé.")
+    print(f"✅ Nettoyage terminé : {stats['inseres']} posts insérés / {stats['lus']} lus "
+          f"en {stats['duree']}s ({stats['posts_par_s']} posts/s, {stats['chunks']} paquets).")
+    print("   Origine de la langue : " + ", ".join(f"{k} {v}" for k, v in stats["sources"].most_common()))
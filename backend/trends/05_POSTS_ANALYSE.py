@@ -1,15 +1,20 @@
 import os
-import psycopg2
 import time
 from dotenv import load_dotenv
 from datetime import datetime
 from tqdm import tqdm
 import torch
 
-from transformers import (
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-    pipeline
+from dedup_contenu import assurer_colonne_hash, empreinte_contenu
+from inference_lots import resultat_depuis_scores
+from execution_modeles import ExecuteurModeles
+from file_analyse import FileAnalyse, BAIL_SECONDES
+from pool_bdd import PoolBdd, ecrire_mesures
+from cache_inference import (
+    ResultatsParHash, StockagePostgres, activation_modele, cle_modele, revision_modele
+)
+from planification_modeles import (
+    PRIORITE_RATTRAPAGE, TAUX_ECHANTILLON, BilanPlanification, decrire_politiques, politiques_modeles
 )
 
 # ───────────────────────────────────────────────────────────────────────────────
@@ -32,6 +37,49 @@ if not all([DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD]):
 # Dispositif pour les pipelines (GPU si disponible, sinon CPU)
 DEVICE = 0 if torch.cuda.is_available() else -1
 
+# Inférence par lots (voir inference_lots.py) : posts lus par passe, textes
+# triés par longueur puis passés aux modèles par mini-lots paddés
+NB_POSTS_PAR_PASSE   = 512
+TAILLE_LOT_INFERENCE = 32
+
+# Exécution des six modèles (voir execution_modeles.py) : "processus" (un process
+# épinglé par modèle), "threads", "sequentiel" ou "serveur" (serveur de modèles partagé
+# avec l'API, voir serveur_modeles.py). BUDGET_COEURS (mode "processus" seulement) fixe
+# le nombre de cœurs d'un modèle, ex. {"categories": 6, "toxicity": 4} ; les autres se
+# partagent le reste. En mode "threads", chaque modèle reçoit cœurs / nb de modèles.
+MODE_EXECUTION = "processus"
+BUDGET_COEURS  = {}
+URL_SERVEUR_MODELES = os.getenv("PIGMALION_SERVEUR_MODELES", "http://127.0.0.1:8765")
+# Modèles de même tokenizer (RoBERTa) : textes tokenisés une fois par passe pour tout le
+# groupe (voir tokenisation_partagee.py ; sans effet en mode "serveur")
+TOKENISATION_PARTAGEE = True
+
+# Backend d'inférence (voir inference_onnx.py) : "torch", "onnx" ou "onnx_int8"
+# (export ONNX dans <dossier_du_modele>_onnx au premier lancement)
+BACKEND_INFERENCE = "torch"
+
+# File de travail partagée (voir file_analyse.py) : plusieurs 05 peuvent tourner en
+# parallèle ; un couple (post, modèle) réclamé et non terminé est repris après le bail
+BAIL_FILE_SECONDES = BAIL_SECONDES
+
+# Planification (voir planification_modeles.py) : les modèles lus par 07 / 08 sont toujours
+# calculés ; les autres suivent POLITIQUES_MODELES ("echantillon", "rattrapage" par défaut,
+# "a_la_demande"), ex. {"irony": "echantillon"}. RATTRAPAGE = False : ce worker ne
+# réclame que le chemin chaud et laisse la basse priorité à d'autres runs
+POLITIQUES_MODELES = {}
+TAUX_ECHANTILLON_MODELES = TAUX_ECHANTILLON
+RATTRAPAGE = True
+
+# Cache des résultats (voir cache_inference.py) : (hash, modèle#révision) gardés en
+# mémoire (LRU) ; CACHE_MAX_LIGNES borne analyse_resultat_hash en fin de run (None = sans purge)
+CACHE_TAILLE_MEMOIRE = 200_000
+CACHE_MAX_LIGNES     = None
+
+# Accès base (voir pool_bdd.py) : connexions poolées pour tout le run ; les mesures
+# d'une passe sont écrites en une transaction, par "copy" ou "values" (execute_values)
+TAILLE_POOL_BDD  = 4
+METHODE_ECRITURE = "copy"
+
 # Chemins vers les modèles stockés localement
 MODELS = {
     "emotion":    r"C:\Users\dell\Desktop\DATA\SUP DE VINCI\08 - PROJET THAMALIEN\05_PIGMALION_V05_DEF\models\j-hartmann_emotion-english-distilroberta-base",
@@ -85,11 +133,13 @@ LABEL_MAPPING_CATEGORIES = {
 # === FONCTIONS UTILITAIRES =====================================================
 # ───────────────────────────────────────────────────────────────────────────────
 
-def get_conn():
+def creer_pool() -> PoolBdd:
     """
-    Ouvre une connexion psycopg2 vers PostgreSQL en se basant sur les variables d’environnement.
+    Ouvre le pool de connexions psycopg2 du run (variables d’environnement).
     """
-    return psycopg2.connect(
+    return PoolBdd(
+        mini=1,
+        maxi=TAILLE_POOL_BDD,
         host=DB_HOST,
         port=DB_PORT,
         dbname=DB_NAME,
@@ -97,103 +147,196 @@ def get_conn():
         password=DB_PASSWORD
     )
 
-def get_remaining_post_urls():
-    """
-    Récupère la liste de tous les post_url présents dans post_clean où post_clean_langue='en',
-    puis retire ceux déjà analysés dans chacune des tables de mesure.
-    """
-    conn = get_conn()
-    cur = conn.cursor()
-
-    # 1) tous les posts en anglais
-    cur.execute("""
-        SELECT post_url 
-        FROM post_clean 
-        WHERE post_clean_langue = 'en';
-    """)
-    all_urls = {row[0] for row in cur.fetchall()}
-
-    remaining = set(all_urls)
-    # 2) pour chaque table de mesure, retire les urls déjà insérées
-    for table in TABLES.values():
-        cur.execute(f"SELECT post_url FROM {table};")
-        done = {row[0] for row in cur.fetchall()}
-        remaining -= done
-
-    cur.close()
-    conn.close()
-    return list(remaining)
-
-def fetch_post_content(post_url: str) -> str | None:
+def fetch_posts_content(conn, post_urls: list[str]) -> dict:
     """
-    Récupère le contenu nettoyé (post_clean_contenu) d’un post donné.
+    Récupère en une requête le contenu nettoyé et le hash d’une passe de posts :
+    {post_url: (contenu, hash)}.
     """
-    conn = get_conn()
     cur = conn.cursor()
     cur.execute("""
-        SELECT post_clean_contenu 
-        FROM post_clean 
-        WHERE post_url = %s;
-    """, (post_url,))
-    res = cur.fetchone()
-    cur.close()
-    conn.close()
-    return res[0] if res else None
-
-def insert_result(post_url: str, table: str, values: list, fields: str):
-    """
-    Insère les valeurs 'values' dans la table 'table' pour les colonnes
-    spécifiées dans 'fields' (une chaîne de colonnes séparées par des virgules).
-    ON CONFLICT(post_url) DO NOTHING pour éviter les doublons.
-    """
-    conn = get_conn()
-    cur = conn.cursor()
-    placeholders = ", ".join("%s" for _ in values)
-    sql = f"""
-        INSERT INTO {table} ({fields})
-        VALUES ({placeholders})
-        ON CONFLICT (post_url) DO NOTHING;
-    """
-    cur.execute(sql, values)
+        SELECT post_url, post_clean_contenu, post_clean_hash
+        FROM post_clean
+        WHERE post_url = ANY(%s);
+    """, (list(post_urls),))
+    res = {url: (contenu, empreinte) for url, contenu, empreinte in cur.fetchall()}
     conn.commit()
     cur.close()
-    conn.close()
+    return res
 
-def load_pipeline_local(model_path: str, device: int):
+def modele_resultats(cle: str) -> str:
     """
-    Charge en local un pipeline de classification de texte à partir du dossier 'model_path'.
-    Utilise AutoTokenizer et AutoModelForSequenceClassification avec local_files_only=True.
+    Nom du modèle dans analyse_resultat_hash : "<dossier>#<révision>[@backend]~activation[+labels]".
+    Un modèle remplacé change de révision ; les scores ONNX / int8, ceux d'une
+    autre activation et ceux des catégories regroupées sont stockés à part.
     """
-    tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
-    model     = AutoModelForSequenceClassification.from_pretrained(model_path, local_files_only=True)
-    return pipeline(
-        "text-classification",
-        model= model,
-        tokenizer= tokenizer,
-        device= device,
-        top_k= None
-    )
+    chemin = MODELS[cle]
+    return cle_modele(os.path.basename(chemin), revision_modele(chemin), BACKEND_INFERENCE,
+                      activation_modele(chemin), LABEL_MAPPING_CATEGORIES if cle == "categories" else None)
 
-def analyse_post(pipe, texte: str, label_mapping: dict | None = None):
+def construire_mesure(cle: str, post_url: str, date_analyse, duree: float,
+                      label_pred: str, score_pred: float, scores_dict: dict):
     """
-    Applique le pipeline 'pipe' sur le texte donné,
-    construit un dictionnaire scores[label] = max(score),
-    retourne (label_prédominant, score_prédominant, scores_dict, durée_analysis).
+    Prépare les colonnes et la liste `values` de la table de mesure du modèle `cle`.
+    Retourne (colonnes, values), ou None pour une clé inconnue.
     """
-    t0 = time.time()
-    result = pipe(texte, top_k=None)
-    # result est une liste de dicts [{ 'label': ..., 'score': ... }, ...]
-    scores = {}
-    for item in result:
-        lbl = item["label"].lower()
-        if label_mapping:
-            lbl = label_mapping.get(lbl, lbl)
-        # on garde le score max par label
-        scores[lbl] = max(scores.get(lbl, 0.0), float(item["score"]))
-    # label prédominant
-    pred = max(scores, key=scores.get)
-    duree = round(time.time() - t0, 3)
-    return pred, scores[pred], scores, duree
+    if cle == "emotion":
+        fields = ", ".join([
+            "post_url",
+            "post_clean_mesure_emotion_date_analyse",
+            "post_clean_mesure_emotion_duree_analyse",
+            "post_clean_mesure_emotion_modele",
+            "post_clean_mesure_emotion_label_predominant",
+            "post_clean_mesure_emotion_score_predominant",
+            "post_clean_mesure_emotion_score_anger",
+            "post_clean_mesure_emotion_score_disgust",
+            "post_clean_mesure_emotion_score_fear",
+            "post_clean_mesure_emotion_score_joy",
+            "post_clean_mesure_emotion_score_neutral",
+            "post_clean_mesure_emotion_score_sadness",
+            "post_clean_mesure_emotion_score_surprise"
+        ])
+        # s'assurer que les clés existent dans scores_dict
+        values = [
+            post_url,
+            date_analyse,
+            duree,
+            os.path.basename(MODELS[cle]),
+            label_pred,
+            score_pred,
+            scores_dict.get("anger", 0.0),
+            scores_dict.get("disgust", 0.0),
+            scores_dict.get("fear", 0.0),
+            scores_dict.get("joy", 0.0),
+            scores_dict.get("neutral", 0.0),
+            scores_dict.get("sadness", 0.0),
+            scores_dict.get("surprise", 0.0)
+        ]
+
+    elif cle == "tone":
+        fields = ", ".join([
+            "post_url",
+            "post_clean_mesure_ton_date_analyse",
+            "post_clean_mesure_ton_duree_analyse",
+            "post_clean_mesure_ton_modele",
+            "post_clean_mesure_ton_label_predominant",
+            "post_clean_mesure_ton_score_predominant",
+            "post_clean_mesure_ton_score_positive",
+            "post_clean_mesure_ton_score_neutre",
+            "post_clean_mesure_ton_score_negative"
+        ])
+        values = [
+            post_url,
+            date_analyse,
+            duree,
+            os.path.basename(MODELS[cle]),
+            label_pred,
+            score_pred,
+            scores_dict.get("positive", 0.0),
+            scores_dict.get("neutral", 0.0),
+            scores_dict.get("negative", 0.0)
+        ]
+
+    elif cle == "veracity":
+        fields = ", ".join([
+            "post_url",
+            "post_clean_mesure_veracitedirecte_date_analyse",
+            "post_clean_mesure_veracitedirecte_duree_analyse",
+            "post_clean_mesure_veracitedirecte_modele",
+            "post_clean_mesure_veracitedirecte_label_predominant",
+            "post_clean_mesure_veracitedirecte_score_predominant",
+            "post_clean_mesure_veracitedirecte_score_real",
+            "post_clean_mesure_veracitedirecte_score_fake"
+        ])
+        values = [
+            post_url,
+            date_analyse,
+            duree,
+            os.path.basename(MODELS[cle]),
+            label_pred,
+            score_pred,
+            scores_dict.get("real", 0.0),
+            scores_dict.get("fake", 0.0)
+        ]
+
+    elif cle == "irony":
+        fields = ", ".join([
+            "post_url",
+            "post_clean_mesure_ironie_date_analyse",
+            "post_clean_mesure_ironie_duree_analyse",
+            "post_clean_mesure_ironie_modele",
+            "post_clean_mesure_ironie_label_predominant",
+            "post_clean_mesure_ironie_score_predominant",
+            "post_clean_mesure_ironie_score_non_irony",
+            "post_clean_mesure_ironie_score_irony"
+        ])
+        values = [
+            post_url,
+            date_analyse,
+            duree,
+            os.path.basename(MODELS[cle]),
+            label_pred,
+            score_pred,
+            scores_dict.get("non_irony", 0.0),
+            scores_dict.get("irony", 0.0)
+        ]
+
+    elif cle == "toxicity":
+        fields = ", ".join([
+            "post_url",
+            "post_clean_mesure_toxicite_date_analyse",
+            "post_clean_mesure_toxicite_duree_analyse",
+            "post_clean_mesure_toxicite_modele",
+            "post_clean_mesure_toxicite_label_predominant",
+            "post_clean_mesure_toxicite_score_predominant",
+            "post_clean_mesure_toxicite_score_toxic",
+            "post_clean_mesure_toxicite_score_severe_toxic",
+            "post_clean_mesure_toxicite_score_obscene",
+            "post_clean_mesure_toxicite_score_threat",
+            "post_clean_mesure_toxicite_score_insult",
+            "post_clean_mesure_toxicite_score_identity_hate"
+        ])
+        values = [
+            post_url,
+            date_analyse,
+            duree,
+            os.path.basename(MODELS[cle]),
+            label_pred,
+            score_pred,
+            scores_dict.get("toxic", 0.0),
+            scores_dict.get("severe_toxic", 0.0),
+            scores_dict.get("obscene", 0.0),
+            scores_dict.get("threat", 0.0),
+            scores_dict.get("insult", 0.0),
+            scores_dict.get("identity_hate", 0.0)
+        ]
+
+    elif cle == "categories":
+        # tri alphabétique des catégories mappées
+        mapped_labels = sorted(set(LABEL_MAPPING_CATEGORIES.values()))
+        score_cols = ", ".join(f"post_clean_mesure_categories_score_{lbl}" for lbl in mapped_labels)
+        fields = ", ".join([
+            "post_url",
+            "post_clean_mesure_categories_date_analyse",
+            "post_clean_mesure_categories_duree_analyse",
+            "post_clean_mesure_categories_modele",
+            "post_clean_mesure_categories_label_predominant",
+            "post_clean_mesure_categories_score_predominant",
+            score_cols
+        ])
+        values = [
+            post_url,
+            date_analyse,
+            duree,
+            os.path.basename(MODELS[cle]),
+            label_pred,
+            score_pred
+        ] + [scores_dict.get(lbl, 0.0) for lbl in mapped_labels]
+
+    else:
+        # clé inconnue : passer
+        return None
+
+    return fields.split(", "), values
 
 # ───────────────────────────────────────────────────────────────────────────────
 # === PROGRAMME PRINCIPAL ========================================================
@@ -202,208 +345,168 @@ def analyse_post(pipe, texte: str, label_mapping: dict | None = None):
 if __name__ == "__main__":
     print("📦 Chargement des modèles locaux...")
 
-    # 1) Charger un pipeline pour chaque modèle
-    pipelines: dict[str, pipeline] = {}
+    # 1) Charger chaque modèle (inférence par lots), chacun sur son budget de cœurs
     for cle, chemin in MODELS.items():
         print(f"  • {cle} ← {chemin}")
-        try:
-            pipelines[cle] = load_pipeline_local(chemin, DEVICE)
-        except Exception as e:
-            print(f"❌ Échec chargement modèle '{cle}' depuis '{chemin}': {e}")
-            raise SystemExit(1)
-
-    print("✅ Tous les modèles ont été chargés.\n")
-
-    # 2) Récupérer la liste des posts à analyser
-    print("🔎 Récupération des URLs restantes à analyser...")
-    urls = get_remaining_post_urls()
-    total = len(urls)
-    print(f"👉  Nombre de posts à traiter : {total}\n")
-
-    # 3) Pour chaque post : fetch contenu, puis appliquer tous les pipelines
-    for post_url in tqdm(urls, desc="Progression globale"):
-        texte = fetch_post_content(post_url)
-        if not texte:
-            continue
-
-        date_analyse = datetime.utcnow()
-
-        for cle, pipe in pipelines.items():
-            table = TABLES[cle]
-
-            # Appliquer le modèle
+    try:
+        executeur = ExecuteurModeles(MODELS, DEVICE, MODE_EXECUTION, BUDGET_COEURS, TAILLE_LOT_INFERENCE,
+                                     BACKEND_INFERENCE, URL_SERVEUR_MODELES, TOKENISATION_PARTAGEE)
+    except Exception as e:
+        print(f"❌ Échec chargement des modèles : {e}")
+        raise SystemExit(1)
+
+    print(f"✅ Tous les modèles ont été chargés ({executeur.decrire()}).\n")
+
+    # 2) Hash de contenu (rattrapage des posts nettoyés avant son introduction)
+    pool = creer_pool()
+    conn_hash = pool.prendre()
+    nb_rattrapes = assurer_colonne_hash(conn_hash, rattraper=True)
+    if nb_rattrapes:
+        print(f"#️⃣  Hash de contenu calculé pour {nb_rattrapes} posts existants.")
+
+    # 3) File de travail : ajout des posts anglais pas encore en file
+    conn_file = pool.prendre()
+    politiques = politiques_modeles(MODELS, POLITIQUES_MODELES)
+    print(f"🗂️  Politiques : {decrire_politiques(politiques, TAUX_ECHANTILLON_MODELES)}"
+          f"{'' if RATTRAPAGE else ' (rattrapage non réclamé par ce worker)'}")
+    file = FileAnalyse(conn_file, TABLES, politiques, bail_secondes=BAIL_FILE_SECONDES,
+                       taux_echantillon=TAUX_ECHANTILLON_MODELES, rattrapage=RATTRAPAGE)
+    print(f"🔎 Alimentation de la file ({file.worker})...")
+    nb_ajoutes = file.alimenter()
+    etat = file.etat()
+    par_priorite = file.en_attente_par_priorite()
+    print(f"👉  {nb_ajoutes} couples (post, modèle) ajoutés | en attente : {etat['en_attente']} "
+          f"(dont rattrapage : {par_priorite[PRIORITE_RATTRAPAGE]}) | "
+          f"en cours ailleurs : {etat['en_cours']} | faits : {etat['fait']}\n")
+    a_traiter = etat["en_attente"] if RATTRAPAGE else etat["en_attente"] - par_priorite[PRIORITE_RATTRAPAGE]
+    resultats_hash = ResultatsParHash(StockagePostgres(conn_hash), CACHE_TAILLE_MEMOIRE)
+    bilan = BilanPlanification(politiques)
+
+    # 4) Par passes : réclamer jusqu'à NB_POSTS_PAR_PASSE posts (SKIP LOCKED), puis chaque
+    #    modèle ne reçoit que les textes distincts encore jamais analysés, en mini-lots
+    #    triés par longueur ; les autres posts recopient les scores d’un texte identique
+    t_debut = time.time()
+    nb_posts = 0
+    with tqdm(total=a_traiter, desc="Progression globale", unit="mesure") as pbar:
+        while True:
+            reclames = file.reclamer(NB_POSTS_PAR_PASSE)      # {post_url: {cle, ...}}
+            if not reclames:
+                break
+            with pool.connexion() as conn:
+                contenus = fetch_posts_content(conn, list(reclames))
+            passe, vides = [], []
+            for post_url, cles in reclames.items():
+                texte, empreinte = contenus.get(post_url, (None, None))
+                if not texte:
+                    vides.append(post_url)
+                    continue
+                empreinte = empreinte or empreinte_contenu(texte)
+                resultats_hash.compter_post(empreinte)
+                bilan.observer_post(cles)
+                passe.append((post_url, empreinte, texte, cles))
+            file.ignorer(vides)
+            nb_posts += len(passe)
+
+            date_analyse = datetime.utcnow()
+
+            # Textes distincts sans résultat (mémoire puis une lecture groupée par modèle) ;
+            # les six modèles tournent en même temps
+            a_calculer, connus = {}, {}
+            for cle in MODELS:
+                textes = {}
+                for _, empreinte, texte, cles in passe:
+                    if cle in cles:
+                        textes.setdefault(empreinte, texte)
+                connus[cle] = resultats_hash.get_lot(modele_resultats(cle), textes)
+                a_calculer[cle] = {h: t for h, t in textes.items() if h not in connus[cle]}
+            sorties = executeur.predire({cle: list(textes.values()) for cle, textes in a_calculer.items()})
+            file.prolonger()
+
+            # Lignes de mesure de la passe, par table : {table: (colonnes, lignes)}
+            mesures, couples_ecrits, echecs = {}, [], []
+            for cle in MODELS:
+                table = TABLES[cle]
+                modele = modele_resultats(cle)
+                label_mapping = LABEL_MAPPING_CATEGORIES if cle == "categories" else None
+                couples = [(post_url, empreinte) for post_url, empreinte, _, cles in passe if cle in cles]
+
+                nouveaux = set()
+                if a_calculer[cle]:
+                    sortie = sorties[cle]
+                    if isinstance(sortie, Exception):
+                        print(f"❌ Erreur lors de l'analyse '{cle}' (passe de {len(a_calculer[cle])} textes): {sortie}")
+                        echecs += [(post_url, cle) for post_url, _ in couples]
+                        continue
+                    scores_lot, duree_lot = sortie
+                    bilan.observer_inference(cle, len(a_calculer[cle]), duree_lot)
+                    # Durée par post : temps du lot réparti sur ses textes
+                    duree = round(duree_lot / len(a_calculer[cle]), 4)
+                    for empreinte, scores in zip(a_calculer[cle], scores_lot):
+                        label_pred, score_pred, scores_dict = resultat_depuis_scores(scores, label_mapping)
+                        resultat = {"label_predominant": label_pred, "score_predominant": score_pred,
+                                    "scores": scores_dict, "duree": duree}
+                        resultats_hash.memoriser(modele, empreinte, resultat)
+                        connus[cle][empreinte] = resultat
+                        nouveaux.add(empreinte)
+
+                for post_url, empreinte in couples:
+                    resultat = connus[cle].get(empreinte)
+                    if resultat is None:
+                        echecs.append((post_url, cle))
+                        continue
+                    label_pred  = resultat["label_predominant"]
+                    score_pred  = resultat["score_predominant"]
+                    scores_dict = resultat["scores"]
+                    if empreinte in nouveaux:
+                        # Premier post de la passe pour ce texte : scores tout juste calculés
+                        nouveaux.discard(empreinte)
+                        duree = resultat["duree"]
+                    else:
+                        # Texte déjà analysé par ce modèle : aucune inférence, durée nulle
+                        resultats_hash.compter_reutilisation(resultat)
+                        duree = 0.0
+
+                    mesure = construire_mesure(cle, post_url, date_analyse, duree,
+                                               label_pred, score_pred, scores_dict)
+                    if mesure is None:
+                        continue
+                    colonnes, values = mesure
+                    mesures.setdefault(table, (colonnes, []))[1].append(values)
+                    couples_ecrits.append((post_url, cle))
+
+            # 5) Écrire les six tables de mesure et les résultats par hash en une
+            #    transaction, puis marquer les couples comme faits
             try:
-                label_pred, score_pred, scores_dict, duree = analyse_post(
-                    pipe,
-                    texte,
-                    LABEL_MAPPING_CATEGORIES if cle == "categories" else None
-                )
+                with pool.transaction() as conn:
+                    ecrire_mesures(conn, mesures, METHODE_ECRITURE)
+                    with conn.cursor() as cur:
+                        resultats_hash.ecrire_en_attente(cur)
             except Exception as e:
-                print(f"❌ Erreur lors de l'analyse '{cle}' pour '{post_url}': {e}")
-                continue
-
-            # Préparer le `fields` et la liste `values` en fonction de chaque clé
-            if cle == "emotion":
-                fields = ", ".join([
-                    "post_url",
-                    "post_clean_mesure_emotion_date_analyse",
-                    "post_clean_mesure_emotion_duree_analyse",
-                    "post_clean_mesure_emotion_modele",
-                    "post_clean_mesure_emotion_label_predominant",
-                    "post_clean_mesure_emotion_score_predominant",
-                    "post_clean_mesure_emotion_score_anger",
-                    "post_clean_mesure_emotion_score_disgust",
-                    "post_clean_mesure_emotion_score_fear",
-                    "post_clean_mesure_emotion_score_joy",
-                    "post_clean_mesure_emotion_score_neutral",
-                    "post_clean_mesure_emotion_score_sadness",
-                    "post_clean_mesure_emotion_score_surprise"
-                ])
-                # s'assurer que les clés existent dans scores_dict
-                values = [
-                    post_url,
-                    date_analyse,
-                    duree,
-                    os.path.basename(MODELS[cle]),
-                    label_pred,
-                    score_pred,
-                    scores_dict.get("anger", 0.0),
-                    scores_dict.get("disgust", 0.0),
-                    scores_dict.get("fear", 0.0),
-                    scores_dict.get("joy", 0.0),
-                    scores_dict.get("neutral", 0.0),
-                    scores_dict.get("sadness", 0.0),
-                    scores_dict.get("surprise", 0.0)
-                ]
-
-            elif cle == "tone":
-                fields = ", ".join([
-                    "post_url",
-                    "post_clean_mesure_ton_date_analyse",
-                    "post_clean_mesure_ton_duree_analyse",
-                    "post_clean_mesure_ton_modele",
-                    "post_clean_mesure_ton_label_predominant",
-                    "post_clean_mesure_ton_score_predominant",
-                    "post_clean_mesure_ton_score_positive",
-                    "post_clean_mesure_ton_score_neutre",
-                    "post_clean_mesure_ton_score_negative"
-                ])
-                values = [
-                    post_url,
-                    date_analyse,
-                    duree,
-                    os.path.basename(MODELS[cle]),
-                    label_pred,
-                    score_pred,
-                    scores_dict.get("positive", 0.0),
-                    scores_dict.get("neutral", 0.0),
-                    scores_dict.get("negative", 0.0)
-                ]
-
-            elif cle == "veracity":
-                fields = ", ".join([
-                    "post_url",
-                    "post_clean_mesure_veracitedirecte_date_analyse",
-                    "post_clean_mesure_veracitedirecte_duree_analyse",
-                    "post_clean_mesure_veracitedirecte_modele",
-                    "post_clean_mesure_veracitedirecte_label_predominant",
-                    "post_clean_mesure_veracitedirecte_score_predominant",
-                    "post_clean_mesure_veracitedirecte_score_real",
-                    "post_clean_mesure_veracitedirecte_score_fake"
-                ])
-                values = [
-                    post_url,
-                    date_analyse,
-                    duree,
-                    os.path.basename(MODELS[cle]),
-                    label_pred,
-                    score_pred,
-                    scores_dict.get("real", 0.0),
-                    scores_dict.get("fake", 0.0)
-                ]
-
-            elif cle == "irony":
-                fields = ", ".join([
-                    "post_url",
-                    "post_clean_mesure_ironie_date_analyse",
-                    "post_clean_mesure_ironie_duree_analyse",
-                    "post_clean_mesure_ironie_modele",
-                    "post_clean_mesure_ironie_label_predominant",
-                    "post_clean_mesure_ironie_score_predominant",
-                    "post_clean_mesure_ironie_score_non_irony",
-                    "post_clean_mesure_ironie_score_irony"
-                ])
-                values = [
-                    post_url,
-                    date_analyse,
-                    duree,
-                    os.path.basename(MODELS[cle]),
-                    label_pred,
-                    score_pred,
-                    scores_dict.get("non_irony", 0.0),
-                    scores_dict.get("irony", 0.0)
-                ]
-
-            elif cle == "toxicity":
-                fields = ", ".join([
-                    "post_url",
-                    "post_clean_mesure_toxicite_date_analyse",
-                    "post_clean_mesure_toxicite_duree_analyse",
-                    "post_clean_mesure_toxicite_modele",
-                    "post_clean_mesure_toxicite_label_predominant",
-                    "post_clean_mesure_toxicite_score_predominant",
-                    "post_clean_mesure_toxicite_score_toxic",
-                    "post_clean_mesure_toxicite_score_severe_toxic",
-                    "post_clean_mesure_toxicite_score_obscene",
-                    "post_clean_mesure_toxicite_score_threat",
-                    "post_clean_mesure_toxicite_score_insult",
-                    "post_clean_mesure_toxicite_score_identity_hate"
-                ])
-                values = [
-                    post_url,
-                    date_analyse,
-                    duree,
-                    os.path.basename(MODELS[cle]),
-                    label_pred,
-                    score_pred,
-                    scores_dict.get("toxic", 0.0),
-                    scores_dict.get("severe_toxic", 0.0),
-                    scores_dict.get("obscene", 0.0),
-                    scores_dict.get("threat", 0.0),
-                    scores_dict.get("insult", 0.0),
-                    scores_dict.get("identity_hate", 0.0)
-                ]
-
-            elif cle == "categories":
-                # tri alphabétique des catégories mappées
-                mapped_labels = sorted(set(LABEL_MAPPING_CATEGORIES.values()))
-                score_cols = ", ".join(f"post_clean_mesure_categories_score_{lbl}" for lbl in mapped_labels)
-                fields = ", ".join([
-                    "post_url",
-                    "post_clean_mesure_categories_date_analyse",
-                    "post_clean_mesure_categories_duree_analyse",
-                    "post_clean_mesure_categories_modele",
-                    "post_clean_mesure_categories_label_predominant",
-                    "post_clean_mesure_categories_score_predominant",
-                    score_cols
-                ])
-                values = [
-                    post_url,
-                    date_analyse,
-                    duree,
-                    os.path.basename(MODELS[cle]),
-                    label_pred,
-                    score_pred
-                ] + [scores_dict.get(lbl, 0.0) for lbl in mapped_labels]
-
+                # Les résultats par hash restent en attente : réécrits avec la passe suivante
+                print(f"❌ Échec écriture de la passe ({len(couples_ecrits)} mesures) : {e}")
+                echecs += couples_ecrits
             else:
-                # clé inconnue : passer
-                continue
-
-            # 4) Insérer dans la table dédiée
-            try:
-                insert_result(post_url, table, values, fields)
-            except Exception as e:
-                print(f"❌ Échec INSERT dans '{table}' pour '{post_url}': {e}")
-
+                resultats_hash.confirmer_ecriture()
+                file.terminer(couples_ecrits)
+            file.echouer(echecs)
+            pbar.update(sum(len(cles) for cles in reclames.values()))
+
+    rapport_tokenisation = executeur.rapport()
+    executeur.fermer()
+    if CACHE_MAX_LIGNES:
+        nb_purges = resultats_hash.stockage.purger(CACHE_MAX_LIGNES)
+        print(f"🧹 {nb_purges} résultats anciens purgés de analyse_resultat_hash.")
+    pool.rendre(conn_hash)
+    etat = file.etat()
+    pool.rendre(conn_file)
+    pool.fermer()
+    duree_totale = time.time() - t_debut
+    print(resultats_hash.rapport())
+    print(bilan.rapport())
+    if rapport_tokenisation:
+        print(rapport_tokenisation)
+    print(f"⏱️  {nb_posts} posts en {duree_totale:.0f}s "
+          f"({nb_posts / duree_totale if duree_totale else 0:.1f} posts/s, lots de {TAILLE_LOT_INFERENCE}).")
+    print(f"📋 File : {etat['fait']} faits, {etat['en_attente']} en attente, {etat['en_cours']} en cours, "
+          f"{etat['erreur']} en erreur, {etat['ignore']} sans contenu.")
     print("\n✅ Analyse globale terminée.")
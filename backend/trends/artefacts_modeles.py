@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Préparation des artefacts de modèles : safetensors + manifeste (05 et API)
+────────────────────────────────────────────────────────────────────────────
+Les dossiers de modèles livrent leurs poids en pytorch_model.bin (pickle) :
+à chaque démarrage, from_pretrained désérialise le fichier entier et en
+recopie le contenu en mémoire, dans 05 comme dans l’API.
+
+preparer_modele(chemin) convertit une fois le dossier :
+ • model.safetensors écrit à côté du .bin (save_pretrained, qui gère les
+   poids liés), puis relu et comparé tenseur par tenseur au .bin ;
+ • manifeste artefacts.json : fichier source et fichiers générés, avec
+   taille et sha256, nombre de tenseurs, versions de torch / transformers.
+
+Au chargement, options_chargement(chemin) vérifie (vite : présence et
+taille) que le safetensors correspond au manifeste et impose
+use_safetensors=True. Les poids sont alors lus par mmap (safe_open) : pas
+de désérialisation pickle, et le cache de pages est partagé entre 05,
+l’API et ses workers. Un artefact absent ou incohérent → retour au .bin.
+
+revision_modele (cache_inference.py) ignore les fichiers générés et lit les
+sha256 du manifeste : la conversion ne change pas les poids, les résultats
+déjà en cache restent valides, même après suppression du .bin.
+
+    python artefacts_modeles.py --dossier <dossier_models>              # conversion
+    python artefacts_modeles.py --dossier <dossier_models> --verifier   # sha256 complet
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+
+MANIFESTE       = "artefacts.json"
+FICHIER_ST      = "model.safetensors"
+FICHIERS_SOURCE = ("pytorch_model.bin", "model.bin")
+
+
+def sha256_fichier(chemin: str, taille_bloc: int = 2**20) -> str:
+    empreinte = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        while bloc := f.read(taille_bloc):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def _description(chemin: str) -> dict:
+    return {"taille": os.path.getsize(chemin), "sha256": sha256_fichier(chemin)}
+
+
+def lire_manifeste(chemin: str) -> dict | None:
+    try:
+        with open(os.path.join(chemin, MANIFESTE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# ==================
+# === CONVERSION ===
+# ==================
+def preparer_modele(chemin: str, forcer: bool = False) -> dict:
+    """Convertit le dossier en safetensors, vérifie la parité et écrit le manifeste."""
+    import torch
+    import transformers
+    from safetensors.torch import load_file
+    from transformers import AutoModelForSequenceClassification
+
+    manifeste = lire_manifeste(chemin)
+    if manifeste and not forcer and verifier_modele(chemin, complet=False)["ok"]:
+        return manifeste
+    source = next((nom for nom in FICHIERS_SOURCE if os.path.exists(os.path.join(chemin, nom))), None)
+    if source is None and not os.path.exists(os.path.join(chemin, FICHIER_ST)):
+        raise FileNotFoundError(f"Aucun fichier de poids ({', '.join(FICHIERS_SOURCE)}) dans {chemin}")
+
+    t0 = time.time()
+    if source:
+        model = AutoModelForSequenceClassification.from_pretrained(chemin, local_files_only=True,
+                                                                   use_safetensors=False)
+        with tempfile.TemporaryDirectory(dir=chemin) as tmp:
+            model.save_pretrained(tmp, safe_serialization=True)
+            if not os.path.exists(os.path.join(tmp, FICHIER_ST)):
+                raise RuntimeError(f"{os.path.basename(chemin)} : poids trop gros pour un seul fichier "
+                                   f"safetensors (découpage non géré)")
+            # Parité : chaque tenseur relu du safetensors égal à celui du modèle chargé depuis le .bin
+            etat = model.state_dict()
+            relus = load_file(os.path.join(tmp, FICHIER_ST))
+            differents = [nom for nom, t in relus.items() if not torch.equal(t, etat[nom])]
+            if differents:
+                raise RuntimeError(f"{os.path.basename(chemin)} : tenseurs différents après conversion : "
+                                   f"{', '.join(differents[:5])}")
+            nb_tenseurs = len(relus)
+            del relus
+            os.replace(os.path.join(tmp, FICHIER_ST), os.path.join(chemin, FICHIER_ST))
+    else:
+        # Déjà livré en safetensors : manifeste seul, le fichier d'origine tient lieu de source
+        nb_tenseurs = len(load_file(os.path.join(chemin, FICHIER_ST)))
+
+    manifeste = {
+        "format": "safetensors",
+        "source": {source or FICHIER_ST: _description(os.path.join(chemin, source or FICHIER_ST))},
+        "fichiers": {FICHIER_ST: _description(os.path.join(chemin, FICHIER_ST))} if source else {},
+        "nb_tenseurs": nb_tenseurs,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "versions": {"torch": torch.__version__, "transformers": transformers.__version__},
+    }
+    with open(os.path.join(chemin, MANIFESTE + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump(manifeste, f, indent=2)
+    os.replace(os.path.join(chemin, MANIFESTE + ".tmp"), os.path.join(chemin, MANIFESTE))
+    print(f"  • {os.path.basename(chemin)} : {nb_tenseurs} tenseurs → {FICHIER_ST} en {time.time() - t0:.1f}s")
+    return manifeste
+
+
+def verifier_modele(chemin: str, complet: bool = True) -> dict:
+    """
+    Cohérence du dossier avec son manifeste : présence et taille des fichiers
+    (rapide), plus sha256 si `complet`. {"ok": bool, "erreurs": [...]}.
+    """
+    manifeste = lire_manifeste(chemin)
+    if manifeste is None:
+        return {"ok": False, "erreurs": [f"pas de {MANIFESTE}"]}
+    erreurs = []
+    for nom, attendu in {**manifeste.get("fichiers", {}), **manifeste.get("source", {})}.items():
+        fichier = os.path.join(chemin, nom)
+        if not os.path.exists(fichier):
+            # Un .bin source supprimé après conversion n'empêche pas de charger le safetensors
+            if nom in manifeste.get("fichiers", {}):
+                erreurs.append(f"{nom} absent")
+            continue
+        if os.path.getsize(fichier) != attendu["taille"]:
+            erreurs.append(f"{nom} : taille {os.path.getsize(fichier)} ≠ {attendu['taille']}")
+        elif complet and sha256_fichier(fichier) != attendu["sha256"]:
+            erreurs.append(f"{nom} : sha256 différent")
+    return {"ok": not erreurs, "erreurs": erreurs}
+
+
+# ===================
+# === CHARGEMENT ===
+# ===================
+def options_chargement(chemin: str) -> dict:
+    """
+    Arguments de from_pretrained pour `chemin` : safetensors (mmap) si le
+    dossier a été préparé et que la vérification rapide passe, sinon le .bin.
+    """
+    if lire_manifeste(chemin) is None or not os.path.exists(os.path.join(chemin, FICHIER_ST)):
+        return {}
+    verification = verifier_modele(chemin, complet=False)
+    if not verification["ok"]:
+        print(f"⚠️  {os.path.basename(chemin)} : artefact safetensors incohérent "
+              f"({'; '.join(verification['erreurs'])}), chargement du .bin")
+        return {"use_safetensors": False}
+    return {"use_safetensors": True}
+
+
+def dossiers_modeles(dossier: str) -> list[str]:
+    """Sous-dossiers contenant un config.json (un modèle chacun)."""
+    return sorted(os.path.join(dossier, nom) for nom in os.listdir(dossier)
+                  if os.path.exists(os.path.join(dossier, nom, "config.json")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversion des modèles locaux en safetensors + manifeste")
+    parser.add_argument("--dossier", required=True, help="Dossier contenant les dossiers des modèles")
+    parser.add_argument("--verifier", action="store_true", help="Vérifie les sha256 sans convertir")
+    parser.add_argument("--forcer", action="store_true", help="Reconvertit même si le manifeste est valide")
+    parser.add_argument("--supprimer_source", action="store_true",
+                        help="Supprime le .bin après conversion vérifiée")
+    args = parser.parse_args()
+
+    echecs = 0
+    for chemin in dossiers_modeles(args.dossier):
+        if args.verifier:
+            verification = verifier_modele(chemin, complet=True)
+            print(f"  • {os.path.basename(chemin)} : "
+                  f"{'ok' if verification['ok'] else 'ÉCHEC — ' + '; '.join(verification['erreurs'])}")
+            echecs += not verification["ok"]
+            continue
+        try:
+            manifeste = preparer_modele(chemin, args.forcer)
+        except Exception as e:
+            print(f"❌ {os.path.basename(chemin)} : {e}")
+            echecs += 1
+            continue
+        # Seulement un .bin / model.bin, et seulement si un safetensors vérifié a été
+        # généré : un dossier livré en safetensors a ce fichier pour « source »
+        if args.supprimer_source and manifeste.get("fichiers"):
+            for nom in manifeste.get("source", {}):
+                if nom in FICHIERS_SOURCE and os.path.exists(os.path.join(chemin, nom)):
+                    os.remove(os.path.join(chemin, nom))
+    sys.exit(1 if echecs else 0)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Démarrage à froid de l’API : temps d’import de backend.main et RSS
+────────────────────────────────────────────────────────────────────────────
+Importer backend/main.py importait analyse_post_unitaire.py, qui se
+connectait à Bluesky et chargeait les six pipelines. Ce banc mesure, dans
+un process neuf par arbre de sources :
+ • l’import de backend.main : durée, RSS après import, modèles chargés ;
+ • avec --prechauffer : le temps jusqu’à l’état prêt (client Bluesky + les
+   modèles d’/analyze) et le RSS à ce moment ;
+ • le pic de RSS du process.
+
+Comparer avant / après sur deux arbres (par ex. un `git worktree` du commit
+d’avant) :
+    git worktree add /tmp/pigmalion_avant <commit>
+    python bench_demarrage_api.py --racines /tmp/pigmalion_avant,../.. --prechauffer --sortie demarrage.json
+BLUESKY_CLIENT_MODE=replay évite le réseau (voir client_bluesky.py) ; les
+deux arbres lisent le même backend/.env10 s’il est présent dans chacun.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import subprocess
+
+from memoire_process import pic_rss_mo, rss_mo
+
+MODULE_ANALYSE = "backend.analyse.analyse_post_unitaire"
+
+
+def mesurer_demarrage(racine: str, prechauffer: bool) -> dict:
+    """Dans le process courant (neuf) : import de backend.main depuis `racine`, puis préchauffage."""
+    # Les modules de trends/ importés par leur nom doivent venir de `racine`, pas de ce dossier
+    dossier_bench = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [c for c in sys.path if os.path.abspath(c or ".") != dossier_bench]
+    sys.path.insert(0, os.path.abspath(racine))
+    rss_depart = rss_mo()
+    t0 = time.perf_counter()
+    importlib.import_module("backend.main")
+    mesure = {"racine": os.path.abspath(racine), "import_s": round(time.perf_counter() - t0, 3),
+              "rss_depart_mo": rss_depart, "rss_import_mo": rss_mo()}
+    analyse = sys.modules[MODULE_ANALYSE]
+    # Arbres d'avant le chargement paresseux : pipelines déjà créés comme attributs du module
+    paresseux = hasattr(analyse, "etat_preparation")
+    mesure["modeles_import"] = (analyse.etat_preparation()["modeles_charges"] if paresseux
+                                else sorted(k for k in vars(analyse) if k.startswith("pipe_")))
+
+    if prechauffer:
+        t1 = time.perf_counter()
+        if paresseux:
+            analyse.prechauffer()
+            etat = analyse.etat_preparation()
+            mesure["pret"] = etat["pret"]
+            mesure["modeles_prets"] = etat["modeles_charges"]
+        else:
+            mesure["pret"] = True
+            mesure["modeles_prets"] = mesure["modeles_import"]
+        mesure["pret_s"] = round(mesure["import_s"] + time.perf_counter() - t1, 3)
+        mesure["rss_pret_mo"] = rss_mo()
+    mesure["pic_rss_mo"] = pic_rss_mo()
+    return mesure
+
+
+def resume(mesures: list[dict]) -> str:
+    lignes = [f"{'arbre':<40} {'import s':>9} {'RSS import':>11} {'prêt s':>8} {'RSS prêt':>9} "
+              f"{'pic RSS':>8}  modèles à l'import"]
+    for m in mesures:
+        if "erreur" in m:
+            lignes.append(f"{m['racine'][-40:]:<40} ERREUR : {m['erreur']}")
+            continue
+        lignes.append(f"{m['racine'][-40:]:<40} {m['import_s']:>9} {m['rss_import_mo'] or 0:>11.0f} "
+                      f"{m.get('pret_s', '-'):>8} {m.get('rss_pret_mo') or 0:>9.0f} {m['pic_rss_mo'] or 0:>8.0f}"
+                      f"  {len(m['modeles_import'])}")
+    return "\n".join(lignes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Démarrage à froid de l'API (import de backend.main)")
+    parser.add_argument("--racines", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."),
+                        help="Racines de projet (contenant backend/), séparées par des virgules")
+    parser.add_argument("--prechauffer", action="store_true", help="Mesure aussi le temps jusqu'à l'état prêt")
+    parser.add_argument("--sortie", help="Écrit les mesures JSON dans ce fichier")
+    parser.add_argument("--une_racine", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.une_racine:
+        print(json.dumps(mesurer_demarrage(args.une_racine, args.prechauffer)))
+        sys.exit(0)
+
+    # Un process neuf par arbre : import à froid, RSS propre à chacun
+    mesures = []
+    for racine in args.racines.split(","):
+        print(f"📊 {racine}...", file=sys.stderr)
+        commande = [sys.executable, os.path.abspath(__file__), "--une_racine", racine]
+        if args.prechauffer:
+            commande.append("--prechauffer")
+        sortie = subprocess.run(commande, capture_output=True, text=True)
+        if sortie.returncode != 0:
+            erreur = sortie.stderr.strip().splitlines()
+            mesures.append({"racine": os.path.abspath(racine),
+                            "erreur": erreur[-1] if erreur else sortie.returncode})
+            continue
+        mesures.append(json.loads(sortie.stdout.strip().splitlines()[-1]))
+
+    print(resume(mesures))
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(mesures, f, indent=2, ensure_ascii=False)
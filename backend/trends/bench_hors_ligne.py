@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark hors ligne : extraction, enrichissement et /analyze sur cassette
+────────────────────────────────────────────────────────────────────────────
+Rejoue une cassette enregistrée (voir client_bluesky.py) pour mesurer, sans
+réseau ni identifiants ni base de données :
+ • extraction     : balayer_keywords (recherches concurrentes, seau à
+                    jetons, retry 429) + construction des lignes post_brut ;
+ • enrichissement : resoudre_profils (get_profiles par paquets de 25) ;
+ • analyse        : endpoint /analyze de l’API (option --analyse, charge
+                    les modèles locaux).
+
+Usage :
+    # 1) Enregistrer une cassette (une fois, avec réseau)
+    python bench_hors_ligne.py --enregistrer --keywords 40
+    # 2) Mesurer hors ligne, avec 50 ms de latence et 5 % de 429
+    python bench_hors_ligne.py --latence_ms 50 --taux_429 0.05 --sortie bench.json
+    # 3) Comparer à une mesure de référence (code retour 1 si régression)
+    python bench_hors_ligne.py --latence_ms 50 --reference bench.json
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import pandas as pd
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+
+from client_bluesky import creer_client, ClientRejeu, CASSETTE_DEFAUT
+from extraction_async import balayer_keywords
+from bulk_ingest import lignes_depuis_post
+from enrichissement_comptes import resoudre_profils
+
+current_file = os.path.abspath(__file__)
+project_root = os.path.abspath(os.path.join(current_file, "..", "..", ".."))
+
+CSV_KEYWORDS_PATH = os.path.join(project_root, "data", "liste_keywords.csv")
+ENV_PATH          = os.path.join(project_root, ".env10")
+
+# Pas de filtre de fraîcheur : les posts d’une cassette vieillissent
+SEUIL_DATE_BENCH  = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def charger_keywords(nb: int | None):
+    df = pd.read_csv(CSV_KEYWORDS_PATH)
+    df.columns = df.columns.str.strip().str.lower()
+    df = df.dropna(subset=["categories", "keyword"])
+    keywords = list(zip(df["categories"], df["keyword"]))
+    return keywords[:nb] if nb else keywords
+
+
+def keywords_de_cassette(cassette: str):
+    """Mots-clés enregistrés dans la cassette (première page de chaque recherche)."""
+    vus = []
+    with open(cassette, encoding="utf-8") as f:
+        for ligne in f:
+            if not ligne.strip():
+                continue
+            appel = json.loads(ligne)
+            if appel["methode"] == "app.bsky.feed.search_posts" and not appel["params"].get("cursor"):
+                q = appel["params"].get("q")
+                if q not in vus:
+                    vus.append(q)
+    return [("bench", q) for q in vus]
+
+
+# ─────────────────────────────
+# Mesures
+# ─────────────────────────────
+def bench_extraction(client, keywords, limite, concurrence, debit, capacite):
+    compteurs = {"posts": 0, "lignes": 0, "appels": 0, "erreurs": 0}
+    auteurs = []
+
+    def on_result(categorie, keyword, posts, erreur, appels):
+        compteurs["appels"] += appels
+        if erreur is not None:
+            compteurs["erreurs"] += 1
+            return
+        for post in posts:
+            compteurs["posts"] += 1
+            lignes = lignes_depuis_post(post, categorie, keyword, SEUIL_DATE_BENCH)
+            if lignes is not None:
+                compteurs["lignes"] += 1
+                auteurs.append(lignes[1][0])
+
+    plan = [(c, k, limite) for c, k in keywords]
+    t0 = time.perf_counter()
+    asyncio.run(balayer_keywords(client, plan, concurrence, debit, capacite, on_result))
+    duree = time.perf_counter() - t0
+    compteurs.update(duree_s=round(duree, 3),
+                     posts_par_s=round(compteurs["posts"] / duree, 1) if duree else None)
+    return compteurs, list(dict.fromkeys(auteurs))
+
+
+def bench_enrichissement(client, dids):
+    t0 = time.perf_counter()
+    lignes, appels, erreurs = resoudre_profils(client, dids)
+    duree = time.perf_counter() - t0
+    return {"comptes": len(dids), "lignes": len(lignes), "appels": appels, "erreurs": erreurs,
+            "duree_s": round(duree, 3),
+            "comptes_par_s": round(len(dids) / duree, 1) if duree else None}
+
+
+def bench_analyse(urls):
+    """Appelle /analyze via le client de test FastAPI (client Bluesky en rejeu)."""
+    sys.path.insert(0, project_root)
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    api = TestClient(app)
+    latences, erreurs = [], 0
+    for url in urls:
+        t0 = time.perf_counter()
+        if api.get("/analyze", params={"url": url}).status_code != 200:
+            erreurs += 1
+        latences.append(time.perf_counter() - t0)
+    latences.sort()
+    total = sum(latences)
+    return {"requetes": len(urls), "erreurs": erreurs, "duree_s": round(total, 3),
+            "p50_ms": round(latences[len(latences) // 2] * 1000, 1) if latences else None,
+            "p95_ms": round(latences[int(len(latences) * 0.95)] * 1000, 1) if latences else None,
+            "requetes_par_s": round(len(urls) / total, 2) if total else None}
+
+
+def comparer(resultats: dict, reference: dict, tolerance: float) -> list[str]:
+    """Liste des débits en baisse de plus de `tolerance` par rapport à la référence."""
+    regressions = []
+    for etape, metrique in (("extraction", "posts_par_s"), ("enrichissement", "comptes_par_s"),
+                            ("analyse", "requetes_par_s")):
+        avant = (reference.get(etape) or {}).get(metrique)
+        apres = (resultats.get(etape) or {}).get(metrique)
+        if avant and apres is not None and apres < avant * (1 - tolerance):
+            regressions.append(f"{etape}.{metrique} : {avant} → {apres} ({apres / avant - 1:+.0%})")
+    return regressions
+
+
+# ─────────────────────────────
+# Point d’entrée
+# ─────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cassette", default=os.getenv("BLUESKY_CASSETTE") or CASSETTE_DEFAUT)
+    parser.add_argument("--enregistrer", action="store_true",
+                        help="Interroge Bluesky en live et remplit la cassette")
+    parser.add_argument("--keywords", type=int, default=None,
+                        help="Nb de mots-clés du CSV (enregistrement) ; défaut : ceux de la cassette")
+    parser.add_argument("--limite", type=int, default=25, help="Posts max par mot-clé")
+    parser.add_argument("--concurrence", type=int, default=8)
+    parser.add_argument("--debit", type=float, default=1000.0, help="Appels/s du seau à jetons")
+    parser.add_argument("--latence_ms", default="0", help="Latence injectée, ou « enregistree »")
+    parser.add_argument("--taux_429", type=float, default=0.0)
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--analyse", type=int, default=0,
+                        help="Nb de posts de la cassette à passer dans /analyze (0 = ignoré)")
+    parser.add_argument("--sortie", help="Écrit les résultats JSON dans ce fichier")
+    parser.add_argument("--reference", help="Résultats JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Baisse de débit tolérée avant de signaler une régression")
+    args = parser.parse_args()
+
+    if args.enregistrer:
+        load_dotenv(ENV_PATH)
+        client = creer_client(mode="record", cassette=args.cassette)
+        keywords = charger_keywords(args.keywords or 40)
+        ext, auteurs = bench_extraction(client, keywords, args.limite, args.concurrence, 8.0, 10)
+        bench_enrichissement(client, auteurs)
+        client.fermer()
+        print(f"Cassette enregistrée : {args.cassette} ({ext['appels']} appels search_posts, "
+              f"{len(auteurs)} comptes)")
+        sys.exit(0)
+
+    latence = args.latence_ms if args.latence_ms == "enregistree" else float(args.latence_ms)
+    client = ClientRejeu(args.cassette, latence_ms=latence, taux_429=args.taux_429, graine=args.graine)
+    keywords = charger_keywords(args.keywords) if args.keywords else keywords_de_cassette(args.cassette)
+
+    resultats = {"parametres": {"keywords": len(keywords), "limite": args.limite,
+                                "concurrence": args.concurrence, "latence_ms": args.latence_ms,
+                                "taux_429": args.taux_429}}
+    resultats["extraction"], auteurs = bench_extraction(
+        client, keywords, args.limite, args.concurrence, args.debit, max(1, int(args.debit)))
+    resultats["enrichissement"] = bench_enrichissement(client, auteurs)
+    resultats["appels_simules"] = {"total": client.nb_appels, "rate_limit_429": client.nb_429}
+
+    if args.analyse:
+        # Le module d’analyse crée son propre client : on le met lui aussi en rejeu
+        os.environ.update(BLUESKY_CLIENT_MODE="replay", BLUESKY_CASSETTE=args.cassette,
+                          BLUESKY_REPLAY_LATENCE_MS=str(args.latence_ms))
+        urls = [f"https://bsky.app/profile/{p['author']['handle']}/post/{p['uri'].rsplit('/', 1)[-1]}"
+                for p in client.posts_enregistres()[:args.analyse]]
+        resultats["analyse"] = bench_analyse(urls)
+
+    print(json.dumps(resultats, indent=2, ensure_ascii=False))
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(resultats, f, indent=2, ensure_ascii=False)
+
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            regressions = comparer(resultats, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"RÉGRESSION {r}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark d’inférence des six modèles d’analyse (sans réseau ni base)
+────────────────────────────────────────────────────────────────────────────
+Pour chaque modèle de MODELS (clés de 05_POSTS_ANALYSE.py, dossiers de
+serveur_modeles.DOSSIERS_MODELES) :
+ • temps de chargement et RSS après chargement ;
+ • pour chaque nombre de threads × longueur de texte × taille de lot :
+   débit (posts/s) et latence d’un lot (p50 / p95) ;
+ • pic de RSS du process.
+
+Chaque modèle est mesuré dans un process à part : le pic de RSS est le
+sien, pas celui des modèles précédents. Corpus de longueurs fixes (8, 32,
+128 mots par défaut), aux mots tirés d’un vocabulaire synthétique ou d’un
+échantillon local de posts (--textes).
+
+Sortie : tableau récapitulatif + JSON (--sortie) avec le commit git, les
+versions et la machine, pour comparer deux commits :
+    python bench_inference.py --dossier <dossier_models> --sortie avant.json
+    python bench_inference.py --dossier <dossier_models> --reference avant.json   # code 1 si régression
+Traces du profileur torch (--profil <dossier>) : une trace Chrome par modèle
+pour la config la plus lourde, et les opérateurs les plus coûteux affichés.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+
+from serveur_modeles import DOSSIERS_MODELES, percentile
+from memoire_process import pic_rss_mo, rss_mo
+
+TAILLES_LOT = (1, 8, 32, 64)
+THREADS     = (1, 4)
+LONGUEURS   = (8, 32, 128)
+NB_TEXTES   = 256
+
+
+def textes_longueur(n: int, nb_mots: int, base: list[str] | None = None, graine: int = 0) -> list[str]:
+    """n textes d’exactement nb_mots mots, tirés de `base` (échantillon) ou d’un vocabulaire fixe."""
+    rnd = random.Random(graine)
+    if base:
+        mots = " ".join(base).split()
+    else:
+        mots = ("the new policy looks great but people are angry about prices again today "
+                "i love this song so much what a game last night can not believe it happened").split()
+    return [" ".join(rnd.choice(mots) for _ in range(nb_mots)) for _ in range(n)]
+
+
+def contexte_run(args) -> dict:
+    """Ce qui rend deux runs comparables : commit, versions, machine, paramètres."""
+    import torch
+    import transformers
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit, "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(), "torch": torch.__version__,
+        "transformers": transformers.__version__, "machine": platform.platform(),
+        "processeur": platform.processor(), "nb_coeurs": os.cpu_count(),
+        "backend": args.backend, "tailles_lot": args.tailles, "threads": args.threads,
+        "longueurs": args.longueurs, "nb_textes": args.n,
+    }
+
+
+# =======================================
+# === MESURE D’UN MODÈLE (process dédié) ===
+# =======================================
+def mesurer_modele(cle: str, chemin: str, backend: str, tailles, threads, longueurs,
+                   nb_textes: int, base: list[str] | None, profil: str | None) -> dict:
+    import torch
+    from inference_onnx import charger_modele
+
+    rss_depart = rss_mo()
+    t0 = time.perf_counter()
+    modele = charger_modele(chemin, backend=backend)
+    chargement = time.perf_counter() - t0
+    mesure = {"modele": cle, "dossier": os.path.basename(chemin), "chargement_s": round(chargement, 3),
+              "rss_depart_mo": rss_depart, "rss_apres_chargement_mo": rss_mo(), "configs": []}
+
+    for nb_threads in threads:
+        torch.set_num_threads(nb_threads)
+        for nb_mots in longueurs:
+            textes = textes_longueur(nb_textes, nb_mots, base)
+            modele.predire_lot(textes[:8], 8)                   # échauffement
+            for taille in tailles:
+                latences = []
+                for debut in range(0, len(textes), taille):
+                    t1 = time.perf_counter()
+                    modele.predire_lot(textes[debut:debut + taille], taille)
+                    latences.append(time.perf_counter() - t1)
+                total = sum(latences)
+                mesure["configs"].append({
+                    "threads": nb_threads, "mots": nb_mots, "taille_lot": taille,
+                    "posts_par_s": round(len(textes) / total, 1),
+                    "lot_p50_ms": round(percentile(latences, 0.50) * 1000, 2),
+                    "lot_p95_ms": round(percentile(latences, 0.95) * 1000, 2),
+                })
+
+    if profil:
+        from torch.profiler import profile, ProfilerActivity
+        os.makedirs(profil, exist_ok=True)
+        torch.set_num_threads(max(threads))
+        textes = textes_longueur(max(tailles), max(longueurs), base)
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+            modele.predire_lot(textes, max(tailles))
+        trace = os.path.join(profil, f"trace_{cle}.json")
+        prof.export_chrome_trace(trace)
+        mesure["trace"] = trace
+        print(prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=12), file=sys.stderr)
+
+    mesure["pic_rss_mo"] = pic_rss_mo()
+    return mesure
+
+
+# =======================
+# === RÉSUMÉ / COMPARAISON ===
+# =======================
+def resume(resultats: dict) -> str:
+    lignes = [f"commit {resultats['contexte']['commit']} | backend {resultats['contexte']['backend']} | "
+              f"{resultats['contexte']['nb_coeurs']} cœurs",
+              f"{'modèle':<11} {'charg. s':>8} {'pic RSS':>8} {'thr':>4} {'mots':>5} {'lot':>4} "
+              f"{'posts/s':>9} {'p50 ms':>8} {'p95 ms':>8}"]
+    for m in resultats["modeles"]:
+        if "erreur" in m:
+            lignes.append(f"{m['modele']:<11} ERREUR : {m['erreur']}")
+            continue
+        for i, c in enumerate(m["configs"]):
+            tete = (f"{m['modele']:<11} {m['chargement_s']:>8} {m['pic_rss_mo'] or 0:>8.0f}" if i == 0
+                    else " " * 29)
+            lignes.append(f"{tete} {c['threads']:>4} {c['mots']:>5} {c['taille_lot']:>4} "
+                          f"{c['posts_par_s']:>9} {c['lot_p50_ms']:>8} {c['lot_p95_ms']:>8}")
+    return "\n".join(lignes)
+
+
+def comparer(resultats: dict, reference: dict, tolerance: float) -> list[str]:
+    """Configs dont le débit baisse (ou le chargement / pic RSS monte) de plus de `tolerance`."""
+    avant = {m["modele"]: m for m in reference.get("modeles", []) if "erreur" not in m}
+    regressions = []
+    for m in resultats["modeles"]:
+        ref = avant.get(m["modele"])
+        if ref is None or "erreur" in m:
+            continue
+        for metrique in ("chargement_s", "pic_rss_mo"):
+            if ref.get(metrique) and m.get(metrique) and m[metrique] > ref[metrique] * (1 + tolerance):
+                regressions.append(f"{m['modele']}.{metrique} : {ref[metrique]} → {m[metrique]} "
+                                   f"({m[metrique] / ref[metrique] - 1:+.0%})")
+        configs_ref = {(c["threads"], c["mots"], c["taille_lot"]): c for c in ref["configs"]}
+        for c in m["configs"]:
+            r = configs_ref.get((c["threads"], c["mots"], c["taille_lot"]))
+            if r and c["posts_par_s"] < r["posts_par_s"] * (1 - tolerance):
+                regressions.append(f"{m['modele']} threads={c['threads']} mots={c['mots']} "
+                                   f"lot={c['taille_lot']} : {r['posts_par_s']} → {c['posts_par_s']} posts/s "
+                                   f"({c['posts_par_s'] / r['posts_par_s'] - 1:+.0%})")
+    return regressions
+
+
+def _liste_entiers(texte: str) -> list[int]:
+    return [int(x) for x in texte.split(",") if x]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark d'inférence des modèles d'analyse")
+    parser.add_argument("--dossier", required=True, help="Dossier contenant les dossiers des modèles")
+    parser.add_argument("--modeles", default=",".join(DOSSIERS_MODELES))
+    parser.add_argument("--backend", default="torch", help="torch, onnx ou onnx_int8")
+    parser.add_argument("--tailles", default=",".join(map(str, TAILLES_LOT)), help="Tailles de lot")
+    parser.add_argument("--threads", default=",".join(map(str, THREADS)), help="Nb de threads torch")
+    parser.add_argument("--longueurs", default=",".join(map(str, LONGUEURS)), help="Mots par texte")
+    parser.add_argument("--n", type=int, default=NB_TEXTES, help="Textes par config")
+    parser.add_argument("--textes", help="Échantillon local : un post nettoyé par ligne")
+    parser.add_argument("--profil", help="Dossier des traces du profileur torch")
+    parser.add_argument("--sortie", help="Écrit les résultats JSON dans ce fichier")
+    parser.add_argument("--reference", help="Résultats JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Écart toléré avant de signaler une régression")
+    parser.add_argument("--un_modele", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    base = None
+    if args.textes:
+        with open(args.textes, encoding="utf-8") as f:
+            base = [ligne.strip() for ligne in f if ligne.strip()]
+
+    if args.un_modele:
+        mesure = mesurer_modele(args.un_modele, os.path.join(args.dossier, DOSSIERS_MODELES[args.un_modele]),
+                                args.backend, _liste_entiers(args.tailles), _liste_entiers(args.threads),
+                                _liste_entiers(args.longueurs), args.n, base, args.profil)
+        print(json.dumps(mesure))
+        sys.exit(0)
+
+    # Un process par modèle : chargement à froid et pic de RSS propres à chacun
+    resultats = {"contexte": contexte_run(args), "modeles": []}
+    for cle in args.modeles.split(","):
+        print(f"📊 {cle}...", file=sys.stderr)
+        commande = [sys.executable, os.path.abspath(__file__), "--dossier", args.dossier,
+                    "--backend", args.backend, "--tailles", args.tailles, "--threads", args.threads,
+                    "--longueurs", args.longueurs, "--n", str(args.n), "--un_modele", cle]
+        if args.textes:
+            commande += ["--textes", args.textes]
+        if args.profil:
+            commande += ["--profil", args.profil]
+        sortie = subprocess.run(commande, capture_output=True, text=True)
+        if sortie.returncode != 0:
+            erreur = sortie.stderr.strip().splitlines()
+            resultats["modeles"].append({"modele": cle, "erreur": erreur[-1] if erreur else sortie.returncode})
+            continue
+        sys.stderr.write(sortie.stderr)
+        resultats["modeles"].append(json.loads(sortie.stdout.strip().splitlines()[-1]))
+
+    print(resume(resultats))
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(resultats, f, indent=2, ensure_ascii=False)
+
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            regressions = comparer(resultats, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"RÉGRESSION {r}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Débit d’/analyze et mémoire par worker selon le nombre de workers
+────────────────────────────────────────────────────────────────────────────
+Pour chaque nombre de workers, lance backend/serveur_workers.py (modèles
+chargés une fois puis fork), attend /ready, envoie des requêtes /analyze
+en parallèle pendant une durée fixe, puis relève la mémoire de chaque
+process :
+ • RSS : compte dans chaque process les pages partagées (poids hérités) —
+   additionner les RSS surestime la mémoire réelle ;
+ • PSS : pages partagées réparties entre les process qui les partagent ; la
+   somme des PSS est la mémoire réellement occupée ;
+ • USS : pages propres au process (ce que coûte un worker de plus).
+Lecture dans /proc/<pid>/smaps_rollup (Linux).
+
+Le cache d’inférence est désactivé pendant la mesure (chaque requête passe
+dans les modèles), sauf --avec_cache. /analyze appelle Bluesky : avec
+BLUESKY_CLIENT_MODE=replay et une cassette contenant les posts de --urls,
+le banc tourne sans réseau (voir client_bluesky.py).
+    python bench_workers_api.py --urls urls_posts.txt --workers 1,2,4 --duree 30 --sortie workers.json
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from serveur_modeles import percentile
+
+RACINE_PROJET = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+WORKERS       = (1, 2, 4)
+DUREE_S       = 30
+DELAI_PRET_S  = 600
+
+
+def memoire_process(pid: int) -> dict | None:
+    """RSS, PSS et USS d'un process en Mo, d'après /proc/<pid>/smaps_rollup (Linux)."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            champs = {ligne.split(":")[0]: int(ligne.split()[1]) for ligne in f if ligne.rstrip().endswith("kB")}
+    except (OSError, ValueError):
+        return None
+    return {"rss_mo": round(champs.get("Rss", 0) / 1024, 1), "pss_mo": round(champs.get("Pss", 0) / 1024, 1),
+            "uss_mo": round((champs.get("Private_Clean", 0) + champs.get("Private_Dirty", 0)) / 1024, 1)}
+
+
+def enfants(pid: int) -> list[int]:
+    """Process dont le parent est `pid` (lecture de /proc/<pid>/stat)."""
+    resultat = []
+    for nom in os.listdir("/proc"):
+        if not nom.isdigit():
+            continue
+        try:
+            with open(f"/proc/{nom}/stat") as f:
+                # « pid (comm) état ppid … » : comm peut contenir des espaces
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    resultat.append(int(nom))
+        except (OSError, ValueError, IndexError):
+            continue
+    return sorted(resultat)
+
+
+def attendre_pret(url: str, delai: float) -> bool:
+    fin = time.time() + delai
+    while time.time() < fin:
+        try:
+            with urllib.request.urlopen(f"{url}/ready", timeout=5) as r:
+                if r.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(1)
+    return False
+
+
+def charge(url: str, urls_posts: list[str], concurrence: int, duree: float) -> dict:
+    """`concurrence` clients en boucle sur /analyze pendant `duree` secondes."""
+    latences, erreurs, verrou = [], [0], threading.Lock()
+    fin = time.time() + duree
+
+    def client(rang: int):
+        i = rang
+        while time.time() < fin:
+            requete = f"{url}/analyze?url={urllib.parse.quote(urls_posts[i % len(urls_posts)], safe='')}"
+            i += concurrence
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(requete, timeout=120) as r:
+                    r.read()
+                with verrou:
+                    latences.append(time.perf_counter() - t0)
+            except (urllib.error.URLError, OSError):
+                with verrou:
+                    erreurs[0] += 1
+
+    fils = [threading.Thread(target=client, args=(k,)) for k in range(concurrence)]
+    t0 = time.perf_counter()
+    for f in fils:
+        f.start()
+    for f in fils:
+        f.join()
+    ecoule = time.perf_counter() - t0
+    return {"requetes": len(latences), "erreurs": erreurs[0], "req_par_s": round(len(latences) / ecoule, 2),
+            "p50_ms": round(percentile(latences, 0.50) * 1000, 1) if latences else None,
+            "p95_ms": round(percentile(latences, 0.95) * 1000, 1) if latences else None}
+
+
+def mesurer(nb_workers: int, urls_posts: list[str], port: int, concurrence: int, duree: float,
+            avec_cache: bool) -> dict:
+    env = dict(os.environ)
+    if not avec_cache:
+        env.update(PIGMALION_CACHE_INFERENCE="memoire", PIGMALION_CACHE_TAILLE="0")
+    serveur = subprocess.Popen([sys.executable, "-m", "backend.serveur_workers", "--workers", str(nb_workers),
+                                "--hote", "127.0.0.1", "--port", str(port), "--log_level", "warning"],
+                               cwd=RACINE_PROJET, env=env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        t0 = time.time()
+        if not attendre_pret(url, DELAI_PRET_S):
+            return {"workers": nb_workers, "erreur": "/ready jamais à 200"}
+        mesure = {"workers": nb_workers, "concurrence": concurrence, "pret_s": round(time.time() - t0, 1)}
+        mesure.update(charge(url, urls_posts, concurrence, duree))
+        # Après la charge : les pages copiées sur écriture pendant l'inférence sont comptées
+        mesure["parent"] = memoire_process(serveur.pid)
+        mesure["par_worker"] = [memoire_process(pid) for pid in enfants(serveur.pid)]
+        process = [m for m in [mesure["parent"], *mesure["par_worker"]] if m]
+        mesure["rss_total_mo"] = round(sum(m["rss_mo"] for m in process), 1)
+        mesure["pss_total_mo"] = round(sum(m["pss_mo"] for m in process), 1)
+        workers = [m for m in mesure["par_worker"] if m]
+        mesure["uss_moyen_worker_mo"] = round(sum(m["uss_mo"] for m in workers) / len(workers), 1) if workers else None
+        return mesure
+    finally:
+        serveur.terminate()
+        try:
+            serveur.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            serveur.kill()
+
+
+def resume(mesures: list[dict]) -> str:
+    lignes = [f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'err':>5} "
+              f"{'RSS total':>10} {'PSS total':>10} {'USS/worker':>11}"]
+    for m in mesures:
+        if "erreur" in m:
+            lignes.append(f"{m['workers']:>7} ERREUR : {m['erreur']}")
+            continue
+        lignes.append(f"{m['workers']:>7} {m['req_par_s']:>8} {m['p50_ms'] or 0:>8} {m['p95_ms'] or 0:>8} "
+                      f"{m['erreurs']:>5} {m['rss_total_mo']:>10} {m['pss_total_mo']:>10} "
+                      f"{m['uss_moyen_worker_mo'] or 0:>11}")
+    return "\n".join(lignes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit et mémoire de l'API selon le nombre de workers")
+    parser.add_argument("--urls", required=True, help="URLs de posts Bluesky, une par ligne")
+    parser.add_argument("--workers", default=",".join(map(str, WORKERS)))
+    parser.add_argument("--concurrence", type=int, help="Clients simultanés (défaut : 4 par worker)")
+    parser.add_argument("--duree", type=float, default=DUREE_S, help="Secondes de charge par mesure")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--avec_cache", action="store_true", help="Garde le cache d'inférence actif")
+    parser.add_argument("--sortie", help="Écrit les mesures JSON dans ce fichier")
+    args = parser.parse_args()
+
+    with open(args.urls, encoding="utf-8") as f:
+        urls_posts = [ligne.strip() for ligne in f if ligne.strip()]
+    mesures = []
+    for n in (int(x) for x in args.workers.split(",") if x):
+        print(f"📊 {n} worker{'s' if n > 1 else ''}...", file=sys.stderr)
+        mesures.append(mesurer(n, urls_posts, args.port, args.concurrence or 4 * n, args.duree, args.avec_cache))
+
+    print(resume(mesures))
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(mesures, f, indent=2, ensure_ascii=False)
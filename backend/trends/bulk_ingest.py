@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Écriture en masse vers PostgreSQL (COPY → table temporaire → INSERT … SELECT)
+────────────────────────────────────────────────────────────────────────────
+Au lieu d’un INSERT + commit par post, les lignes sont accumulées en mémoire
+puis, à chaque lot :
+  1) envoyées par `COPY … FROM STDIN` dans une table temporaire ;
+  2) fusionnées dans la table cible par un unique
+     `INSERT … SELECT … ON CONFLICT DO NOTHING` ;
+  3) validées par un seul commit.
+Le nombre de commits et d’allers-retours dépend donc du nombre de lots,
+plus du nombre de posts.
+Si un lot échoue (octet NUL dans un texte, valeur trop longue…), il est
+coupé en deux et chaque moitié réessayée : seules les lignes fautives sont
+perdues, comme avec l’insertion post par post d’origine.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import io
+import time
+from datetime import date, datetime, timezone
+
+from telemetrie import metriques
+
+
+# =====================================
+# === SÉRIALISATION AU FORMAT COPY TEXT ===
+# =====================================
+def _format_copy(valeur) -> str:
+    """Convertit une valeur Python en champ COPY (format text, NULL = \\N)."""
+    if valeur is None:
+        return r"\N"
+    if isinstance(valeur, bool):
+        return "t" if valeur else "f"
+    if isinstance(valeur, (datetime, date)):
+        return valeur.isoformat()
+    return (str(valeur)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r"))
+
+
+def _buffer_copy(lignes) -> io.StringIO:
+    buf = io.StringIO()
+    for ligne in lignes:
+        buf.write("\t".join(_format_copy(v) for v in ligne))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+
+# ======================================
+# === COPY + FUSION GÉNÉRIQUE D’UNE TABLE ===
+# ======================================
+def copier_vers_temp(cur, table: str, colonnes: list[str], lignes: list, tmp: str | None = None) -> str:
+    """
+    Charge `lignes` par COPY dans une table temporaire (`tmp_<table>` par
+    défaut), créée à la volée avec les types exacts des `colonnes` de `table`
+    et vidée avant chaque lot. Retourne le nom de la table temporaire.
+    Deux usages d’une même table avec des colonnes différentes sur une même
+    connexion doivent passer des noms `tmp` distincts.
+    """
+    tmp  = tmp or f"tmp_{table}"
+    cols = ", ".join(colonnes)
+
+    # Table temporaire de session, avec les seuls types des colonnes copiées
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {tmp} AS
+        SELECT {cols} FROM {table} WITH NO DATA;
+    """)
+    cur.execute(f"TRUNCATE {tmp};")
+    cur.copy_expert(f"COPY {tmp} ({cols}) FROM STDIN", _buffer_copy(lignes))
+    return tmp
+
+
+def copier_fusionner(cur, table: str, colonnes: list[str], lignes: list, cle_conflit: str,
+                     completer: list[str] | None = None) -> int:
+    """
+    Charge `lignes` (tuples dans l’ordre de `colonnes`) dans une table
+    temporaire par COPY, puis les fusionne dans `table` :
+        INSERT INTO table (...) SELECT DISTINCT ON (cle) ... ON CONFLICT (cle) DO NOTHING
+    Les colonnes de `completer` sont, pour les lignes déjà présentes,
+    renseignées là où elles sont encore NULL (ON CONFLICT … DO UPDATE).
+    Ne commit pas : c’est à l’appelant de valider la transaction.
+    Retourne le nombre de lignes réellement insérées.
+    """
+    if not lignes:
+        return 0
+
+    tmp  = copier_vers_temp(cur, table, colonnes, lignes)
+    cols = ", ".join(colonnes)
+    if not completer:
+        cur.execute(f"""
+            INSERT INTO {table} ({cols})
+            SELECT DISTINCT ON ({cle_conflit}) {cols}
+            FROM {tmp}
+            ON CONFLICT ({cle_conflit}) DO NOTHING;
+        """)
+        return cur.rowcount
+
+    maj   = ", ".join(f"{c} = COALESCE({table}.{c}, EXCLUDED.{c})" for c in completer)
+    vides = " OR ".join(f"{table}.{c} IS NULL" for c in completer)
+    # xmax = 0 : ligne insérée ; sinon ligne existante complétée
+    cur.execute(f"""
+        INSERT INTO {table} ({cols})
+        SELECT DISTINCT ON ({cle_conflit}) {cols}
+        FROM {tmp}
+        ON CONFLICT ({cle_conflit}) DO UPDATE SET {maj}
+        WHERE {vides}
+        RETURNING (xmax = 0);
+    """)
+    return sum(1 for (insere,) in cur.fetchall() if insere)
+
+
+# ==============================
+# === WRITER POST_BRUT / COMPTE ===
+# ==============================
+COLONNES_POST = [
+    "post_brut_url", "post_brut_date", "post_brut_contenu",
+    "compte_handle", "post_brut_url_affichage",
+    "post_brut_date_scrapping", "categorie", "keyword",
+    "post_brut_poids", "compte_did",
+    "post_brut_presence_media", "post_brut_temps_scraping",
+    "post_brut_langs",
+]
+
+# Langues déclarées par l’auteur (record.langs), ex. "en" ou "fr,en" ; NULL si absentes
+SQL_COLONNE_LANGS_EXISTE = """
+SELECT 1 FROM information_schema.columns
+WHERE table_name = 'post_brut' AND column_name = 'post_brut_langs';
+"""
+SQL_AJOUT_COLONNE_LANGS = "ALTER TABLE post_brut ADD COLUMN IF NOT EXISTS post_brut_langs text;"
+
+
+def assurer_colonne_langs(conn):
+    """Ajoute post_brut.post_brut_langs si besoin (sans verrou si elle existe déjà)."""
+    cur = conn.cursor()
+    cur.execute(SQL_COLONNE_LANGS_EXISTE)
+    if cur.fetchone() is None:
+        cur.execute(SQL_AJOUT_COLONNE_LANGS)
+    conn.commit()
+    cur.close()
+
+
+def langs_declares(langs) -> str | None:
+    """record.langs (["en-US", "fr"]) → "en-us,fr" ; None si absent ou vide."""
+    codes = [str(l).strip().lower() for l in (langs or []) if str(l).strip()]
+    return ",".join(codes) or None
+
+COLONNES_COMPTE = [
+    "compte_did",
+    "compte_brut_handle",
+    "compte_date_premiere_analyse",
+]
+# Renseignée pour les comptes déjà connus qui ne l’ont pas encore
+COLONNES_COMPTE_A_COMPLETER = ["compte_date_premiere_analyse"]
+_IDX_COMPTE_DID = COLONNES_POST.index("compte_did")
+
+
+# =====================================
+# === POST ATPROTO → LIGNES À ÉCRIRE ===
+# =====================================
+def parse_created_at(createdAt_str: str) -> datetime | None:
+    """
+    Gère les formats :
+      - 'YYYY-MM-DDTHH:MM:SSZ'
+      - 'YYYY-MM-DDTHH:MM:SS.%fZ'
+      - avec fuseau (ex. '+00:00', '+09:00', '-07:00')
+    Retourne un datetime timezone-aware en UTC ou None si échec.
+    """
+    if not createdAt_str:
+        return None
+    try:
+        if "." in createdAt_str and createdAt_str.endswith("Z"):
+            return datetime.strptime(createdAt_str, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+        elif createdAt_str.endswith("Z"):
+            return datetime.strptime(createdAt_str, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        else:
+            return datetime.fromisoformat(createdAt_str).astimezone(timezone.utc)
+    except Exception:
+        return None
+
+
+def lignes_depuis_post(post, categorie: str, keyword: str, seuil_date: datetime):
+    """
+    Construit (ligne_post, ligne_compte) dans l’ordre de COLONNES_POST /
+    COLONNES_COMPTE pour un post renvoyé par search_posts.
+    Retourne None si la date est illisible ou antérieure à `seuil_date`.
+    """
+    createdAt = parse_created_at(getattr(post.record, "created_at", None))
+    if createdAt is None or createdAt < seuil_date:
+        return None
+
+    uri            = post.uri
+    text           = getattr(post.record, "text", "").replace("\n", " ").replace("\r", "").strip()
+    author_handle  = post.author.handle
+    url_affichage  = f"https://bsky.app/profile/{author_handle}/post/{uri.split('/')[-1]}"
+    date_scrap     = datetime.now(timezone.utc)
+    # Si vous voulez exclure les stopwords du calcul de "poids", vous pouvez filtrer ici :
+    # words = [w for w in text.split() if w.lower() not in stopwords_list]
+    # poids = len(words)
+    poids          = len(text.split())
+    compte_did     = post.author.did
+    has_media      = post.embed is not None
+    timestamp      = round(time.time(), 3)
+    langs          = langs_declares(getattr(post.record, "langs", None))
+
+    return (
+        (uri, createdAt, text,
+         author_handle, url_affichage,
+         date_scrap, categorie, keyword,
+         poids, compte_did,
+         has_media, timestamp, langs),
+        (compte_did, author_handle, date_scrap),
+    )
+
+
+# ========================
+# === WRITER PAR LOTS ===
+# ========================
+class BulkWriter:
+    """
+    Met en file les posts (et leurs comptes) puis les écrit par lots.
+      writer.ajouter(ligne_post, ligne_compte)   # tuples dans l’ordre des COLONNES_*
+      if len(writer) >= writer.taille_lot: stats = writer.flush()
+    `flush` renvoie un dict : posts/comptes insérés et ignorés (doublons),
+    posts rejetés (lignes fautives, avec leur erreur), URLs écrites (insérées
+    ou déjà en base) et durée du lot. `erreur` n’est renseignée que si aucune
+    ligne n’a pu être écrite (connexion perdue…).
+    `uri in writer` : post en file, pas encore écrit.
+    """
+
+    def __init__(self, conn, taille_lot: int = 200):
+        self.conn       = conn
+        self.taille_lot = taille_lot
+        self._posts     = []
+        self._comptes   = {}
+        self._urls      = set()
+        assurer_colonne_langs(conn)
+
+    def __len__(self):
+        return len(self._posts)
+
+    def __contains__(self, uri: str) -> bool:
+        return uri in self._urls
+
+    def ajouter(self, ligne_post: tuple, ligne_compte: tuple):
+        self._posts.append(ligne_post)
+        self._urls.add(ligne_post[0])
+        # Un seul exemplaire par compte dans le lot (premier vu = date de première analyse)
+        self._comptes.setdefault(ligne_compte[0], ligne_compte)
+
+    def flush(self) -> dict:
+        posts, comptes = self._posts, self._comptes
+        self._posts, self._comptes, self._urls = [], {}, set()
+
+        stats = {
+            "posts_inseres": 0, "posts_ignores": len(posts), "posts_rejetes": 0,
+            "comptes_inseres": 0, "comptes_ignores": len(comptes),
+            "rejets": [], "urls_ecrites": [], "duree": 0.0, "erreur": None,
+        }
+        if not posts:
+            return stats
+
+        t0 = time.time()
+        nb_comptes, nb_posts, rejets = self._ecrire(posts, comptes)
+        rejetees = {url for url, _ in rejets}
+        stats.update(
+            posts_inseres   = nb_posts,
+            posts_ignores   = len(posts) - nb_posts - len(rejetees),
+            posts_rejetes   = len(rejetees),
+            comptes_inseres = nb_comptes,
+            comptes_ignores = len(comptes) - nb_comptes,
+            rejets          = rejets,
+            urls_ecrites    = [p[0] for p in posts if p[0] not in rejetees],
+            duree           = round(time.time() - t0, 3),
+        )
+        if rejets and not stats["urls_ecrites"]:
+            stats["erreur"] = rejets[0][1]
+        metriques.observer_lot(stats)
+        return stats
+
+    def _ecrire(self, posts: list, comptes: dict) -> tuple[int, int, list]:
+        """
+        Écrit `posts` et leurs comptes en une transaction. En cas d’échec,
+        rollback puis les deux moitiés sont réessayées séparément, jusqu’au
+        post isolé. Retourne (comptes insérés, posts insérés, [(url, erreur)]).
+        """
+        cur = self.conn.cursor()
+        try:
+            # Les comptes d’abord : post_brut.compte_did y fait référence
+            lignes_comptes = list({p[_IDX_COMPTE_DID]: comptes[p[_IDX_COMPTE_DID]] for p in posts}.values())
+            nb_comptes = copier_fusionner(cur, "compte_brut", COLONNES_COMPTE, lignes_comptes, "compte_did",
+                                          completer=COLONNES_COMPTE_A_COMPLETER)
+            nb_posts   = copier_fusionner(cur, "post_brut", COLONNES_POST, posts, "post_brut_url")
+            self.conn.commit()
+            return nb_comptes, nb_posts, []
+        except Exception as e:
+            erreur = e
+            if not self.conn.closed:
+                self.conn.rollback()
+        finally:
+            cur.close()
+
+        # Post isolé fautif, ou connexion perdue (inutile de redécouper) : rejet
+        if len(posts) == 1 or self.conn.closed:
+            return 0, 0, [(p[0], erreur) for p in posts]
+        milieu = len(posts) // 2
+        c1, p1, r1 = self._ecrire(posts[:milieu], comptes)
+        c2, p2, r2 = self._ecrire(posts[milieu:], comptes)
+        return c1 + c2, p1 + p2, r1 + r2
+
+
+def resume_lot(stats: dict) -> str:
+    """Ligne de log lisible pour un lot écrit par BulkWriter.flush()."""
+    if stats["erreur"] is not None:
+        return f"Échec du lot → rollback : {stats['erreur']}"
+    resume = (f"Lot écrit en {stats['duree']}s : "
+              f"{stats['posts_inseres']} posts insérés / {stats['posts_ignores']} ignorés, "
+              f"{stats['comptes_inseres']} comptes insérés / {stats['comptes_ignores']} ignorés")
+    if stats["posts_rejetes"]:
+        url, erreur = stats["rejets"][0]
+        resume += f" | {stats['posts_rejetes']} posts rejetés (ex. {url} → {erreur})"
+    return resume
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+Cache des résultats d’inférence à deux niveaux (05_POSTS_ANALYSE.py et /analyze)
+────────────────────────────────────────────────────────────────────────────
+Après un crash de 05, ou quand /analyze est appelé plusieurs fois sur un
+même post populaire, les mêmes textes repassaient dans les mêmes modèles.
+
+Clé : (modèle, révision, backend, activation, labels, hash du texte) → scores.
+ • revision_modele(chemin) : empreinte du contenu (config.json, sha256 des
+   poids, lu dans le manifeste d’artefacts_modeles.py s’il existe) ; un
+   modèle remplacé ou réentraîné change de révision, ses anciens résultats
+   ne sont plus jamais servis, et deux copies des mêmes poids partagent les
+   leurs ;
+ • activation_modele / cle_modele : sigmoid ou softmax, et le regroupement
+   de labels de 05 (catégories), font partie de la clé ;
+ • niveau 1, CacheLRU (dedup_contenu.py) : dictionnaire en mémoire borné en
+   nombre d’entrées, éviction du moins récemment utilisé ;
+ • niveau 2, persistant : la table analyse_resultat_hash (PostgreSQL, voir
+   dedup_contenu.py) ou un fichier SQLite local de même schéma, bornés par
+   purger(max_lignes) qui supprime les résultats les plus anciens.
+
+CacheInference compte les hits mémoire / persistants, les défauts et les
+évictions (stats(), rapport()). Le niveau persistant est au mieux : une
+erreur du stockage (SQLite verrouillé, connexion PostgreSQL perdue) est
+comptée et traitée comme un défaut, jamais remontée à l’appelant. Côté 05, ResultatsParHash en hérite : même
+LRU et même stockage (StockagePostgres), lecture groupée par passe
+(get_lot) et écriture dans la transaction de la passe. La clé est le hash
+du texte envoyé au modèle : l’API ne relit les scores de 05 que si elle
+lui passe le même texte (PIGMALION_TEXTE_MODELES=post_clean).
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from psycopg2.extras import execute_values
+
+from artefacts_modeles import MANIFESTE, lire_manifeste, sha256_fichier
+from dedup_contenu import (
+    CacheLRU, SQL_CREATE_RESULTATS_HASH, SQL_INSERT_RESULTAT_HASH, empreinte_contenu
+)
+
+TAILLE_LRU = 50_000
+
+FICHIERS_POIDS = (".bin", ".safetensors", ".onnx", ".pt", ".h5")
+
+SQL_SELECT_RESULTAT_MODELE = """
+SELECT hash, label_predominant, score_predominant, scores, duree_analyse
+FROM analyse_resultat_hash
+WHERE modele = %s AND hash = ANY(%s);
+"""
+
+SQL_INSERT_RESULTATS_HASH_LOT = """
+INSERT INTO analyse_resultat_hash (
+    hash, modele, label_predominant, score_predominant, scores, duree_analyse, date_analyse
+) VALUES %s
+ON CONFLICT (hash, modele) DO NOTHING;
+"""
+
+# Garde les max_lignes résultats les plus récents
+SQL_PURGER_RESULTATS = """
+DELETE FROM analyse_resultat_hash
+WHERE date_analyse < (
+    SELECT date_analyse FROM analyse_resultat_hash
+    ORDER BY date_analyse DESC
+    OFFSET %s LIMIT 1
+);
+"""
+
+SQL_CREATE_SQLITE = """
+CREATE TABLE IF NOT EXISTS analyse_resultat_hash (
+    hash               text  NOT NULL,
+    modele             text  NOT NULL,
+    label_predominant  text,
+    score_predominant  real,
+    scores             text  NOT NULL,
+    duree_analyse      real,
+    date_analyse       text  NOT NULL,
+    PRIMARY KEY (hash, modele)
+);
+CREATE INDEX IF NOT EXISTS idx_resultat_date ON analyse_resultat_hash (date_analyse);
+"""
+
+
+@lru_cache(maxsize=None)
+def revision_modele(chemin: str) -> str:
+    """
+    Empreinte courte du contenu d’un modèle : config.json + sha256 des poids,
+    hors fichiers générés par artefacts_modeles.py (mêmes poids). Le sha256
+    vient du manifeste quand il décrit le fichier (même taille, manifeste plus
+    récent), sinon il est calculé : deux copies des mêmes poids, dans le
+    dossier de 05 et dans celui de l’API, ont la même révision.
+    """
+    empreinte = hashlib.sha1()
+    config = os.path.join(chemin, "config.json")
+    if os.path.exists(config):
+        with open(config, "rb") as f:
+            empreinte.update(f.read())
+    manifeste = lire_manifeste(chemin) or {}
+    date_manifeste = os.path.getmtime(os.path.join(chemin, MANIFESTE)) if manifeste else 0.0
+    generes = set(manifeste.get("fichiers", {}))
+    decrits = {**manifeste.get("fichiers", {}), **manifeste.get("source", {})}
+    poids = {}
+    for nom in sorted(os.listdir(chemin)) if os.path.isdir(chemin) else []:
+        if not nom.endswith(FICHIERS_POIDS) or nom in generes:
+            continue
+        fichier = os.path.join(chemin, nom)
+        attendu = decrits.get(nom)
+        infos = os.stat(fichier)
+        if attendu and attendu["taille"] == infos.st_size and infos.st_mtime <= date_manifeste:
+            poids[nom] = attendu["sha256"]
+        else:
+            poids[nom] = sha256_fichier(fichier)
+    # .bin supprimé après conversion (--supprimer_source) : les poids n'ont pas changé
+    for nom, attendu in manifeste.get("source", {}).items():
+        poids.setdefault(nom, attendu["sha256"])
+    for nom, sha in sorted(poids.items()):
+        empreinte.update(f"{nom}:{sha}".encode())
+    return empreinte.hexdigest()[:12]
+
+
+def activation_modele(chemin: str, activation: str | None = None) -> str:
+    """
+    Activation appliquée aux logits : celle imposée, sinon la règle
+    d’inference_lots (multi-label ou un seul label → sigmoid, sinon softmax).
+    """
+    if activation:
+        return activation
+    try:
+        with open(os.path.join(chemin, "config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return "softmax"
+    nb_labels = len(config.get("id2label") or {}) or config.get("num_labels", 2)
+    multi_label = config.get("problem_type") == "multi_label_classification" or nb_labels == 1
+    return "sigmoid" if multi_label else "softmax"
+
+
+def cle_modele(nom: str, revision: str, backend: str = "torch", activation: str | None = None,
+               labels: dict | None = None) -> str:
+    """
+    Nom stocké dans analyse_resultat_hash.modele :
+    "<nom>#<révision>[@backend][~activation][+labels]". Tout ce qui change les
+    scores stockés en fait partie : activation, regroupement des labels.
+    """
+    cle = f"{nom}#{revision}"
+    if backend != "torch":
+        cle += f"@{backend}"
+    if activation:
+        cle += f"~{activation}"
+    if labels:
+        cle += "+" + hashlib.sha1(json.dumps(labels, sort_keys=True).encode()).hexdigest()[:8]
+    return cle
+
+
+# ==========================
+# === NIVEAU 2 : PERSISTANT ===
+# ==========================
+def _resultat(pred, score, scores, duree) -> dict:
+    return {"label_predominant": pred, "score_predominant": score,
+            "scores": scores if isinstance(scores, dict) else json.loads(scores),
+            "duree": duree or 0.0}
+
+
+def _ligne_resultat(modele: str, empreinte: str, resultat: dict) -> tuple:
+    return (empreinte, modele, resultat["label_predominant"], resultat["score_predominant"],
+            json.dumps(resultat["scores"]), resultat["duree"], datetime.now(timezone.utc))
+
+
+class StockagePostgres:
+    """Table analyse_resultat_hash (celle de 05) ; une connexion psycopg2 dédiée."""
+
+    def __init__(self, conn):
+        self.conn    = conn
+        self._verrou = threading.Lock()
+        with self._verrou:
+            self._executer(SQL_CREATE_RESULTATS_HASH)
+
+    def _executer(self, sql: str, params=None, retour: bool = False):
+        cur = self.conn.cursor()
+        try:
+            cur.execute(sql, params)
+            lignes = cur.fetchall() if retour else cur.rowcount
+            self.conn.commit()
+            return lignes
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def lire(self, modele: str, hashes: list[str]) -> dict:
+        with self._verrou:
+            lignes = self._executer(SQL_SELECT_RESULTAT_MODELE, (modele, list(hashes)), retour=True)
+        return {h: _resultat(*reste) for h, *reste in lignes}
+
+    def ecrire(self, modele: str, empreinte: str, resultat: dict):
+        with self._verrou:
+            self._executer(SQL_INSERT_RESULTAT_HASH, _ligne_resultat(modele, empreinte, resultat))
+
+    def purger(self, max_lignes: int) -> int:
+        with self._verrou:
+            return self._executer(SQL_PURGER_RESULTATS, (max_lignes,))
+
+
+class StockageSqlite:
+    """Même schéma dans un fichier SQLite local (API sans base PostgreSQL)."""
+
+    def __init__(self, chemin: str):
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+        self.conn    = sqlite3.connect(chemin, check_same_thread=False)
+        self._verrou = threading.Lock()
+        with self._verrou:
+            self.conn.executescript(SQL_CREATE_SQLITE)
+
+    def lire(self, modele: str, hashes: list[str]) -> dict:
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        with self._verrou:
+            lignes = self.conn.execute(
+                "SELECT hash, label_predominant, score_predominant, scores, duree_analyse "
+                f"FROM analyse_resultat_hash WHERE modele = ? AND hash IN ({','.join('?' * len(hashes))})",
+                [modele, *hashes]).fetchall()
+        return {h: _resultat(*reste) for h, *reste in lignes}
+
+    def ecrire(self, modele: str, empreinte: str, resultat: dict):
+        with self._verrou, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO analyse_resultat_hash VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (empreinte, modele, resultat["label_predominant"], resultat["score_predominant"],
+                 json.dumps(resultat["scores"]), resultat["duree"],
+                 datetime.now(timezone.utc).isoformat()))
+
+    def purger(self, max_lignes: int) -> int:
+        with self._verrou, self.conn:
+            return self.conn.execute(
+                "DELETE FROM analyse_resultat_hash WHERE rowid NOT IN ("
+                "SELECT rowid FROM analyse_resultat_hash ORDER BY date_analyse DESC LIMIT ?)",
+                (max_lignes,)).rowcount
+
+
+# ===========================
+# === CACHE À DEUX NIVEAUX ===
+# ===========================
+class CacheInference:
+    """
+    cache = CacheInference(StockageSqlite("cache.sqlite3"))
+    modele = cle_modele("unitary_toxic-bert", revision_modele(chemin), activation=activation_modele(chemin))
+    r = cache.get(modele, empreinte_contenu(texte))          # dict ou None
+    if r is None: ... inférence ...; cache.put(modele, empreinte, r)
+    """
+
+    def __init__(self, stockage=None, taille_lru: int = TAILLE_LRU, max_lignes: int | None = None):
+        self.stockage   = stockage
+        self.max_lignes = max_lignes
+        self._lru       = CacheLRU(taille_lru)
+        self._verrou    = threading.Lock()
+        self.hits_memoire   = 0
+        self.hits_persistant = 0
+        self.defauts    = 0
+        self.ecritures  = 0
+        self.erreurs_stockage = 0
+
+    def _erreur_stockage(self, operation: str, erreur: Exception):
+        with self._verrou:
+            self.erreurs_stockage += 1
+            premiere = self.erreurs_stockage == 1
+        if premiere:
+            print(f"⚠️  Cache d'inférence : échec {operation} du stockage ({erreur!r}), "
+                  f"poursuite sans (erreurs suivantes comptées dans stats())")
+
+    def get(self, modele: str, empreinte: str) -> dict | None:
+        return self.get_lot(modele, [empreinte]).get(empreinte)
+
+    def get_lot(self, modele: str, empreintes) -> dict:
+        """{hash: résultat} des empreintes connues ; celles absentes de la mémoire en une lecture."""
+        trouves, manquants = {}, []
+        with self._verrou:
+            for empreinte in dict.fromkeys(empreintes):
+                r = self._lru.get((modele, empreinte))
+                if r is None:
+                    manquants.append(empreinte)
+                else:
+                    trouves[empreinte] = r
+            self.hits_memoire += len(trouves)
+        lus = {}
+        if self.stockage and manquants:
+            try:
+                lus = self.stockage.lire(modele, manquants)
+            except Exception as e:
+                self._erreur_stockage("de lecture", e)
+        with self._verrou:
+            for empreinte, r in lus.items():
+                self._lru[(modele, empreinte)] = r
+            self.hits_persistant += len(lus)
+            self.defauts += len(manquants) - len(lus)
+        trouves.update(lus)
+        return trouves
+
+    def put(self, modele: str, empreinte: str, resultat: dict):
+        with self._verrou:
+            self._lru[(modele, empreinte)] = resultat
+            self.ecritures += 1
+            purger = self.max_lignes and self.ecritures % 1000 == 0
+        if self.stockage:
+            try:
+                self.stockage.ecrire(modele, empreinte, resultat)
+                if purger:
+                    self.stockage.purger(self.max_lignes)
+            except Exception as e:
+                self._erreur_stockage("d'écriture", e)
+
+    def get_texte(self, modele: str, texte: str) -> tuple[str, dict | None]:
+        """(hash du texte, résultat en cache ou None)."""
+        empreinte = empreinte_contenu(texte)
+        return empreinte, self.get(modele, empreinte)
+
+    def stats(self) -> dict:
+        with self._verrou:
+            total = self.hits_memoire + self.hits_persistant + self.defauts
+            return {
+                "hits_memoire": self.hits_memoire, "hits_persistant": self.hits_persistant,
+                "defauts": self.defauts, "evictions": self._lru.evictions,
+                "taux_hit": round((self.hits_memoire + self.hits_persistant) / total, 4) if total else 0.0,
+                "entrees_memoire": len(self._lru), "taille_max_memoire": self._lru.taille_max,
+                "erreurs_stockage": self.erreurs_stockage,
+            }
+
+    def rapport(self) -> str:
+        s = self.stats()
+        return (f"Cache d'inférence : {s['taux_hit']:.1%} de hits ({s['hits_memoire']} mémoire, "
+                f"{s['hits_persistant']} persistants, {s['defauts']} défauts) | "
+                f"{s['entrees_memoire']}/{s['taille_max_memoire']} entrées, {s['evictions']} évictions"
+                + (f" | {s['erreurs_stockage']} erreurs de stockage" if s["erreurs_stockage"] else ""))
+
+
+# ======================================
+# === 05 : PASSES ET ÉCRITURE GROUPÉE ===
+# ======================================
+class ResultatsParHash(CacheInference):
+    """
+    res = ResultatsParHash(StockagePostgres(conn), taille_lru)
+    connus = res.get_lot(modele, hashes)     # {hash: dict}, une requête par modèle et par passe
+    ... inférence des autres ...; res.memoriser(modele, hash, resultat)
+    res.ecrire_en_attente(cur)               # dans la transaction de la passe
+    res.confirmer_ecriture()                 # après son commit (sinon réécrits à la passe suivante)
+    print(res.rapport())
+    """
+
+    def __init__(self, stockage, taille_lru: int = TAILLE_LRU):
+        super().__init__(stockage, taille_lru)
+        self.posts       = 0                 # posts vus dans le run
+        self.posts_dupliques = 0             # posts dont le hash était déjà connu
+        self.reutilises  = 0                 # inférences évitées
+        self.secondes_economisees = 0.0
+        self.secondes_calcul      = 0.0
+        # Hashes des derniers posts vus, bornés comme les résultats : un doublon
+        # séparé de son original par plus de taille_lru textes n'est plus compté
+        self._hashes_vus = CacheLRU(taille_lru)
+        self._a_ecrire   = []                # lignes mémorisées, pas encore en base
+        self._nb_ecrites = 0                 # dont envoyées dans la transaction en cours
+
+    def compter_post(self, empreinte: str):
+        """À appeler une fois par post traité (taux de doublons)."""
+        self.posts += 1
+        if empreinte in self._hashes_vus:
+            self.posts_dupliques += 1
+        self._hashes_vus[empreinte] = True
+
+    def compter_reutilisation(self, resultat: dict):
+        """Un post reprend `resultat` au lieu de relancer l’inférence."""
+        self.reutilises += 1
+        self.secondes_economisees += resultat["duree"]
+
+    def memoriser(self, modele: str, empreinte: str, resultat: dict):
+        """Comme put(), mais l’écriture en base attend le prochain ecrire_en_attente()."""
+        with self._verrou:
+            self._lru[(modele, empreinte)] = resultat
+            self.ecritures += 1
+        self.secondes_calcul += resultat["duree"]
+        self._a_ecrire.append(_ligne_resultat(modele, empreinte, resultat))
+
+    def ecrire_en_attente(self, cur) -> int:
+        """
+        Insère les résultats mémorisés en une requête, sans commit (transaction
+        de l’appelant). Ils restent en attente jusqu’à confirmer_ecriture() :
+        si la transaction est annulée, la passe suivante les réécrit.
+        """
+        self._nb_ecrites = len(self._a_ecrire)
+        if not self._a_ecrire:
+            return 0
+        execute_values(cur, SQL_INSERT_RESULTATS_HASH_LOT, self._a_ecrire, page_size=len(self._a_ecrire))
+        return cur.rowcount
+
+    def confirmer_ecriture(self):
+        """À appeler après le commit de la transaction d’ecrire_en_attente()."""
+        del self._a_ecrire[:self._nb_ecrites]
+        self._nb_ecrites = 0
+
+    def rapport(self) -> str:
+        taux = self.posts_dupliques / self.posts if self.posts else 0.0
+        total = self.reutilises + self.ecritures
+        part  = self.reutilises / total if total else 0.0
+        return (f"Déduplication : {self.posts_dupliques}/{self.posts} posts au texte déjà vu ({taux:.1%}) | "
+                f"{self.reutilises} inférences évitées sur {total} ({part:.1%}) | "
+                f"≈ {self.secondes_economisees:.0f}s de calcul économisées "
+                f"(contre {self.secondes_calcul:.0f}s réellement calculées)\n"
+                + super().rapport())
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Client Bluesky : live, enregistrement ou rejeu (BLUESKY_CLIENT_MODE)
+────────────────────────────────────────────────────────────────────────────
+Tous les scripts se connectaient à Bluesky dès l’import (`client.login`) :
+impossible de lancer ou de mesurer quoi que ce soit sans identifiants ni
+réseau. `creer_client()` remplace ce `Client()` + `login()` et choisit le
+mode via l’environnement :
+
+ • live   (défaut) : client atproto habituel ;
+ • record : client atproto dont les réponses de search_posts, get_posts,
+            get_profile(s) et resolve_handle sont recopiées dans une
+            cassette JSONL (une ligne par appel, avec sa durée) ;
+ • replay : aucun réseau ; les réponses sont relues depuis la cassette,
+            avec latence injectable (fixe ou celle de l’enregistrement) et
+            erreurs 429 simulées à un taux donné.
+
+Variables d’environnement :
+    BLUESKY_CLIENT_MODE        live | record | replay
+    BLUESKY_CASSETTE           chemin du fichier JSONL (défaut data/cassette_bluesky.jsonl)
+    BLUESKY_REPLAY_LATENCE_MS  nombre de ms, ou « enregistree » (défaut 0)
+    BLUESKY_REPLAY_TAUX_429    probabilité d’un 429 par appel (défaut 0)
+    BLUESKY_REPLAY_STRICT      1 : un appel absent de la cassette lève une
+                               erreur ; 0 (défaut) : une réponse enregistrée
+                               de la même méthode est resservie
+
+En rejeu, get_profiles / get_posts sont reconstruits compte par compte et
+post par post à partir de tout ce qui a été enregistré : le découpage en
+paquets peut donc différer de celui de l’enregistrement.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+current_file = os.path.abspath(__file__)
+project_root = os.path.abspath(os.path.join(current_file, "..", "..", ".."))
+CASSETTE_DEFAUT = os.path.join(project_root, "data", "cassette_bluesky.jsonl")
+
+# Méthodes interceptées (chemin dans le client atproto)
+METHODES = (
+    "app.bsky.feed.search_posts",
+    "app.bsky.feed.get_posts",
+    "app.bsky.actor.get_profile",
+    "app.bsky.actor.get_profiles",
+    "com.atproto.identity.resolve_handle",
+)
+
+
+class ReponseAbsente(LookupError):
+    """Appel absent de la cassette en mode strict."""
+
+
+class ErreurRateLimitSimulee(Exception):
+    """429 simulé ; reconnu par est_rate_limit comme un vrai."""
+
+    def __init__(self, methode: str):
+        super().__init__(f"429 RateLimitExceeded (simulé) sur {methode}")
+        self.response = SimpleNamespace(status_code=429)
+
+
+# =======================
+# === OUTILS COMMUNS ===
+# =======================
+def est_rate_limit(exc: Exception) -> bool:
+    """Vrai si l’exception correspond à un HTTP 429 renvoyé par l’API Bluesky."""
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    # Pas de recherche de « 429 » dans le message : un CID, un curseur ou un
+    # compteur peut le contenir et transformerait une vraie erreur en retry
+    return "RateLimitExceeded" in str(exc)
+
+
+def _params(args, kwargs) -> dict:
+    """Les appels atproto passent les paramètres en positionnel ou via params=."""
+    p = kwargs.get("params", args[0] if args else {}) or {}
+    return p if isinstance(p, dict) else p.model_dump(exclude_none=True)
+
+
+def _cle(methode: str, params: dict) -> str:
+    return methode + " " + json.dumps(params, sort_keys=True, default=str)
+
+
+def _en_objet(valeur):
+    """dict JSON → objet à attributs (post.author.did, profile.followers_count…)."""
+    if isinstance(valeur, dict):
+        return SimpleNamespace(**{k: _en_objet(v) for k, v in valeur.items()})
+    if isinstance(valeur, list):
+        return [_en_objet(v) for v in valeur]
+    return valeur
+
+
+def espaces_client(appeler) -> SimpleNamespace:
+    """Reconstitue client.app.bsky.feed.search_posts & co autour de `appeler(methode, …)`."""
+    racine = SimpleNamespace()
+    for methode in METHODES:
+        noeud = racine
+        *chemin, nom = methode.split(".")
+        for partie in chemin:
+            if not hasattr(noeud, partie):
+                setattr(noeud, partie, SimpleNamespace())
+            noeud = getattr(noeud, partie)
+        setattr(noeud, nom, lambda *a, _m=methode, **k: appeler(_m, *a, **k))
+    return racine
+
+
+# =============================
+# === MODE ENREGISTREMENT ===
+# =============================
+class ClientEnregistreur:
+    """Enveloppe un client atproto connecté et recopie ses réponses dans la cassette."""
+
+    def __init__(self, client, cassette: str):
+        self._client  = client
+        self._fichier = open(cassette, "a", encoding="utf-8")
+        self._verrou  = threading.Lock()
+        espaces = espaces_client(self._appeler)
+        self.app, self.com = espaces.app, espaces.com
+
+    def _appeler(self, methode: str, *args, **kwargs):
+        fonction = self._client
+        for partie in methode.split("."):
+            fonction = getattr(fonction, partie)
+        ligne = {"methode": methode, "params": _params(args, kwargs)}
+        t0 = time.perf_counter()
+        try:
+            reponse = fonction(*args, **kwargs)
+            ligne["reponse"] = reponse.model_dump(mode="json")
+            return reponse
+        except Exception as e:
+            ligne["erreur"] = str(e)
+            raise
+        finally:
+            ligne["duree_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            with self._verrou:
+                self._fichier.write(json.dumps(ligne, ensure_ascii=False) + "\n")
+                self._fichier.flush()
+
+    def fermer(self):
+        self._fichier.close()
+
+
+# =====================
+# === MODE REJEU ===
+# =====================
+class ClientRejeu:
+    """
+    Client hors ligne relisant une cassette.
+    - latence_ms : délai ajouté à chaque appel, ou "enregistree" pour
+                   reproduire la durée mesurée à l’enregistrement ;
+    - taux_429   : probabilité qu’un appel lève une ErreurRateLimitSimulee ;
+    - strict     : lever ReponseAbsente plutôt que resservir une autre réponse.
+    """
+
+    def __init__(self, cassette: str, latence_ms=0, taux_429: float = 0.0,
+                 strict: bool = False, graine: int | None = None):
+        self.latence_ms = latence_ms
+        self.taux_429   = taux_429
+        self.strict     = strict
+        self._hasard    = random.Random(graine)
+        self._verrou    = threading.Lock()
+        self.nb_appels  = 0
+        self.nb_429     = 0
+
+        self._reponses  = {}   # clé d’appel → [(réponse, durée_ms)]
+        self._par_methode = {} # méthode → [(réponse, durée_ms)] (repli non strict)
+        self._rotation  = {}   # clé → index de la prochaine réponse servie
+        self._profils   = {}   # did → profil (get_profile, get_profiles, auteurs des posts)
+        self._posts     = {}   # uri → post
+        self._dids      = {}   # handle → did
+
+        with open(cassette, encoding="utf-8") as f:
+            for ligne in f:
+                if ligne.strip():
+                    self._indexer(json.loads(ligne))
+
+        espaces = espaces_client(self._appeler)
+        self.app, self.com = espaces.app, espaces.com
+
+    def _indexer(self, appel: dict):
+        reponse = appel.get("reponse")
+        if reponse is None:
+            return
+        methode = appel["methode"]
+        entree  = (reponse, appel.get("duree_ms", 0.0))
+        self._reponses.setdefault(_cle(methode, appel["params"]), []).append(entree)
+        self._par_methode.setdefault(methode, []).append(entree)
+
+        profils = {"app.bsky.actor.get_profile": [reponse],
+                   "app.bsky.actor.get_profiles": reponse.get("profiles", [])}.get(methode, [])
+        for profil in profils:
+            self._profils[profil["did"]] = profil
+        for post in reponse.get("posts", []):
+            self._posts[post["uri"]] = post
+            self._profils.setdefault(post["author"]["did"], post["author"])
+        for profil in list(profils) + [p["author"] for p in reponse.get("posts", [])]:
+            if profil.get("handle"):
+                self._dids[profil["handle"]] = profil["did"]
+        if methode == "com.atproto.identity.resolve_handle":
+            self._dids[appel["params"].get("handle")] = reponse["did"]
+
+    def login(self, *args, **kwargs):
+        return None
+
+    def posts_enregistres(self) -> list[dict]:
+        """Tous les posts présents dans la cassette (dicts JSON)."""
+        return list(self._posts.values())
+
+    # ---------- résolution d’un appel ----------
+    def _servir(self, methode: str, params: dict):
+        if methode == "app.bsky.actor.get_profiles":
+            return {"profiles": [self._profils[d] for d in params.get("actors", []) if d in self._profils]}, None
+        if methode == "app.bsky.feed.get_posts":
+            return {"posts": [self._posts[u] for u in params.get("uris", []) if u in self._posts]}, None
+        if methode == "app.bsky.actor.get_profile" and params.get("actor") in self._profils:
+            return self._profils[params["actor"]], None
+        if methode == "com.atproto.identity.resolve_handle" and params.get("handle") in self._dids:
+            return {"did": self._dids[params["handle"]]}, None
+
+        cle = _cle(methode, params)
+        candidates = self._reponses.get(cle)
+        if not candidates:
+            if self.strict or not self._par_methode.get(methode):
+                raise ReponseAbsente(f"Appel absent de la cassette : {cle}")
+            cle, candidates = methode, self._par_methode[methode]
+        with self._verrou:
+            i = self._rotation.get(cle, 0)
+            self._rotation[cle] = i + 1
+        return candidates[i % len(candidates)]
+
+    def _appeler(self, methode: str, *args, **kwargs):
+        params = _params(args, kwargs)
+        reponse, duree_ms = self._servir(methode, params)
+
+        if self.latence_ms == "enregistree":
+            attente = duree_ms or 0.0
+        else:
+            attente = float(self.latence_ms or 0)
+        if attente:
+            time.sleep(attente / 1000)
+
+        with self._verrou:
+            self.nb_appels += 1
+            rate_limite = self.taux_429 and self._hasard.random() < self.taux_429
+            if rate_limite:
+                self.nb_429 += 1
+        if rate_limite:
+            raise ErreurRateLimitSimulee(methode)
+        return _en_objet(reponse)
+
+
+# ==========================
+# === FABRIQUE DE CLIENT ===
+# ==========================
+def creer_client(handle: str | None = None, password: str | None = None, mode: str | None = None,
+                 cassette: str | None = None):
+    """
+    Client prêt à l’emploi selon BLUESKY_CLIENT_MODE (voir en-tête).
+    handle / password : par défaut BLUESKY_HANDLE / BLUESKY_PASSWORD.
+    """
+    mode     = (mode or os.getenv("BLUESKY_CLIENT_MODE") or "live").lower()
+    cassette = cassette or os.getenv("BLUESKY_CASSETTE") or CASSETTE_DEFAUT
+
+    if mode == "replay":
+        latence = os.getenv("BLUESKY_REPLAY_LATENCE_MS", "0")
+        return ClientRejeu(
+            cassette,
+            latence_ms = latence if latence == "enregistree" else float(latence),
+            taux_429   = float(os.getenv("BLUESKY_REPLAY_TAUX_429", "0")),
+            strict     = os.getenv("BLUESKY_REPLAY_STRICT", "0") == "1",
+        )
+
+    from atproto import Client
+    client = Client()
+    client.login(handle or os.getenv("BLUESKY_HANDLE"), password or os.getenv("BLUESKY_PASSWORD"))
+    if mode == "record":
+        print(f"Enregistrement des réponses Bluesky dans {cassette}")
+        return ClientEnregistreur(client, cassette)
+    return client
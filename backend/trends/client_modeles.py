@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Client HTTP du serveur de modèles (serveur_modeles.py)
+────────────────────────────────────────────────────────────────────────────
+Bibliothèque standard seulement : l’API en mode serveur
+(PIGMALION_SERVEUR_MODELES) n’importe ni torch ni transformers pour parler
+au serveur, qui porte seul les modèles.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import json
+import urllib.error
+import urllib.request
+
+PORT_SERVEUR = 8765
+URL_SERVEUR  = f"http://127.0.0.1:{PORT_SERVEUR}"
+
+
+class ClientModeles:
+    """
+    client = ClientModeles(URL_SERVEUR)
+    scores = client.predire("emotion", textes, "interactif")   # [{label: score}, ...]
+    """
+
+    def __init__(self, url: str = URL_SERVEUR, timeout: float = 600):
+        self.url     = url.rstrip("/")
+        self.timeout = timeout
+
+    def _appel(self, route: str, corps: dict | None = None) -> dict:
+        donnees = json.dumps(corps).encode("utf-8") if corps is not None else None
+        requete = urllib.request.Request(self.url + route, data=donnees,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(requete, timeout=self.timeout) as reponse:
+                return json.loads(reponse.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"Serveur de modèles ({e.code}) : {e.read().decode('utf-8', 'replace')}") from None
+
+    def predire(self, modele: str, textes: list[str], priorite: str = "batch",
+                activation: str | None = None) -> list[dict]:
+        """activation : "softmax" / "sigmoid" imposés, sinon celle de la config du modèle."""
+        if not textes:
+            return []
+        corps = {"modele": modele, "textes": list(textes), "priorite": priorite}
+        if activation:
+            corps["activation"] = activation
+        return self._appel("/predire", corps)["scores"]
+
+    def sante(self) -> dict:
+        return self._appel("/sante")
+
+    def stats(self) -> dict:
+        return self._appel("/stats")
+
+
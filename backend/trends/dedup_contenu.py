@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Déduplication par contenu : un texte identique n’est analysé qu’une fois
+────────────────────────────────────────────────────────────────────────────
+Reposts de spam, campagnes de bots, copier-coller : le même texte arrive
+dans post_clean sous plusieurs URLs, et 05_POSTS_ANALYSE passait les six
+modèles sur chaque copie.
+
+ • post_clean.post_clean_hash = md5 du texte nettoyé (calculé au nettoyage,
+   rattrapé en SQL pour l’historique : md5() PostgreSQL = hashlib.md5) ;
+ • analyse_resultat_hash : sorties des modèles indexées par
+   (hash, modèle) — label et score prédominants, scores par label, durée ;
+ • ResultatsParHash (cache_inference.py) : avant d’appeler un modèle, 05
+   cherche le couple (hash, modèle) ; s’il existe, les scores sont recopiés
+   pour la nouvelle URL au lieu de relancer l’inférence.
+
+nettoyer_texte (minuscules, sans URL / mention / hashtag / ponctuation,
+espaces réduits) produit le texte de post_clean : deux posts qui ne
+diffèrent que par un lien ou une mention partagent leur hash. /analyze ne
+l’utilise qu’avec PIGMALION_TEXTE_MODELES=post_clean.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import re
+import hashlib
+from collections import OrderedDict
+
+SQL_COLONNE_HASH_EXISTE = """
+SELECT 1 FROM information_schema.columns
+WHERE table_name = 'post_clean' AND column_name = 'post_clean_hash';
+"""
+
+SQL_AJOUT_COLONNE_HASH = """
+ALTER TABLE post_clean ADD COLUMN IF NOT EXISTS post_clean_hash text;
+CREATE INDEX IF NOT EXISTS idx_post_clean_hash ON post_clean (post_clean_hash);
+"""
+
+# Rattrapage des lignes nettoyées avant l’ajout de la colonne
+SQL_BACKFILL_HASH = """
+UPDATE post_clean
+SET post_clean_hash = md5(post_clean_contenu)
+WHERE post_clean_hash IS NULL
+  AND post_clean_contenu IS NOT NULL;
+"""
+
+SQL_CREATE_RESULTATS_HASH = """
+CREATE TABLE IF NOT EXISTS analyse_resultat_hash (
+    hash               text         NOT NULL,
+    modele             text         NOT NULL,
+    label_predominant  text,
+    score_predominant  real,
+    scores             jsonb        NOT NULL,
+    duree_analyse      real,
+    date_analyse       timestamptz  NOT NULL,
+    PRIMARY KEY (hash, modele)
+);
+"""
+
+SQL_INSERT_RESULTAT_HASH = """
+INSERT INTO analyse_resultat_hash (
+    hash, modele, label_predominant, score_predominant, scores, duree_analyse, date_analyse
+) VALUES (%s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (hash, modele) DO NOTHING;
+"""
+
+_RE_BRUIT  = re.compile(r"http\S+|@\S+|#\S+|[^\w\s]")
+_RE_ESPACE = re.compile(r"\s+")
+
+
+def nettoyer_texte(texte: str) -> str:
+    """Texte normalisé dont on prend le hash (post_clean_contenu)."""
+    # Passage en minuscules, suppression d'URLs, mentions, hashtags et ponctuation
+    texte = _RE_BRUIT.sub("", texte.lower())
+    # Normalisation des espaces
+    return _RE_ESPACE.sub(" ", texte).strip()
+
+
+def empreinte_contenu(texte: str) -> str:
+    """Hash du texte nettoyé, identique au md5() de PostgreSQL."""
+    return hashlib.md5(texte.encode("utf-8")).hexdigest()
+
+
+def assurer_colonne_hash(conn, rattraper: bool = False) -> int:
+    """
+    Ajoute post_clean.post_clean_hash si besoin ; avec rattraper=True,
+    calcule le hash des lignes qui n’en ont pas. Retourne le nb de lignes rattrapées.
+    """
+    cur = conn.cursor()
+    cur.execute(SQL_COLONNE_HASH_EXISTE)
+    if cur.fetchone() is None:
+        cur.execute(SQL_AJOUT_COLONNE_HASH)
+    nb = 0
+    if rattraper:
+        cur.execute(SQL_BACKFILL_HASH)
+        nb = cur.rowcount
+    conn.commit()
+    cur.close()
+    return nb
+
+
+class CacheLRU:
+    """Dictionnaire borné à taille_max entrées ; get() rafraîchit l’entrée."""
+
+    def __init__(self, taille_max: int):
+        self.taille_max = taille_max
+        self.evictions  = 0
+        self._donnees   = OrderedDict()
+
+    def get(self, cle, defaut=None):
+        valeur = self._donnees.get(cle, defaut)
+        if cle in self._donnees:
+            self._donnees.move_to_end(cle)
+        return valeur
+
+    def __contains__(self, cle) -> bool:
+        return cle in self._donnees
+
+    def __setitem__(self, cle, valeur):
+        self._donnees[cle] = valeur
+        self._donnees.move_to_end(cle)
+        while len(self._donnees) > self.taille_max:
+            self._donnees.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, elements: dict):
+        for cle, valeur in elements.items():
+            self[cle] = valeur
+
+    def __len__(self) -> int:
+        return len(self._donnees)
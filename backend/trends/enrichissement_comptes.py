@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Enrichissement des comptes en un seul passage (remplace les étapes 2 et 3)
+────────────────────────────────────────────────────────────────────────────
+ • une seule requête liste les comptes en attente
+   (compte_completion_01 <> 'OK' ou compte_completion_02 IS NULL) ;
+ • les profils sont résolus par `app.bsky.actor.get_profiles`, 25 DID par
+   appel (au lieu de deux `get_profile` par compte) ;
+ • avatar / bio / bannière / badge (ex-étape 2) et publications / followers /
+   date de création (ex-étape 3) sont renseignés ensemble, via COPY dans une
+   table temporaire puis un unique UPDATE … FROM, et un seul commit.
+
+Règles reprises des anciennes étapes :
+ • on ne remplace jamais une valeur déjà renseignée (COALESCE) ;
+ • un compte absent de la réponse (supprimé, suspendu…) passe
+   compte_completion_01 = 'OK' et compte_completion_02 = 'COMPTE INVALIDE' ;
+ • si un appel échoue (réseau, 429…), ses comptes restent en attente.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+from tqdm import tqdm
+
+from bulk_ingest import copier_vers_temp
+from telemetrie import metriques
+
+TAILLE_CHUNK_PROFILS = 25   # maximum accepté par app.bsky.actor.getProfiles
+
+SQL_SELECT_COMPTES_A_ENRICHIR = """
+SELECT compte_did
+FROM compte_brut
+WHERE compte_completion_01 IS DISTINCT FROM 'OK'
+   OR compte_completion_02 IS NULL;
+"""
+
+COLONNES_ENRICHISSEMENT = [
+    "compte_did",
+    "compte_brut_handle",
+    "compte_brut_avatar_url",
+    "compte_brut_is_verified",
+    "compte_brut_bio",
+    "compte_brut_banner_url",
+    "compte_nombre_publication",
+    "compte_brut_nombre_followers",
+    "compte_brut_date_creation",
+    "compte_completion_02",
+]
+
+SQL_UPDATE_COMPTES_ENRICHIS = """
+UPDATE compte_brut AS c SET
+    compte_brut_handle           = COALESCE(v.compte_brut_handle, c.compte_brut_handle),
+    compte_brut_avatar_url       = COALESCE(c.compte_brut_avatar_url, v.compte_brut_avatar_url),
+    compte_brut_is_verified      = COALESCE(c.compte_brut_is_verified, v.compte_brut_is_verified),
+    compte_brut_bio              = COALESCE(c.compte_brut_bio, v.compte_brut_bio),
+    compte_brut_banner_url       = COALESCE(c.compte_brut_banner_url, v.compte_brut_banner_url),
+    compte_nombre_publication    = COALESCE(c.compte_nombre_publication, v.compte_nombre_publication),
+    compte_brut_nombre_followers = COALESCE(c.compte_brut_nombre_followers, v.compte_brut_nombre_followers),
+    compte_brut_date_creation    = COALESCE(c.compte_brut_date_creation, v.compte_brut_date_creation),
+    compte_completion_01         = 'OK',
+    compte_completion_02         = COALESCE(c.compte_completion_02, v.compte_completion_02)
+FROM {tmp} AS v
+WHERE c.compte_did = v.compte_did;
+"""
+
+
+def ligne_depuis_profil(did: str, profile) -> tuple:
+    """Ligne COLONNES_ENRICHISSEMENT pour un profil résolu (ou None si introuvable)."""
+    if profile is None:
+        return (did, None, None, None, None, None, None, None, None, "COMPTE INVALIDE")
+    return (
+        did,
+        getattr(profile, "handle", None),
+        getattr(profile, "avatar", None),
+        getattr(profile, "labels", None) is not None,
+        getattr(profile, "description", None),
+        getattr(profile, "banner", None),
+        getattr(profile, "posts_count", None),
+        getattr(profile, "followers_count", None),
+        getattr(profile, "created_at", None),
+        "OK",
+    )
+
+
+def resoudre_profils(client, dids: list[str], taille_chunk: int = TAILLE_CHUNK_PROFILS, on_chunk=None):
+    """
+    Résout les DID par paquets de `taille_chunk` via get_profiles.
+    Retourne (lignes, nb_appels, nb_erreurs) ; les DID d’un appel en échec
+    ne produisent aucune ligne et resteront en attente.
+    """
+    lignes, appels, erreurs = [], 0, 0
+    for i in range(0, len(dids), taille_chunk):
+        chunk = dids[i:i + taille_chunk]
+        appels += 1
+        try:
+            res = client.app.bsky.actor.get_profiles({"actors": chunk})
+        except Exception as e:
+            erreurs += 1
+            print(f"Erreur get_profiles ({len(chunk)} comptes) → {e}")
+            continue
+        par_did = {p.did: p for p in res.profiles}
+        lignes.extend(ligne_depuis_profil(did, par_did.get(did)) for did in chunk)
+        if on_chunk is not None:
+            on_chunk(len(chunk))
+    return lignes, appels, erreurs
+
+
+def enrichir_comptes(conn, client, taille_chunk: int = TAILLE_CHUNK_PROFILS) -> dict:
+    """
+    Passage unique d’enrichissement de tous les comptes en attente.
+    Retourne un dict de stats : comptes, appels, enrichis, invalides, erreurs, duree.
+    """
+    t0  = time.time()
+    cur = conn.cursor()
+    cur.execute(SQL_SELECT_COMPTES_A_ENRICHIR)
+    dids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+
+    stats = {"comptes": len(dids), "appels": 0, "enrichis": 0,
+             "invalides": 0, "erreurs": 0, "duree": 0.0}
+    if not dids:
+        cur.close()
+        return stats
+
+    with tqdm(total=len(dids), desc="Enrichissement comptes", leave=False) as pbar:
+        lignes, appels, erreurs = resoudre_profils(client, dids, taille_chunk, on_chunk=pbar.update)
+
+    try:
+        if lignes:
+            tmp = copier_vers_temp(cur, "compte_brut", COLONNES_ENRICHISSEMENT, lignes,
+                                   tmp="tmp_compte_enrichi")
+            cur.execute(SQL_UPDATE_COMPTES_ENRICHIS.format(tmp=tmp))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Échec de la mise à jour des comptes → rollback : {e}")
+        lignes = []
+    finally:
+        cur.close()
+
+    invalides = sum(1 for l in lignes if l[-1] == "COMPTE INVALIDE")
+    stats.update(
+        appels    = appels,
+        erreurs   = erreurs,
+        enrichis  = len(lignes) - invalides,
+        invalides = invalides,
+        duree     = round(time.time() - t0, 3),
+    )
+    metriques.observer_etape("enrichissement", stats["duree"])
+    return stats
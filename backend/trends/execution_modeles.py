@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Exécution concurrente des modèles avec budget de cœurs (utilisée par 05_POSTS_ANALYSE.py)
+────────────────────────────────────────────────────────────────────────────
+Les six modèles tournaient l’un après l’autre, chacun avec le nombre de
+threads torch par défaut (tous les cœurs) : la machine plafonne au
+parallélisme d’un seul modèle, et deux modèles qui se recouvrent se
+disputent les mêmes cœurs.
+
+ExecuteurModeles fait tourner les modèles en même temps :
+ • "processus"  : un process par modèle, épinglé sur son sous-ensemble de
+                  cœurs (os.sched_setaffinity, Linux) avec
+                  torch.set_num_threads(budget) — seul mode qui applique
+                  BUDGET_COEURS (le reste des cœurs à parts égales) ;
+ • "threads"    : un thread par modèle dans le process courant. Le nombre
+                  de threads intra-op de torch est un réglage du process,
+                  pas du thread : il est fixé une fois, à cœurs / nb de
+                  modèles, et BUDGET_COEURS n’est pas appliqué ;
+ • "sequentiel" : comportement historique, un modèle après l’autre ;
+ • "serveur"    : aucun modèle chargé ici, les textes partent au serveur de
+                  modèles partagé (voir serveur_modeles.py), qui les regroupe
+                  en micro-lots avec ceux des autres clients.
+
+Hors mode "serveur", les modèles de même tokenizer (les quatre RoBERTa) ne
+tokenisent plus chacun les textes de la passe : TokenisationPartagee
+(tokenisation_partagee.py) les tokenise une fois par groupe, et chaque
+modèle reçoit les input_ids (predire_ids).
+
+Chaque modèle est servi par le backend choisi ("torch", "onnx", "onnx_int8",
+voir inference_onnx.py) ; ONNX Runtime reprend le budget de threads torch.
+
+Budget ("processus") : {"emotion": 4, "categories": 4, ...} ; les modèles
+absents du dictionnaire se partagent les cœurs restants (au moins un chacun).
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import torch
+from transformers import AutoTokenizer
+
+from inference_lots import TAILLE_LOT_INFERENCE
+from inference_onnx import charger_modele
+from tokenisation_partagee import TokenisationPartagee
+
+MODES_EXECUTION = ("processus", "threads", "sequentiel", "serveur")
+
+
+def coeurs_disponibles() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def repartir_coeurs(cles, budgets: dict | None = None, coeurs: list[int] | None = None) -> dict:
+    """
+    {cle: [cœurs]} en tranches contiguës. Si les budgets dépassent le nombre
+    de cœurs, les tranches repartent du début (recouvrement signalé).
+    """
+    cles    = list(cles)
+    budgets = dict(budgets or {})
+    coeurs  = coeurs or coeurs_disponibles()
+    libres  = [c for c in cles if c not in budgets]
+    reste   = max(len(coeurs) - sum(budgets[c] for c in cles if c in budgets), 0)
+    for i, cle in enumerate(libres):
+        # Répartition du reste à parts égales, le surplus aux premiers
+        budgets[cle] = max(1, reste // len(libres) + (1 if i < reste % len(libres) else 0))
+
+    if sum(budgets[c] for c in cles) > len(coeurs):
+        print(f"⚠️  Budgets ({sum(budgets[c] for c in cles)} cœurs) > {len(coeurs)} cœurs disponibles : "
+              f"certains modèles partageront des cœurs.")
+    repartition, position = {}, 0
+    for cle in cles:
+        n = min(budgets[cle], len(coeurs))
+        repartition[cle] = [coeurs[(position + k) % len(coeurs)] for k in range(n)]
+        position += n
+    return repartition
+
+
+# ========================================
+# === PROCESS DÉDIÉ À UN MODÈLE (pool) ===
+# ========================================
+_modele_process = None
+
+
+def threads_par_modele(nb_modeles: int) -> int:
+    """
+    Fixe torch.set_num_threads pour plusieurs modèles servis par des threads
+    d'un même process : réglage global, part égale des cœurs pour chacun.
+    """
+    nb_threads = max(1, len(coeurs_disponibles()) // max(1, nb_modeles))
+    torch.set_num_threads(nb_threads)
+    return nb_threads
+
+
+def _init_process_modele(chemin: str, device, coeurs: list[int], backend: str):
+    """Initialiseur du process : épinglage, budget de threads, chargement du modèle."""
+    global _modele_process
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, coeurs)
+    torch.set_num_threads(len(coeurs))
+    torch.set_num_interop_threads(1)
+    _modele_process = charger_modele(chemin, device, backend)
+
+
+def _predire_process(textes: list[str], taille_lot: int) -> tuple[list, float]:
+    t0 = time.time()
+    return _modele_process.predire_lot(textes, taille_lot), time.time() - t0
+
+
+def _predire_ids_process(ids: list[list[int]], taille_lot: int) -> tuple[list, float]:
+    t0 = time.time()
+    return _modele_process.predire_ids(ids, taille_lot), time.time() - t0
+
+
+class ExecuteurModeles:
+    """
+    executeur = ExecuteurModeles(MODELS, DEVICE, mode="processus", budgets=BUDGET_COEURS, backend="onnx_int8")
+    sorties = executeur.predire({"emotion": textes, ...})   # {cle: (scores, durée_s)}
+    executeur.fermer()
+    """
+
+    def __init__(self, chemins: dict, device=-1, mode: str = "processus",
+                 budgets: dict | None = None, taille_lot: int = TAILLE_LOT_INFERENCE,
+                 backend: str = "torch", url_serveur: str | None = None,
+                 tokenisation_partagee: bool = True):
+        if mode not in MODES_EXECUTION:
+            raise ValueError(f"Mode d’exécution inconnu : {mode} (attendu : {', '.join(MODES_EXECUTION)})")
+        self.mode        = mode
+        self.backend     = backend
+        self.taille_lot  = taille_lot
+        self.repartition = repartir_coeurs(chemins, budgets)
+        self._pools      = {}
+        self._modeles    = {}
+        self._threads    = None
+        self._client     = None
+        self._partage    = None
+        self.nb_threads  = None    # mode "threads" : réglage torch commun à tous les modèles
+
+        if mode == "processus":
+            # spawn : pas de fork d’un process où torch a déjà démarré ses threads
+            contexte = multiprocessing.get_context("spawn")
+            for cle, chemin in chemins.items():
+                self._pools[cle] = ProcessPoolExecutor(
+                    max_workers=1, mp_context=contexte, initializer=_init_process_modele,
+                    initargs=(chemin, device, self.repartition[cle], backend))
+            # Chargement effectif (et erreurs de chargement) dès maintenant
+            for cle, pool in self._pools.items():
+                pool.submit(_predire_process, [], taille_lot).result()
+            if tokenisation_partagee:
+                # Tokenizers seuls dans ce process : les ids partent aux process des modèles
+                self._partage = TokenisationPartagee({
+                    cle: AutoTokenizer.from_pretrained(chemin, local_files_only=True)
+                    for cle, chemin in chemins.items()})
+        elif mode == "serveur":
+            from client_modeles import ClientModeles, URL_SERVEUR
+            self._client = ClientModeles(url_serveur or URL_SERVEUR)
+            sante = self._client.sante()
+            manquants = [cle for cle in chemins if cle not in sante["modeles"]]
+            if manquants:
+                raise RuntimeError(f"Modèles absents du serveur {self._client.url} : {', '.join(manquants)}")
+            if sante["backend"] != backend:
+                raise RuntimeError(f"Le serveur sert le backend {sante['backend']}, pas {backend}")
+            self._threads = ThreadPoolExecutor(max_workers=len(chemins))
+        else:
+            if mode == "threads":
+                # Avant le chargement : les sessions ONNX reprennent ce réglage
+                self.nb_threads = threads_par_modele(len(chemins))
+            for cle, chemin in chemins.items():
+                self._modeles[cle] = charger_modele(chemin, device, backend)
+            if mode == "threads":
+                self._threads = ThreadPoolExecutor(max_workers=len(chemins))
+            if tokenisation_partagee:
+                self._partage = TokenisationPartagee({cle: m.tokenizer for cle, m in self._modeles.items()})
+
+    def decrire(self) -> str:
+        if self.mode == "serveur":
+            return f"mode serveur ({self._client.url}), backend {self.backend}"
+        if self.mode == "threads":
+            return (f"mode threads, backend {self.backend} | {self.nb_threads} threads torch par modèle "
+                    f"(réglage commun, budgets non appliqués)"
+                    + (f" | {self._partage.decrire()}" if self._partage else ""))
+        return f"mode {self.mode}, backend {self.backend} | " + ", ".join(
+            f"{cle} {len(c)} cœur{'s' if len(c) > 1 else ''}" for cle, c in self.repartition.items()) + (
+            f" | {self._partage.decrire()}" if self._partage else "")
+
+    def _predire_serveur(self, cle: str, textes: list[str]) -> tuple[list, float]:
+        t0 = time.time()
+        return self._client.predire(cle, textes, "batch"), time.time() - t0
+
+    def _predire_local(self, cle: str, textes: list[str], ids: list | None = None) -> tuple[list, float]:
+        t0 = time.time()
+        if ids is not None:
+            return self._modeles[cle].predire_ids(ids, self.taille_lot), time.time() - t0
+        return self._modeles[cle].predire_lot(textes, self.taille_lot), time.time() - t0
+
+    def _tokeniser_partage(self, travaux: dict) -> dict:
+        """{cle: input_ids} des modèles à tokenizer commun ; {} si indisponible."""
+        if self._partage is None:
+            return {}
+        try:
+            return self._partage.tokeniser(travaux)
+        except Exception as e:
+            # Chaque modèle retombe sur sa propre tokenisation
+            print(f"⚠️  Tokenisation partagée impossible pour cette passe : {e}")
+            return {}
+
+    def predire(self, travaux: dict) -> dict:
+        """
+        travaux = {cle: [textes]} → {cle: (scores, durée_s) ou exception}. Une erreur
+        d’un modèle n’interrompt pas les autres.
+        """
+        travaux = {cle: textes for cle, textes in travaux.items() if textes}
+        ids = self._tokeniser_partage(travaux)
+        if self.mode == "sequentiel":
+            sorties = {}
+            for cle, textes in travaux.items():
+                try:
+                    sorties[cle] = self._predire_local(cle, textes, ids.get(cle))
+                except Exception as e:
+                    sorties[cle] = e
+            return sorties
+
+        if self.mode == "processus":
+            futures = {cle: (self._pools[cle].submit(_predire_ids_process, ids[cle], self.taille_lot)
+                             if cle in ids else
+                             self._pools[cle].submit(_predire_process, textes, self.taille_lot))
+                       for cle, textes in travaux.items()}
+        elif self.mode == "serveur":
+            futures = {cle: self._threads.submit(self._predire_serveur, cle, textes)
+                       for cle, textes in travaux.items()}
+        else:
+            futures = {cle: self._threads.submit(self._predire_local, cle, textes, ids.get(cle))
+                       for cle, textes in travaux.items()}
+        sorties = {}
+        for cle, future in futures.items():
+            try:
+                sorties[cle] = future.result()
+            except Exception as e:
+                sorties[cle] = e
+        return sorties
+
+    def rapport(self) -> str | None:
+        return self._partage.rapport() if self._partage else None
+
+    def fermer(self):
+        for pool in self._pools.values():
+            pool.shutdown()
+        if self._threads is not None:
+            self._threads.shutdown()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de recherche asynchrone des mots-clés
+────────────────────────────────────────────────────────────────────────────
+Utilisé par 00_EXTRACTIONCOMPLETE_POST+COMPTE.py quand EXTRACTION_MODE = "async".
+
+ • les recherches `search_posts` de tous les mots-clés partent en parallèle
+   (au plus `concurrence` mots-clés en vol à la fois) ;
+ • chaque mot-clé est paginé jusqu’à sa limite de posts ;
+ • un seau à jetons global borne le nombre d’appels API par seconde, tous
+   mots-clés confondus : la durée d’un tour dépend du rate limit Bluesky et
+   non plus de la latence réseau ;
+ • les résultats sont remis au fil de l’eau au callback `on_result`, qui
+   réutilise le chemin d’insertion existant du script. Il tourne dans un
+   thread (écriture en base, enrichissement des comptes : du code
+   bloquant) : les recherches en vol continuent pendant ce temps.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import asyncio
+import time
+
+from client_bluesky import est_rate_limit
+from telemetrie import metriques
+
+
+# ==============================
+# === LIMITEUR : SEAU À JETONS ===
+# ==============================
+class TokenBucket:
+    """
+    Seau à jetons partagé par toutes les tâches de la boucle asyncio.
+    - debit    : jetons ajoutés par seconde (= appels API/s autorisés)
+    - capacite : taille maximale du seau (rafale autorisée)
+    """
+
+    def __init__(self, debit: float, capacite: int):
+        self.debit    = float(debit)
+        self.capacite = float(capacite)
+        self._jetons  = float(capacite)
+        self._dernier = time.monotonic()
+        self._verrou  = asyncio.Lock()
+
+    def _remplir(self):
+        maintenant = time.monotonic()
+        self._jetons = min(self.capacite, self._jetons + (maintenant - self._dernier) * self.debit)
+        self._dernier = maintenant
+
+    async def acquerir(self):
+        # Le verrou garantit un service dans l’ordre d’arrivée des tâches
+        async with self._verrou:
+            while True:
+                self._remplir()
+                if self._jetons >= 1:
+                    self._jetons -= 1
+                    return
+                await asyncio.sleep((1 - self._jetons) / self.debit)
+
+
+# ====================================
+# === RECHERCHE PAGINÉE D’UN MOT-CLÉ ===
+# ====================================
+class ErreurRecherche(Exception):
+    """Échec de la pagination d’un mot-clé ; `appels` = appels search_posts déjà consommés."""
+
+    def __init__(self, keyword: str, appels: int):
+        super().__init__(f"recherche '{keyword}' interrompue après {appels} appels")
+        self.appels = appels
+
+
+async def rechercher_keyword(client, limiteur: TokenBucket, keyword: str, limite: int,
+                             max_tentatives: int = 3, backoff: float = 2.0):
+    """
+    Pagine `search_posts` pour un mot-clé jusqu’à `limite` posts.
+    Chaque page consomme un jeton ; un 429 est réessayé avec un backoff
+    exponentiel, les autres erreurs remontent à l’appelant, enveloppées dans
+    ErreurRecherche (cause = erreur d’origine, avec le nombre d’appels faits).
+    Retourne (posts, nb_appels).
+    """
+    posts, cursor_token, appels = [], None, 0
+    while len(posts) < limite:
+        for tentative in range(max_tentatives):
+            await limiteur.acquerir()
+            appels += 1
+            try:
+                # Le client atproto est synchrone : l’appel part dans un thread
+                result = await asyncio.to_thread(
+                    client.app.bsky.feed.search_posts,
+                    params={"q": keyword, "cursor": cursor_token}
+                )
+                break
+            except Exception as e:
+                if not est_rate_limit(e) or tentative == max_tentatives - 1:
+                    raise ErreurRecherche(keyword, appels) from e
+                metriques.compter_retry("search_posts")
+                await asyncio.sleep(backoff * 2 ** tentative)
+
+        feed = result.posts
+        if not feed:
+            break
+        posts.extend(feed)
+        cursor_token = result.cursor
+        if cursor_token is None:
+            break
+    return posts[:limite], appels
+
+
+# =====================================
+# === BALAYAGE CONCURRENT DES MOTS-CLÉS ===
+# =====================================
+async def balayer_keywords(client, keywords, concurrence: int,
+                           debit: float, capacite: int, on_result, stop=None):
+    """
+    Lance la recherche de tous les mots-clés (liste de tuples
+    (categorie, keyword, limite) : limite = nb max de posts pour ce mot-clé).
+    - on_result(categorie, keyword, posts, erreur, appels) est appelé dès
+      qu’un mot-clé est terminé (erreur = None si tout s’est bien passé,
+      appels = nb d’appels search_posts consommés), dans un thread et un
+      mot-clé à la fois : il peut bloquer sans retenir les recherches ;
+    - stop() (optionnel) est consulté après chaque mot-clé : s’il renvoie True,
+      les recherches restantes sont annulées.
+    """
+    limiteur  = TokenBucket(debit, capacite)
+    semaphore = asyncio.Semaphore(concurrence)
+
+    async def job(categorie, keyword, limite):
+        async with semaphore:
+            try:
+                posts, appels = await rechercher_keyword(client, limiteur, keyword, limite)
+                return categorie, keyword, posts, None, appels
+            except ErreurRecherche as e:
+                return categorie, keyword, [], e.__cause__, e.appels
+            except Exception as e:
+                return categorie, keyword, [], e, 0
+
+    taches = [asyncio.create_task(job(categorie, keyword, limite))
+              for categorie, keyword, limite in keywords]
+    try:
+        for fut in asyncio.as_completed(taches):
+            categorie, keyword, posts, erreur, appels = await fut
+            await asyncio.to_thread(on_result, categorie, keyword, posts, erreur, appels)
+            if stop is not None and stop():
+                break
+    finally:
+        for t in taches:
+            t.cancel()
+        await asyncio.gather(*taches, return_exceptions=True)
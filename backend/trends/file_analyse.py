@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+File de travail PostgreSQL de l’analyse (utilisée par 05_POSTS_ANALYSE.py)
+────────────────────────────────────────────────────────────────────────────
+Le reste à faire se calculait en chargeant en Python toutes les URLs en
+anglais et toutes celles des six tables de mesure : un coût qui grandit avec
+l’historique, et un seul process d’analyse possible à la fois.
+
+La table analyse_file garde l’état de chaque couple (post, modèle) :
+ en_attente → en_cours (réclamé par un worker, avec bail) → fait
+                                                          ↘ erreur (trop d’échecs)
+ ignore : post sans contenu nettoyé.
+
+ • alimenter()   : ajoute en SQL les posts anglais absents de la file, déjà
+                   « fait » pour les modèles dont la table de mesure a la ligne,
+                   selon la politique de chaque modèle (planification_modeles.py) :
+                   priorité chaude, basse priorité (rattrapage), échantillon,
+                   ou rien (à la demande → demander()) ;
+ • reclamer(n)   : SELECT … FOR UPDATE SKIP LOCKED sur les couples en attente
+                   (ou dont le bail a expiré), par priorité, puis passage
+                   en_cours — deux workers ne réclament jamais le même couple ;
+ • terminer / echouer / ignorer : fin de traitement (un échec repasse en
+                   attente jusqu’à MAX_TENTATIVES) ;
+ • prolonger()   : renouvelle le bail des couples en cours du worker.
+
+Un worker qui meurt laisse des couples en_cours : à l’expiration de leur bail,
+un autre worker les reprend. Si le couple avait déjà épuisé ses tentatives
+(le worker mort à chaque fois sur le même post), alimenter() le passe en
+erreur au lieu de le laisser en_cours pour toujours. Plusieurs 05 peuvent donc vider l’arriéré en
+parallèle, sur une ou plusieurs machines.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import socket
+from collections import Counter
+
+from planification_modeles import (
+    PRIORITE_CHAUDE, PRIORITE_RATTRAPAGE, SQL_TIRAGE_ECHANTILLON, TAUX_ECHANTILLON
+)
+
+BAIL_SECONDES  = 600
+MAX_TENTATIVES = 3
+
+SQL_CREATE_FILE = """
+CREATE TABLE IF NOT EXISTS analyse_file (
+    post_url     text         NOT NULL,
+    modele       text         NOT NULL,
+    etat         text         NOT NULL DEFAULT 'en_attente',
+    worker       text,
+    bail_expire  timestamptz,
+    tentatives   integer      NOT NULL DEFAULT 0,
+    date_maj     timestamptz  NOT NULL DEFAULT now(),
+    PRIMARY KEY (post_url, modele)
+);
+CREATE INDEX IF NOT EXISTS idx_analyse_file_etat ON analyse_file (etat, post_url);
+ALTER TABLE analyse_file ADD COLUMN IF NOT EXISTS priorite smallint NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_analyse_file_priorite ON analyse_file (etat, priorite, post_url);
+"""
+
+# {table} : table de mesure du modèle (nom interne, jamais issu d’une saisie) ;
+# {filtre} : restriction d'échantillon, ou vide
+SQL_ALIMENTER_FILE = """
+INSERT INTO analyse_file (post_url, modele, etat, priorite)
+SELECT pc.post_url, %(modele)s,
+       CASE WHEN m.post_url IS NULL THEN 'en_attente' ELSE 'fait' END,
+       %(priorite)s
+FROM post_clean pc
+LEFT JOIN {table} m ON m.post_url = pc.post_url
+WHERE pc.post_clean_langue = 'en'
+  {filtre}
+  AND NOT EXISTS (
+      SELECT 1 FROM analyse_file f
+      WHERE f.post_url = pc.post_url AND f.modele = %(modele)s
+  )
+ON CONFLICT (post_url, modele) DO NOTHING;
+"""
+
+# Couples déjà en attente d'un modèle qui change de politique ; {filtre} comme ci-dessus
+SQL_REPRIORISER = """
+UPDATE analyse_file
+SET priorite = %(priorite)s
+WHERE modele = %(modele)s AND etat = 'en_attente' AND priorite <> %(priorite)s
+  {filtre};
+"""
+
+SQL_DEMANDER = """
+INSERT INTO analyse_file (post_url, modele, etat, priorite)
+SELECT d.post_url, d.modele, 'en_attente', %s
+FROM unnest(%s::text[], %s::text[]) AS d(post_url, modele)
+ON CONFLICT (post_url, modele) DO UPDATE
+SET etat = 'en_attente', priorite = LEAST(analyse_file.priorite, EXCLUDED.priorite),
+    tentatives = 0, date_maj = now()
+WHERE analyse_file.etat IN ('erreur', 'ignore')
+   OR (analyse_file.etat = 'en_attente' AND analyse_file.priorite > EXCLUDED.priorite);
+"""
+
+SQL_RECLAMER = """
+WITH lot AS (
+    SELECT post_url, modele
+    FROM analyse_file
+    WHERE (etat = 'en_attente' OR (etat = 'en_cours' AND bail_expire < now()))
+      AND tentatives < %(max_tentatives)s
+      AND priorite <= %(priorite_max)s
+    ORDER BY priorite, post_url
+    LIMIT %(limite)s
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE analyse_file f
+SET etat = 'en_cours', worker = %(worker)s, tentatives = f.tentatives + 1,
+    bail_expire = now() + %(bail)s * interval '1 second', date_maj = now()
+FROM lot
+WHERE f.post_url = lot.post_url AND f.modele = lot.modele
+RETURNING f.post_url, f.modele;
+"""
+
+SQL_TERMINER = """
+UPDATE analyse_file f
+SET etat = 'fait', bail_expire = NULL, date_maj = now()
+FROM unnest(%s::text[], %s::text[]) AS d(post_url, modele)
+WHERE f.post_url = d.post_url AND f.modele = d.modele AND f.worker = %s;
+"""
+
+SQL_ECHOUER = """
+UPDATE analyse_file f
+SET etat = CASE WHEN f.tentatives >= %s THEN 'erreur' ELSE 'en_attente' END,
+    bail_expire = NULL, date_maj = now()
+FROM unnest(%s::text[], %s::text[]) AS d(post_url, modele)
+WHERE f.post_url = d.post_url AND f.modele = d.modele AND f.worker = %s;
+"""
+
+SQL_IGNORER = """
+UPDATE analyse_file
+SET etat = 'ignore', bail_expire = NULL, date_maj = now()
+WHERE post_url = ANY(%s) AND worker = %s AND etat = 'en_cours';
+"""
+
+SQL_PROLONGER = """
+UPDATE analyse_file
+SET bail_expire = now() + %s * interval '1 second'
+WHERE worker = %s AND etat = 'en_cours';
+"""
+
+# Bail expiré sans tentative restante : plus aucun worker ne le réclamerait
+SQL_ABANDONNER = """
+UPDATE analyse_file
+SET etat = 'erreur', bail_expire = NULL, date_maj = now()
+WHERE etat = 'en_cours' AND bail_expire < now() AND tentatives >= %s;
+"""
+
+SQL_ETAT_FILE = "SELECT etat, COUNT(*) FROM analyse_file GROUP BY etat;"
+
+SQL_ETAT_FILE_PRIORITE = """
+SELECT priorite, COUNT(*) FROM analyse_file WHERE etat = 'en_attente' GROUP BY priorite;
+"""
+
+
+def identifiant_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class FileAnalyse:
+    """
+    file = FileAnalyse(conn, TABLES, politiques)  # {cle_modele: table_de_mesure}, {cle_modele: politique}
+    file.alimenter()
+    while (lot := file.reclamer(512)):           # {post_url: {cle_modele, ...}}
+        ... ; file.terminer(faits) ; file.echouer(echecs)
+    """
+
+    def __init__(self, conn, tables: dict, politiques: dict | None = None, worker: str | None = None,
+                 bail_secondes: int = BAIL_SECONDES, max_tentatives: int = MAX_TENTATIVES,
+                 taux_echantillon: float = TAUX_ECHANTILLON, rattrapage: bool = True):
+        self.conn           = conn
+        self.tables         = tables
+        self.politiques     = politiques or {cle: "toujours" for cle in tables}
+        self.taux_echantillon = taux_echantillon
+        # False : ce worker ne réclame que le chemin chaud
+        self.priorite_max   = PRIORITE_RATTRAPAGE if rattrapage else PRIORITE_CHAUDE
+        self.worker         = worker or identifiant_worker()
+        self.bail_secondes  = bail_secondes
+        self.max_tentatives = max_tentatives
+        self._executer(SQL_CREATE_FILE)
+
+    def _executer(self, sql: str, params=None, retour: bool = False):
+        cur = self.conn.cursor()
+        try:
+            cur.execute(sql, params)
+            lignes = cur.fetchall() if retour else cur.rowcount
+            self.conn.commit()
+            return lignes
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def alimenter(self) -> int:
+        """Ajoute les (post, modèle) manquants selon les politiques ; retourne le nb de couples ajoutés."""
+        self.abandonner()
+        nb = 0
+        for cle, table in self.tables.items():
+            politique = self.politiques.get(cle, "toujours")
+            if politique == "a_la_demande":
+                continue
+            priorite = PRIORITE_RATTRAPAGE if politique == "rattrapage" else PRIORITE_CHAUDE
+            filtre, hors_echantillon = "", ""
+            if politique == "echantillon":
+                taux = float(self.taux_echantillon)
+                filtre = f"AND {SQL_TIRAGE_ECHANTILLON.format(colonne='pc.post_url')} < {taux}"
+                hors_echantillon = f"AND {SQL_TIRAGE_ECHANTILLON.format(colonne='post_url')} >= {taux}"
+            nb += self._executer(SQL_ALIMENTER_FILE.format(table=table, filtre=filtre),
+                                 {"modele": cle, "priorite": priorite})
+            # Couples mis en file avant un changement de politique : les posts hors
+            # échantillon passent en rattrapage, les autres prennent la priorité du modèle
+            self._executer(SQL_REPRIORISER.format(filtre=hors_echantillon), {
+                "modele": cle, "priorite": PRIORITE_RATTRAPAGE if hors_echantillon else priorite})
+        return nb
+
+    def abandonner(self) -> int:
+        """Passe en erreur les couples en_cours au bail expiré et sans tentative restante."""
+        return self._executer(SQL_ABANDONNER, (self.max_tentatives,))
+
+    def demander(self, post_urls: list, cles: list, priorite: int = PRIORITE_CHAUDE) -> int:
+        """Met en file (post, modèle) pour chaque post × clé (politique "a_la_demande", relances)."""
+        couples = [(url, cle) for url in post_urls for cle in cles]
+        if not couples:
+            return 0
+        urls, modeles = zip(*couples)
+        return self._executer(SQL_DEMANDER, (priorite, list(urls), list(modeles)))
+
+    def reclamer(self, nb_posts: int) -> dict:
+        """Réclame jusqu’à nb_posts × nb_modèles couples → {post_url: {cle_modele, ...}}."""
+        lignes = self._executer(SQL_RECLAMER, {
+            "limite": nb_posts * len(self.tables), "worker": self.worker,
+            "bail": self.bail_secondes, "max_tentatives": self.max_tentatives,
+            "priorite_max": self.priorite_max,
+        }, retour=True)
+        lot = {}
+        for post_url, cle in lignes:
+            lot.setdefault(post_url, set()).add(cle)
+        return lot
+
+    def terminer(self, couples: list) -> int:
+        if not couples:
+            return 0
+        urls, cles = zip(*couples)
+        return self._executer(SQL_TERMINER, (list(urls), list(cles), self.worker))
+
+    def echouer(self, couples: list) -> int:
+        if not couples:
+            return 0
+        urls, cles = zip(*couples)
+        return self._executer(SQL_ECHOUER, (self.max_tentatives, list(urls), list(cles), self.worker))
+
+    def ignorer(self, post_urls: list) -> int:
+        if not post_urls:
+            return 0
+        return self._executer(SQL_IGNORER, (list(post_urls), self.worker))
+
+    def prolonger(self) -> int:
+        return self._executer(SQL_PROLONGER, (self.bail_secondes, self.worker))
+
+    def etat(self) -> Counter:
+        return Counter(dict(self._executer(SQL_ETAT_FILE, retour=True)))
+
+    def en_attente_par_priorite(self) -> Counter:
+        return Counter(dict(self._executer(SQL_ETAT_FILE_PRIORITE, retour=True)))
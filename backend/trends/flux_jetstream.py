@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Ingestion par flux (Jetstream Bluesky) + correspondance multi-mots-clés
+────────────────────────────────────────────────────────────────────────────
+Utilisé par 02_POSTS_FLUX_JETSTREAM.py.
+
+ • AutomateMotsCles : automate d’Aho-Corasick construit une seule fois à
+   partir de liste_keywords.csv ; chaque post est comparé aux ~420
+   mots-clés en un seul parcours de son texte (coût proportionnel à la
+   longueur du texte, pas au nombre de mots-clés) ;
+ • evenements_jetstream : flux WebSocket Jetstream, avec reprise
+   automatique au dernier `time_us` reçu en cas de coupure ou de
+   poignée de main refusée ;
+ • evenements_replay : relit un flux enregistré (un événement JSON brut par
+   ligne) pour les tests et les benchmarks, sans réseau ;
+   les deux sources décodent chaque message une seule fois et produisent
+   des dicts ; les messages illisibles sont ignorés ;
+ • post_depuis_evenement : transforme un événement de création de post en
+   dict prêt pour le chemin d’insertion (même attribution categorie/keyword
+   que l’extraction par recherche).
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import json
+import asyncio
+from collections import deque
+
+JETSTREAM_URL = "wss://jetstream2.us-east.bsky.network/subscribe?wantedCollections=app.bsky.feed.post"
+COLLECTION_POST = "app.bsky.feed.post"
+
+
+# ==================================
+# === AUTOMATE D’AHO-CORASICK ===
+# ==================================
+def _est_mot(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+class AutomateMotsCles:
+    """
+    Automate d’Aho-Corasick insensible à la casse, limité aux mots entiers
+    (« art » ne correspond pas à « start »), comme la recherche Bluesky.
+    `keywords` : liste de tuples (categorie, keyword) dans l’ordre du CSV ;
+    en cas de correspondances multiples, le mot-clé le plus haut dans le CSV
+    l’emporte, ce qui rend l’attribution déterministe.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self._transitions = [{}]     # nœud → {caractère: nœud}
+        self._echec       = [0]      # lien d’échec de chaque nœud
+        self._sorties     = [[]]     # nœud → [(longueur, index_keyword)]
+
+        for idx, (_, keyword) in enumerate(self.keywords):
+            motif = str(keyword).strip().lower()
+            if not motif:
+                continue
+            noeud = 0
+            for c in motif:
+                suivant = self._transitions[noeud].get(c)
+                if suivant is None:
+                    suivant = len(self._transitions)
+                    self._transitions[noeud][c] = suivant
+                    self._transitions.append({})
+                    self._echec.append(0)
+                    self._sorties.append([])
+                noeud = suivant
+            self._sorties[noeud].append((len(motif), idx))
+
+        # Liens d’échec par parcours en largeur
+        file = deque(self._transitions[0].values())
+        while file:
+            noeud = file.popleft()
+            for c, suivant in self._transitions[noeud].items():
+                file.append(suivant)
+                f = self._echec[noeud]
+                while f and c not in self._transitions[f]:
+                    f = self._echec[f]
+                cible = self._transitions[f].get(c, 0)
+                self._echec[suivant] = cible if cible != suivant else 0
+                self._sorties[suivant] = self._sorties[suivant] + self._sorties[self._echec[suivant]]
+
+    def correspondances(self, texte: str):
+        """Itère sur les (index_keyword, début, fin) trouvés dans `texte` (mots entiers)."""
+        texte = texte.lower()
+        transitions, echec, sorties = self._transitions, self._echec, self._sorties
+        n, noeud = len(texte), 0
+        for i, c in enumerate(texte):
+            while noeud and c not in transitions[noeud]:
+                noeud = echec[noeud]
+            noeud = transitions[noeud].get(c, 0)
+            if not sorties[noeud]:
+                continue
+            fin = i + 1
+            if fin < n and _est_mot(texte[fin]):
+                continue
+            for longueur, idx in sorties[noeud]:
+                debut = fin - longueur
+                if debut == 0 or not _est_mot(texte[debut - 1]):
+                    yield idx, debut, fin
+
+    def premier_match(self, texte: str):
+        """(categorie, keyword) du mot-clé retenu pour ce texte, ou None."""
+        meilleur = None
+        for idx, _, _ in self.correspondances(texte):
+            if meilleur is None or idx < meilleur:
+                meilleur = idx
+                if idx == 0:
+                    break
+        return None if meilleur is None else self.keywords[meilleur]
+
+
+# =========================
+# === SOURCES D’ÉVÉNEMENTS ===
+# =========================
+async def evenements_jetstream(url: str = JETSTREAM_URL, cursor: int | None = None,
+                               enregistrement=None, delai_reconnexion: float = 2.0):
+    """
+    Générateur asynchrone des événements Jetstream décodés (dict).
+    Reconnexion automatique en reprenant au dernier `time_us` reçu.
+    `enregistrement` (fichier texte ouvert) : chaque message brut y est
+    recopié pour pouvoir être rejoué plus tard.
+    """
+    import websockets
+    from websockets.exceptions import WebSocketException
+
+    while True:
+        cible = url if cursor is None else f"{url}&cursor={cursor}"
+        try:
+            async with websockets.connect(cible, max_size=None) as ws:
+                async for message in ws:
+                    if enregistrement is not None:
+                        enregistrement.write(message.rstrip("\n") + "\n")
+                    try:
+                        evt = json.loads(message)
+                    except ValueError:
+                        continue
+                    cursor = evt.get("time_us", cursor)
+                    yield evt
+        # WebSocketException couvre les coupures (ConnectionClosed) et les
+        # poignées de main refusées (InvalidHandshake : 429, 502…)
+        except (OSError, asyncio.TimeoutError, WebSocketException) as e:
+            print(f"Flux Jetstream interrompu ({e}) → reconnexion dans {delai_reconnexion}s")
+            await asyncio.sleep(delai_reconnexion)
+
+
+async def evenements_replay(chemin: str, cadence: float | None = None):
+    """
+    Rejoue un flux enregistré (un message JSON par ligne), en dicts.
+    cadence = None : aussi vite que possible (benchmark) ;
+    cadence = x    : respecte les écarts de `time_us` d’origine, accélérés x fois.
+    """
+    precedent = None
+    with open(chemin, encoding="utf-8") as f:
+        for ligne in f:
+            ligne = ligne.strip()
+            if not ligne:
+                continue
+            try:
+                evt = json.loads(ligne)
+            except ValueError:
+                continue
+            if cadence:
+                t = evt.get("time_us")
+                if precedent is not None and t is not None and t > precedent:
+                    await asyncio.sleep((t - precedent) / 1e6 / cadence)
+                precedent = t if t is not None else precedent
+            yield evt
+
+
+# ==================================
+# === ÉVÉNEMENT → POST À INSÉRER ===
+# ==================================
+def post_depuis_evenement(evt: dict) -> dict | None:
+    """
+    Extrait d’un événement Jetstream les champs utiles d’une création de post,
+    ou None (suppression, like, autre collection…).
+    Jetstream ne transmet pas le handle : le DID en tient lieu jusqu’à
+    l’enrichissement du compte.
+    """
+    if evt.get("kind") != "commit":
+        return None
+    commit = evt.get("commit") or {}
+    if commit.get("operation") != "create" or commit.get("collection") != COLLECTION_POST:
+        return None
+    record = commit.get("record") or {}
+    did, rkey = evt.get("did"), commit.get("rkey")
+    if not did or not rkey:
+        return None
+    return {
+        "uri":        f"at://{did}/{COLLECTION_POST}/{rkey}",
+        "did":        did,
+        "rkey":       rkey,
+        "text":       (record.get("text") or "").replace("\n", " ").replace("\r", "").strip(),
+        "created_at": record.get("createdAt"),
+        "langs":      record.get("langs"),
+        "has_media":  record.get("embed") is not None,
+        "time_us":    evt.get("time_us"),
+    }
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Index compact des URLs déjà connues (remplace le préchargement `urls_connues`)
+────────────────────────────────────────────────────────────────────────────
+Au lieu de charger toutes les AT-URI de post_brut dans un `set` Python
+(~150 o par URL, plusieurs centaines de Mo à quelques millions de posts),
+on garde un tableau NumPy trié de hachages 64 bits (8 o par URL) :
+ • persisté sur disque (.npy) + un fichier .json avec le filigrane
+   `post_brut_date_scrapping` déjà couvert, chacun écrit dans un fichier
+   temporaire puis renommé (os.replace) ; un fichier illisible au
+   chargement déclenche une reconstruction complète ;
+ • mis à jour de façon incrémentale au démarrage (seules les lignes plus
+   récentes que le filigrane, ou sans date de scraping, sont relues, par
+   curseur serveur) ;
+ • interrogé par recherche dichotomique (np.searchsorted).
+
+Avec des hachages 64 bits, la probabilité d’une collision reste de l’ordre
+de 1e-6 à 10 M de posts : un faux positif fait seulement sauter un post, on
+se passe donc du contrôle en base sur chaque hit qu’imposerait un Bloom.
+Les URLs ajoutées pendant le run restent en mémoire et ne sont jamais
+persistées : seul ce qui est réellement en base alimente le fichier.
+
+Mesure avant/après (temps de démarrage + mémoire) :
+    python index_urls.py --env <chemin .env> --index <chemin .npy>
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from memoire_process import rss_mo
+
+# Marge relue à chaque démarrage pour couvrir les écarts d’horloge entre machines
+MARGE_FILIGRANE = timedelta(hours=1)
+TAILLE_CHUNK    = 50_000
+
+
+def hash_url(url: str) -> int:
+    """Hachage 64 bits stable d’une AT-URI."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _hashes_depuis_base(conn, depuis: datetime | None):
+    """
+    Lit par curseur serveur les URLs de post_brut (toutes, ou plus récentes
+    que `depuis`) et renvoie (hashes triés uniques, filigrane max rencontré).
+    Les lignes sans date de scraping n’ont pas de place par rapport au
+    filigrane : elles sont relues à chaque chargement.
+    """
+    sql = "SELECT post_brut_url, post_brut_date_scrapping FROM post_brut"
+    params = ()
+    if depuis is not None:
+        sql += " WHERE post_brut_date_scrapping > %s OR post_brut_date_scrapping IS NULL"
+        params = (depuis - MARGE_FILIGRANE,)
+
+    morceaux, filigrane = [], depuis
+    cur = conn.cursor(name="index_urls_connues")
+    cur.itersize = TAILLE_CHUNK
+    cur.execute(sql, params)
+    while True:
+        lignes = cur.fetchmany(TAILLE_CHUNK)
+        if not lignes:
+            break
+        morceaux.append(np.fromiter((hash_url(u) for u, _ in lignes), dtype=np.uint64, count=len(lignes)))
+        dates = [d for _, d in lignes if d is not None]
+        if dates:
+            filigrane = max(dates) if filigrane is None else max(filigrane, max(dates))
+    cur.close()
+    conn.commit()
+
+    if not morceaux:
+        return np.empty(0, dtype=np.uint64), filigrane
+    return np.unique(np.concatenate(morceaux)), filigrane
+
+
+class IndexUrlsConnues:
+    """
+    S’utilise comme l’ancien set :  `uri in index`, `index.add(uri)`.
+    Construction : IndexUrlsConnues.charger(conn, chemin)
+    """
+
+    def __init__(self, chemin: str, hashes: np.ndarray, filigrane: datetime | None):
+        self.chemin    = chemin
+        self.filigrane = filigrane
+        self._hashes   = hashes
+        self._ajouts   = set()   # URLs vues pendant le run (non persistées)
+
+    # ---------- chargement / persistance ----------
+    @classmethod
+    def charger(cls, conn, chemin: str) -> "IndexUrlsConnues":
+        hashes, filigrane = np.empty(0, dtype=np.uint64), None
+        meta = chemin + ".json"
+        if os.path.exists(chemin) and os.path.exists(meta):
+            try:
+                lus = np.load(chemin)
+                if lus.dtype != np.uint64 or lus.ndim != 1:
+                    raise ValueError(f"tableau inattendu ({lus.dtype}, {lus.ndim} dim.)")
+                with open(meta, encoding="utf-8") as f:
+                    valeur = json.load(f).get("filigrane")
+                hashes, filigrane = lus, datetime.fromisoformat(valeur) if valeur else None
+            except (OSError, ValueError, EOFError, AttributeError) as e:
+                print(f"⚠️  Index d'URLs illisible ({e}) → reconstruction complète")
+
+        # Reconstruction complète si pas de fichier, sinon simple delta
+        nouveaux, filigrane = _hashes_depuis_base(conn, filigrane)
+        if len(nouveaux):
+            hashes = np.union1d(hashes, nouveaux)
+
+        index = cls(chemin, hashes, filigrane)
+        index.sauvegarder()
+        return index
+
+    def sauvegarder(self):
+        """
+        .npy puis .json, chacun via un .tmp renommé : un arrêt en cours d'écriture
+        laisse l'ancien fichier intact, et un .json jamais plus récent que le
+        .npy (au pire un filigrane en retard, donc un delta plus large).
+        """
+        dossier = os.path.dirname(self.chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        # Écrit dans un fichier ouvert : np.save n'ajoute pas .npy au nom demandé
+        with open(self.chemin + ".tmp", "wb") as f:
+            np.save(f, self._hashes)
+        os.replace(self.chemin + ".tmp", self.chemin)
+        with open(self.chemin + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "filigrane": self.filigrane.isoformat() if self.filigrane else None,
+                "nb_urls": int(len(self._hashes)),
+            }, f)
+        os.replace(self.chemin + ".json.tmp", self.chemin + ".json")
+
+    # ---------- interface type set ----------
+    def __contains__(self, url: str) -> bool:
+        h = hash_url(url)
+        if h in self._ajouts:
+            return True
+        i = np.searchsorted(self._hashes, np.uint64(h))
+        return bool(i < len(self._hashes) and self._hashes[i] == h)
+
+    def add(self, url: str):
+        self._ajouts.add(hash_url(url))
+
+    def __len__(self):
+        return len(self._hashes) + len(self._ajouts)
+
+
+# =====================================
+# === MESURE : set Python vs index compact ===
+# =====================================
+def _mesurer(mode: str, env_path: str, chemin_index: str):
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv(env_path)
+    conn = psycopg2.connect(
+        dbname   = os.getenv("DB_NAME"),
+        user     = os.getenv("DB_USER"),
+        password = os.getenv("DB_PASSWORD"),
+        host     = os.getenv("DB_HOST"),
+        port     = os.getenv("DB_PORT")
+    )
+    rss0 = rss_mo()
+    t0 = time.perf_counter()
+    if mode == "set":
+        cur = conn.cursor()
+        cur.execute("SELECT post_brut_url FROM post_brut")
+        structure = set(row[0] for row in cur.fetchall())
+        cur.close()
+    else:
+        structure = IndexUrlsConnues.charger(conn, chemin_index)
+    duree = time.perf_counter() - t0
+    rss1 = rss_mo()
+    conn.close()
+    print(json.dumps({
+        "mode": mode, "nb_urls": len(structure), "duree_s": round(duree, 3),
+        "rss_avant_mo": rss0, "rss_apres_mo": rss1,
+    }))
+
+
+if __name__ == "__main__":
+    import argparse
+    import subprocess
+
+    parser = argparse.ArgumentParser(description="Mesure démarrage/mémoire : set Python vs index compact")
+    parser.add_argument("--env", required=True, help="Fichier .env avec les variables DB_*")
+    parser.add_argument("--index", required=True, help="Chemin du fichier .npy de l’index")
+    parser.add_argument("--mode", choices=["set", "index"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        _mesurer(args.mode, args.env, args.index)
+    else:
+        # Un processus par mesure pour que le RSS de l’une ne pollue pas l’autre ;
+        # "index" est lancé deux fois : construction à froid puis chargement incrémental
+        for mode in ("set", "index", "index"):
+            subprocess.run([sys.executable, __file__, "--env", args.env,
+                            "--index", args.index, "--mode", mode], check=True)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Inférence par lots, triée par longueur (utilisée par 05_POSTS_ANALYSE.py)
+────────────────────────────────────────────────────────────────────────────
+Le pipeline transformers appelé texte par texte travaille en lot de 1 :
+surcoût Python à chaque appel et unités vectorielles du CPU sous-employées.
+Ici :
+ • tous les textes sont tokenisés d’un coup (tronqués à la longueur max du
+   modèle), sans padding ;
+ • ils sont triés par nombre de tokens puis découpés en mini-lots de
+   `taille_lot` : chaque lot est paddé à sa plus longue séquence, et des
+   textes de longueur voisine se retrouvent ensemble (peu de padding perdu) ;
+ • les scores sont calculés directement sur les logits — softmax pour un
+   modèle mono-label, sigmoïde pour un modèle multi-label ou à une sortie,
+   comme le pipeline « text-classification » par défaut ;
+ • les résultats sont remis dans l’ordre d’origine.
+
+Benchmark de débit (CPU, posts/s) — pipeline texte par texte contre lots
+de différentes tailles, avec et sans tri par longueur :
+    python inference_lots.py --modele <dossier_du_modele> --textes posts.txt --tailles 1,8,16,32,64
+(sans --textes : textes synthétiques de longueurs variées)
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+import random
+import argparse
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+
+from artefacts_modeles import options_chargement
+
+TAILLE_LOT_INFERENCE = 32
+LONGUEUR_MAX_TOKENS  = 512
+
+
+def longueur_max_tokens(tokenizer) -> int:
+    """Longueur de troncature : celle du tokenizer, plafonnée à LONGUEUR_MAX_TOKENS."""
+    return min(tokenizer.model_max_length or LONGUEUR_MAX_TOKENS, LONGUEUR_MAX_TOKENS)
+
+
+def tokeniser_textes(tokenizer, textes: list[str], longueur_max: int) -> list[list[int]]:
+    """input_ids de chaque texte, tronqués, sans padding."""
+    return tokenizer(list(textes), truncation=True, max_length=longueur_max, padding=False)["input_ids"]
+
+
+def device_torch(device) -> torch.device:
+    """Convention des pipelines (0 = GPU, -1 = CPU) → torch.device."""
+    if isinstance(device, int):
+        return torch.device(f"cuda:{device}" if device >= 0 else "cpu")
+    return torch.device(device)
+
+
+class ModeleClassification:
+    """
+    modele = ModeleClassification.charger(chemin, DEVICE)
+    scores = modele.predire_lot(textes)      # [{label: score}, ...] dans l’ordre des textes
+    """
+
+    backend = "torch"
+
+    def __init__(self, tokenizer, model, device=-1, activation: str | None = None):
+        self.device = device_torch(device)
+        self.model  = model.to(self.device).eval()
+        self._configurer(tokenizer, model.config, activation)
+
+    def _configurer(self, tokenizer, config, activation: str | None):
+        """Labels, activation et longueur max, communs à tous les backends."""
+        self.tokenizer = tokenizer
+        self.labels = [config.id2label[i].lower() for i in range(config.num_labels)]
+        # activation : "softmax" / "sigmoid" imposés (function_to_apply), sinon déduite de la config
+        self.multi_label = (activation == "sigmoid" if activation else
+                            config.problem_type == "multi_label_classification" or config.num_labels == 1)
+        self.longueur_max = longueur_max_tokens(tokenizer)
+        self.pad_id = tokenizer.pad_token_id or 0
+
+    @classmethod
+    def charger(cls, chemin: str, device=-1, activation: str | None = None) -> "ModeleClassification":
+        tokenizer = AutoTokenizer.from_pretrained(chemin, local_files_only=True)
+        model     = AutoModelForSequenceClassification.from_pretrained(chemin, local_files_only=True,
+                                                                       **options_chargement(chemin))
+        return cls(tokenizer, model, device, activation)
+
+    def tokeniser(self, textes: list[str]) -> list[list[int]]:
+        """input_ids de chaque texte, tronqués, sans padding."""
+        return tokeniser_textes(self.tokenizer, textes, self.longueur_max)
+
+    def _lot_tenseurs(self, ids_lot: list[list[int]]) -> dict:
+        """Padding à droite du lot à sa plus longue séquence."""
+        longueur = max(len(ids) for ids in ids_lot)
+        input_ids = torch.full((len(ids_lot), longueur), self.pad_id, dtype=torch.long)
+        attention = torch.zeros((len(ids_lot), longueur), dtype=torch.long)
+        for i, ids in enumerate(ids_lot):
+            input_ids[i, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention[i, :len(ids)] = 1
+        return {"input_ids": input_ids, "attention_mask": attention}
+
+    def _logits(self, ids_lot: list[list[int]]) -> torch.Tensor:
+        """Passe avant d’un mini-lot (surchargée par les autres backends)."""
+        tenseurs = {k: v.to(self.device) for k, v in self._lot_tenseurs(ids_lot).items()}
+        return self.model(**tenseurs).logits
+
+    def scores_depuis_logits(self, logits: torch.Tensor) -> torch.Tensor:
+        logits = logits.float()
+        return torch.sigmoid(logits) if self.multi_label else torch.softmax(logits, dim=-1)
+
+    def predire_ids(self, ids: list[list[int]], taille_lot: int = TAILLE_LOT_INFERENCE,
+                    trier: bool = True) -> list[dict]:
+        """Inférence sur des textes déjà tokenisés ; [{label: score}] dans l’ordre d’entrée."""
+        ordre = sorted(range(len(ids)), key=lambda i: len(ids[i])) if trier else list(range(len(ids)))
+        resultats = [None] * len(ids)
+        with torch.inference_mode():
+            for debut in range(0, len(ordre), taille_lot):
+                indices = ordre[debut:debut + taille_lot]
+                logits  = self._logits([ids[i] for i in indices])
+                for i, ligne in zip(indices, self.scores_depuis_logits(logits).cpu().tolist()):
+                    resultats[i] = dict(zip(self.labels, ligne))
+        return resultats
+
+    def predire_lot(self, textes: list[str], taille_lot: int = TAILLE_LOT_INFERENCE,
+                    trier: bool = True) -> list[dict]:
+        if not textes:
+            return []
+        return self.predire_ids(self.tokeniser(textes), taille_lot, trier)
+
+    def analyser(self, texte: str, label_mapping: dict | None = None):
+        """Même interface que analyse_post : (label_prédominant, score, scores_dict, durée)."""
+        t0 = time.time()
+        pred, score, scores_dict = resultat_depuis_scores(self.predire_lot([texte])[0], label_mapping)
+        return pred, score, scores_dict, round(time.time() - t0, 3)
+
+
+def resultat_depuis_scores(scores: dict, label_mapping: dict | None = None):
+    """
+    {label: score} → (label_prédominant, score_prédominant, scores_dict), avec
+    la même règle que analyse_post : labels remappés, score max par label.
+    """
+    scores_dict = {}
+    for lbl, score in scores.items():
+        if label_mapping:
+            lbl = label_mapping.get(lbl, lbl)
+        scores_dict[lbl] = max(scores_dict.get(lbl, 0.0), float(score))
+    pred = max(scores_dict, key=scores_dict.get)
+    return pred, scores_dict[pred], scores_dict
+
+
+# ==============================
+# === BENCHMARK DE DÉBIT CPU ===
+# ==============================
+def textes_synthetiques(n: int, graine: int = 0) -> list[str]:
+    """Textes de 3 à 60 mots (distribution proche de celle des posts)."""
+    rnd = random.Random(graine)
+    mots = ("the new policy looks great but people are angry about prices again today "
+            "i love this song so much what a game last night can not believe it happened").split()
+    return [" ".join(rnd.choice(mots) for _ in range(int(rnd.triangular(3, 60, 12)))) for _ in range(n)]
+
+
+def bench_debit(chemin: str, textes: list[str], tailles=(1, 8, 16, 32, 64), device=-1) -> list[dict]:
+    """Posts/s du pipeline texte par texte puis des lots (triés ou non) ; tokenisation incluse."""
+    modele = ModeleClassification.charger(chemin, device)
+    mesures = []
+
+    def mesurer(nom, taille, fonction):
+        fonction(textes[:min(8, len(textes))])           # échauffement
+        t0 = time.perf_counter()
+        fonction(textes)
+        duree = time.perf_counter() - t0
+        mesures.append({"methode": nom, "taille_lot": taille, "duree_s": round(duree, 3),
+                        "posts_par_s": round(len(textes) / duree, 1)})
+        print(f"  {nom:<18} lot {taille:>3} : {duree:7.2f}s | {len(textes) / duree:8.1f} posts/s")
+
+    pipe = pipeline("text-classification", model=modele.model, tokenizer=modele.tokenizer,
+                    device=device, top_k=None)
+    mesurer("pipeline", 1, lambda lot: [pipe(t, top_k=None, truncation=True) for t in lot])
+    for taille in tailles:
+        mesurer("lots", taille, lambda lot, t=taille: modele.predire_lot(lot, t, trier=False))
+        mesurer("lots_tries", taille, lambda lot, t=taille: modele.predire_lot(lot, t, trier=True))
+
+    base = mesures[0]["posts_par_s"]
+    meilleur = max(mesures, key=lambda m: m["posts_par_s"])
+    print(f"→ meilleur : {meilleur['methode']} lot {meilleur['taille_lot']} "
+          f"(x{meilleur['posts_par_s'] / base:.1f} vs pipeline texte par texte)")
+    return mesures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modele", required=True, help="Dossier local du modèle")
+    parser.add_argument("--textes", help="Fichier texte, un post nettoyé par ligne")
+    parser.add_argument("--n", type=int, default=512, help="Nb de textes mesurés")
+    parser.add_argument("--tailles", default="1,8,16,32,64")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.textes:
+        with open(args.textes, encoding="utf-8") as f:
+            textes = [ligne.strip() for ligne in f if ligne.strip()][:args.n]
+    else:
+        textes = textes_synthetiques(args.n)
+    print(f"📊 {len(textes)} textes | {torch.get_num_threads()} threads torch | {args.modele}")
+    bench_debit(args.modele, textes, tuple(int(t) for t in args.tailles.split(",")))
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Backend ONNX Runtime (fp32 ou int8 dynamique) pour les modèles d’analyse
+────────────────────────────────────────────────────────────────────────────
+Les six modèles tournent en PyTorch fp32 « eager » sur CPU. Ce module :
+ • exporte un modèle local en ONNX (axes lot / séquence dynamiques), avec
+   tokenizer et config dans le même dossier : <dossier_modele>_onnx/ ;
+ • applique en option la quantification dynamique int8 des poids
+   (onnxruntime.quantization) → model.int8.onnx ;
+ • sert le modèle via ONNX Runtime derrière la même interface que
+   ModeleClassification (predire_lot, analyser) : tokenisation, tri par
+   longueur, mini-lots et softmax / sigmoïde restent ceux d’inference_lots.
+
+charger_modele(chemin, device, backend) choisit le backend :
+"torch" (défaut), "onnx" ou "onnx_int8" ; l’export est fait au premier
+chargement s’il n’existe pas encore.
+
+onnxruntime (et onnx, pour l’export) sont optionnels : seul le backend
+"torch" fonctionne sans eux.
+
+Harnais de parité — accord des labels prédominants et écarts de scores par
+rapport à PyTorch, latence p50/p95 d’un post seul et débit par lots :
+    python inference_onnx.py --modele <dossier_du_modele> --textes posts_test.txt --n 1000
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoConfig, AutoModelForSequenceClassification
+
+from artefacts_modeles import options_chargement
+from inference_lots import (
+    ModeleClassification, TAILLE_LOT_INFERENCE, resultat_depuis_scores, textes_synthetiques
+)
+
+BACKENDS      = ("torch", "onnx", "onnx_int8")
+FICHIER_ONNX  = "model.onnx"
+FICHIER_INT8  = "model.int8.onnx"
+OPSET_ONNX    = 17
+
+
+def _onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError:
+        raise ImportError("Backend ONNX indisponible : pip install onnxruntime onnx") from None
+    return onnxruntime
+
+
+def dossier_onnx(chemin: str) -> str:
+    return os.path.normpath(chemin) + "_onnx"
+
+
+# ==============
+# === EXPORT ===
+# ==============
+def exporter_onnx(chemin: str, dossier: str | None = None, quantifier: bool = True) -> str:
+    """
+    Exporte le modèle de `chemin` en ONNX dans `dossier` (+ tokenizer et config),
+    puis, si `quantifier`, sa version int8 dynamique. Retourne le dossier.
+    """
+    dossier = dossier or dossier_onnx(chemin)
+    os.makedirs(dossier, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(chemin, local_files_only=True)
+    model     = AutoModelForSequenceClassification.from_pretrained(chemin, local_files_only=True,
+                                                                   **options_chargement(chemin)).eval()
+
+    exemple = tokenizer(["exemple de texte pour l'export", "un second exemple"], padding="max_length",
+                        max_length=16, truncation=True, return_tensors="pt")
+    axes = {0: "lot", 1: "sequence"}
+    torch.onnx.export(
+        model,
+        (exemple["input_ids"], exemple["attention_mask"]),
+        os.path.join(dossier, FICHIER_ONNX),
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={"input_ids": axes, "attention_mask": axes, "logits": {0: "lot"}},
+        opset_version=OPSET_ONNX,
+        dynamo=False,     # exporteur TorchScript : graphe compatible avec quantize_dynamic
+    )
+    tokenizer.save_pretrained(dossier)
+    model.config.save_pretrained(dossier)
+
+    if quantifier:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(os.path.join(dossier, FICHIER_ONNX), os.path.join(dossier, FICHIER_INT8),
+                         weight_type=QuantType.QInt8)
+    return dossier
+
+
+# ===================================
+# === MODÈLE SERVI PAR ONNXRUNTIME ===
+# ===================================
+class ModeleOnnx(ModeleClassification):
+    """ModeleClassification dont la passe avant est une session ONNX Runtime (CPU)."""
+
+    def __init__(self, dossier: str, int8: bool = False, activation: str | None = None,
+                 nb_threads: int | None = None):
+        ort = _onnxruntime()
+        options = ort.SessionOptions()
+        # Budget de threads : celui de torch dans ce process (voir execution_modeles.py)
+        options.intra_op_num_threads = nb_threads or torch.get_num_threads()
+        options.inter_op_num_threads = 1
+        self.session  = ort.InferenceSession(os.path.join(dossier, FICHIER_INT8 if int8 else FICHIER_ONNX),
+                                             options, providers=["CPUExecutionProvider"])
+        self._entrees = {e.name for e in self.session.get_inputs()}
+        self.backend  = "onnx_int8" if int8 else "onnx"
+        self.device   = torch.device("cpu")
+        self._configurer(AutoTokenizer.from_pretrained(dossier, local_files_only=True),
+                         AutoConfig.from_pretrained(dossier, local_files_only=True), activation)
+
+    def _logits(self, ids_lot: list[list[int]]) -> torch.Tensor:
+        tenseurs = self._lot_tenseurs(ids_lot)
+        entrees = {nom: t.numpy() for nom, t in tenseurs.items() if nom in self._entrees}
+        if "token_type_ids" in self._entrees:
+            entrees["token_type_ids"] = np.zeros_like(entrees["input_ids"])
+        return torch.from_numpy(self.session.run(["logits"], entrees)[0])
+
+
+def charger_modele(chemin: str, device=-1, backend: str = "torch",
+                   activation: str | None = None) -> ModeleClassification:
+    """Modèle de `chemin` servi par `backend` (export ONNX au premier chargement)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend d’inférence inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
+    if backend == "torch":
+        return ModeleClassification.charger(chemin, device, activation)
+
+    int8 = backend == "onnx_int8"
+    dossier = dossier_onnx(chemin)
+    if not os.path.exists(os.path.join(dossier, FICHIER_INT8 if int8 else FICHIER_ONNX)):
+        print(f"🛠️  Export ONNX{' + int8' if int8 else ''} de {os.path.basename(chemin)} → {dossier}")
+        exporter_onnx(chemin, dossier, quantifier=int8)
+    return ModeleOnnx(dossier, int8, activation)
+
+
+# =========================
+# === HARNAIS DE PARITÉ ===
+# =========================
+def comparer_backends(chemin: str, textes: list[str], backends=BACKENDS,
+                      taille_lot: int = TAILLE_LOT_INFERENCE, nb_latence: int = 100) -> list[dict]:
+    """
+    Pour chaque backend : débit par lots, latence d’un post seul (p50 / p95), et,
+    par rapport à PyTorch, accord des labels prédominants et écarts de scores.
+    """
+    # PyTorch d'abord : c'est la référence des écarts
+    backends = ["torch"] + [b for b in backends if b != "torch"]
+    reference = None
+    mesures = []
+    for backend in backends:
+        modele = charger_modele(chemin, backend=backend)
+        modele.predire_lot(textes[:taille_lot], taille_lot)      # échauffement
+
+        t0 = time.perf_counter()
+        scores = modele.predire_lot(textes, taille_lot)
+        duree = time.perf_counter() - t0
+
+        latences = []
+        for texte in textes[:nb_latence]:
+            t1 = time.perf_counter()
+            modele.analyser(texte)
+            latences.append((time.perf_counter() - t1) * 1000)
+
+        mesure = {
+            "backend": backend,
+            "posts_par_s": round(len(textes) / duree, 1),
+            "latence_p50_ms": round(float(np.percentile(latences, 50)), 2),
+            "latence_p95_ms": round(float(np.percentile(latences, 95)), 2),
+        }
+        if backend == "torch":
+            reference = scores
+        else:
+            accords = [resultat_depuis_scores(s)[0] == resultat_depuis_scores(r)[0]
+                       for s, r in zip(scores, reference)]
+            ecarts = np.array([abs(s[lbl] - r[lbl]) for s, r in zip(scores, reference) for lbl in r])
+            mesure.update(accord_labels=round(sum(accords) / len(accords), 4),
+                          ecart_score_moyen=float(ecarts.mean()), ecart_score_max=float(ecarts.max()))
+        mesures.append(mesure)
+
+        print(f"  {backend:<10} {mesure['posts_par_s']:>8} posts/s | post seul p50 {mesure['latence_p50_ms']} ms"
+              f" p95 {mesure['latence_p95_ms']} ms"
+              + (f" | accord {mesure['accord_labels']:.2%} | écart moyen {mesure['ecart_score_moyen']:.2e}"
+                 f" max {mesure['ecart_score_max']:.2e}" if "accord_labels" in mesure else ""))
+    return mesures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modele", required=True, help="Dossier local du modèle (PyTorch)")
+    parser.add_argument("--textes", help="Échantillon de test : un post nettoyé par ligne")
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--taille_lot", type=int, default=TAILLE_LOT_INFERENCE)
+    parser.add_argument("--reexporter", action="store_true", help="Refait l’export ONNX / int8")
+    parser.add_argument("--sortie", help="Écrit les mesures JSON dans ce fichier")
+    args = parser.parse_args()
+
+    if args.reexporter:
+        exporter_onnx(args.modele, quantifier=True)
+    if args.textes:
+        with open(args.textes, encoding="utf-8") as f:
+            textes = [ligne.strip() for ligne in f if ligne.strip()][:args.n]
+    else:
+        textes = textes_synthetiques(args.n)
+
+    print(f"📊 Parité sur {len(textes)} textes | {torch.get_num_threads()} threads | {args.modele}")
+    mesures = comparer_backends(args.modele, textes, tuple(args.backends.split(",")), args.taille_lot)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(mesures, f, indent=2)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Mémoire du processus courant (mesures des benchs et du serveur de modèles)
+────────────────────────────────────────────────────────────────────────────
+Bibliothèque standard seulement (psutil si installé) : importer ce module ne
+charge ni NumPy ni torch, et ne fausse donc pas la RSS qu’il mesure.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+
+
+def rss_mo() -> float | None:
+    """RSS courant du processus en Mo (psutil si disponible, sinon /proc)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def pic_rss_mo() -> float | None:
+    """Pic de RSS du process en Mo (resource sous Unix, psutil sinon)."""
+    try:
+        import resource
+        pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pic / 2**20 if sys.platform == "darwin" else pic / 2**10
+    except ImportError:
+        pass
+    try:
+        import psutil
+        infos = psutil.Process().memory_info()
+        return getattr(infos, "peak_wset", infos.rss) / 2**20
+    except ImportError:
+        return None
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de nettoyage des posts (utilisé par 04_POSTS_NETTOYAGE.py)
+────────────────────────────────────────────────────────────────────────────
+ • les posts à nettoyer sont lus par un curseur serveur nommé, par paquets
+   de `taille_chunk` : la mémoire reste constante, quel que soit l’arriéré ;
+ • chaque paquet part dans un pool de processus (nettoyage regex + détection
+   de langue, limités par le CPU et par le GIL en mono-process) ;
+ • au plus `2 × nb_process` paquets sont en vol : la lecture ne prend pas
+   d’avance sur le calcul ;
+ • les résultats sont écrits par COPY → table temporaire → INSERT … SELECT
+   ON CONFLICT DO NOTHING (voir bulk_ingest.py), un commit par paquet.
+
+Langue du post, du moins cher au plus cher :
+ 1) langues déclarées par l’auteur (post_brut_langs, capturées à l’extraction) ;
+ 2) écriture du texte : un script propre à une seule langue (kana, hangul,
+    grec, hébreu, thaï…) suffit ; un texte sans lettre vaut « und » ;
+ 3) langdetect, avec graine fixe (résultat reproductible d’un run à l’autre)
+    et cache par empreinte du texte (reposts, textes identiques).
+
+Lecture et écriture utilisent deux connexions distinctes : un commit sur la
+connexion d’écriture ne ferme pas le curseur serveur.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import time
+import hashlib
+import unicodedata
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from tqdm import tqdm
+from langdetect import detect, DetectorFactory
+
+from bulk_ingest import copier_fusionner, assurer_colonne_langs
+from dedup_contenu import empreinte_contenu, assurer_colonne_hash, nettoyer_texte
+
+# langdetect est probabiliste : sans graine, un même texte peut changer de langue
+DetectorFactory.seed = 0
+
+TAILLE_CHUNK_NETTOYAGE = 2000
+
+SQL_COUNT_POSTS_A_NETTOYER = """
+SELECT COUNT(*)
+FROM post_brut pb
+LEFT JOIN post_clean pc ON pb.post_brut_url = pc.post_url
+WHERE pc.post_url IS NULL
+  AND pb.post_brut_contenu IS NOT NULL;
+"""
+
+SQL_SELECT_POSTS_A_NETTOYER = """
+SELECT pb.post_brut_url, pb.post_brut_contenu, pb.post_brut_langs
+FROM post_brut pb
+LEFT JOIN post_clean pc ON pb.post_brut_url = pc.post_url
+WHERE pc.post_url IS NULL
+  AND pb.post_brut_contenu IS NOT NULL;
+"""
+
+COLONNES_POST_CLEAN = [
+    "post_url",
+    "post_clean_contenu",
+    "post_clean_langue",
+    "post_clean_poids",
+    "post_clean_date_nettoyage",
+    "post_clean_duree_nettoyage",
+    "post_clean_hash",
+]
+
+
+# === Détection de la langue ===
+def detecter_langue(texte):
+    try:
+        return detect(texte)
+    except Exception:
+        return "und"
+
+
+# Préfixe du nom Unicode d’une lettre → langue (scripts propres à une seule langue
+# parmi celles que reconnaît langdetect). Le chinois se reconnaît aux idéogrammes
+# sans kana, le japonais aux kana.
+SCRIPTS_UNIVOQUES = {
+    "HIRAGANA": "ja", "KATAKANA": "ja", "HANGUL": "ko", "GREEK": "el",
+    "HEBREW": "he", "THAI": "th", "BENGALI": "bn", "GUJARATI": "gu",
+    "GURMUKHI": "pa", "TAMIL": "ta", "TELUGU": "te", "KANNADA": "kn",
+    "MALAYALAM": "ml",
+}
+PART_SCRIPT_MIN = 0.5        # part des lettres dans le script pour conclure
+TAILLE_CACHE_LANGUE = 200_000
+
+
+def langue_declaree(langs: str | None) -> str | None:
+    """Première langue déclarée ("en-us,fr" → "en"), aux codes langdetect (zh-cn / zh-tw)."""
+    if not langs:
+        return None
+    code = langs.split(",")[0].strip().lower()
+    if code.startswith("zh"):
+        return "zh-tw" if code in ("zh-tw", "zh-hk", "zh-hant") else "zh-cn"
+    return code.split("-")[0] or None
+
+
+def langue_par_script(texte: str) -> str | None:
+    """
+    Préfiltre par écriture : "und" si aucune lettre, la langue si le texte est
+    majoritairement dans un script univoque, None s’il faut le détecteur.
+    """
+    scripts, nb_lettres, ascii_seul = Counter(), 0, True
+    for c in texte:
+        if not c.isalpha():
+            continue
+        nb_lettres += 1
+        if c.isascii():
+            continue
+        ascii_seul = False
+        nom = unicodedata.name(c, "")
+        if nom.startswith("CJK UNIFIED"):
+            scripts["HAN"] += 1
+        else:
+            scripts[nom.split(" ", 1)[0]] += 1
+    if nb_lettres == 0:
+        return "und"
+    if ascii_seul:
+        return None
+    if scripts["HIRAGANA"] + scripts["KATAKANA"] and \
+            (scripts["HIRAGANA"] + scripts["KATAKANA"] + scripts["HAN"]) >= PART_SCRIPT_MIN * nb_lettres:
+        return "ja"
+    if scripts["HAN"] >= PART_SCRIPT_MIN * nb_lettres:
+        return "zh-cn"
+    script, n = scripts.most_common(1)[0]
+    if script in SCRIPTS_UNIVOQUES and n >= PART_SCRIPT_MIN * nb_lettres:
+        return SCRIPTS_UNIVOQUES[script]
+    return None
+
+
+_cache_langue = {}
+
+
+def detecter_langue_cache(texte: str) -> tuple[str, bool]:
+    """langdetect avec cache par empreinte du texte ; retourne (langue, trouvée_en_cache)."""
+    cle = hashlib.blake2b(texte.encode("utf-8"), digest_size=8).digest()
+    langue = _cache_langue.get(cle)
+    if langue is not None:
+        return langue, True
+    if len(_cache_langue) >= TAILLE_CACHE_LANGUE:
+        _cache_langue.clear()
+    langue = _cache_langue[cle] = detecter_langue(texte)
+    return langue, False
+
+
+def choisir_langue(clean: str, langs: str | None) -> tuple[str, str]:
+    """(langue, source) ; source ∈ declaree / script / cache / detecteur."""
+    langue = langue_declaree(langs)
+    if langue:
+        return langue, "declaree"
+    langue = langue_par_script(clean)
+    if langue:
+        return langue, "script"
+    langue, en_cache = detecter_langue_cache(clean)
+    return langue, "cache" if en_cache else "detecteur"
+
+
+def traiter_chunk(lignes: list) -> tuple[list, Counter]:
+    """
+    Exécuté dans un processus du pool : [(url, contenu, langs)] → (lignes
+    COLONNES_POST_CLEAN, nb de posts par source de la langue).
+    """
+    resultats, sources = [], Counter()
+    for url, brut, langs in lignes:
+        start  = time.time()
+        clean  = nettoyer_texte(brut)
+        langue, source = choisir_langue(clean, langs)
+        poids  = len(clean.split())
+        duree  = round(time.time() - start, 3)
+        resultats.append((url, clean, langue, poids, datetime.utcnow(), duree, empreinte_contenu(clean)))
+        sources[source] += 1
+    return resultats, sources
+
+
+def nettoyer_posts(conn_lecture, conn_ecriture, taille_chunk: int = TAILLE_CHUNK_NETTOYAGE,
+                   nb_process: int | None = None) -> dict:
+    """
+    Nettoie tous les posts de post_brut absents de post_clean.
+    nb_process = 1 : tout dans le process courant (débogage).
+    Retourne un dict de stats : lus, inseres, chunks, sources (langue), duree, posts_par_s.
+    """
+    nb_process = nb_process or os.cpu_count() or 1
+    t0 = time.time()
+    assurer_colonne_langs(conn_ecriture)
+    assurer_colonne_hash(conn_ecriture)
+
+    with conn_lecture.cursor() as cur:
+        cur.execute(SQL_COUNT_POSTS_A_NETTOYER)
+        total = cur.fetchone()[0]
+    print(f"🚀 {total} posts à nettoyer ({nb_process} process, paquets de {taille_chunk}).")
+
+    stats = {"lus": 0, "inseres": 0, "chunks": 0, "sources": Counter()}
+    cur_ecriture = conn_ecriture.cursor()
+
+    def ecrire(chunk_traite):
+        resultats, sources = chunk_traite
+        stats["sources"].update(sources)
+        stats["inseres"] += copier_fusionner(cur_ecriture, "post_clean", COLONNES_POST_CLEAN,
+                                             resultats, "post_url")
+        conn_ecriture.commit()
+        stats["chunks"] += 1
+        pbar.update(len(resultats))
+
+    # Curseur serveur nommé : les lignes arrivent par paquets de `itersize`
+    cur_lecture = conn_lecture.cursor(name="posts_a_nettoyer")
+    cur_lecture.itersize = taille_chunk
+    cur_lecture.execute(SQL_SELECT_POSTS_A_NETTOYER)
+
+    pool = ProcessPoolExecutor(max_workers=nb_process) if nb_process > 1 else None
+    en_vol = deque()
+    try:
+        with tqdm(total=total, desc="Nettoyage") as pbar:
+            while True:
+                lignes = cur_lecture.fetchmany(taille_chunk)
+                if not lignes:
+                    break
+                stats["lus"] += len(lignes)
+                if pool is None:
+                    ecrire(traiter_chunk(lignes))
+                    continue
+                en_vol.append(pool.submit(traiter_chunk, lignes))
+                # Contre-pression : on écrit le plus ancien paquet avant d’en lire d’autres
+                if len(en_vol) >= 2 * nb_process:
+                    ecrire(en_vol.popleft().result())
+            while en_vol:
+                ecrire(en_vol.popleft().result())
+    except Exception:
+        conn_ecriture.rollback()
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        cur_lecture.close()
+        conn_lecture.commit()
+        cur_ecriture.close()
+
+    duree = time.time() - t0
+    stats.update(duree=round(duree, 1), posts_par_s=round(stats["lus"] / duree, 1) if duree else None)
+    return stats
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline producteur/consommateur pour l’extraction (EXTRACTION_MODE = "pipeline")
+────────────────────────────────────────────────────────────────────────────
+La boucle historique est strictement séquentielle : recherche, parsing,
+insertion, commit, puis arrêt complet tous les ENRICH_INTERVAL posts pour
+enrichir les comptes. Ici chaque étape tourne dans ses propres threads,
+reliés par des files bornées :
+
+    q_jobs ──► [fetchers × N] ──► q_bruts ──► [transformation] ──► q_lignes ──► [writer BDD]
+                                                                                   │
+                                                   [enrichissement] ◄── signal ────┘
+
+ • fetchers       : paginent search_posts (seau à jetons partagé, retry 429) ;
+ • transformation : dédoublonnage (index des URLs), filtre de fraîcheur,
+                    construction des lignes, statistiques du planificateur ;
+ • writer         : BulkWriter sur sa propre connexion, lot plein ou délai écoulé ;
+ • enrichissement : enrichir_comptes sur sa propre connexion, déclenché tous
+                    les `enrich_intervalle` posts insérés, sans bloquer le reste.
+
+Les files étant bornées, une étape lente (BDD, API profils) fait patienter
+les étapes en amont au lieu de laisser la mémoire grossir : le débit se
+dégrade progressivement, sans bloquer tout le run.
+La transformation cesse de mettre des posts en file dès que la cible est
+couverte ; les lignes déjà en file sont écrites avant l’arrêt.
+
+Une exception dans une étape (connexion BDD, construction d’une ligne,
+enrichissement) est conservée sur le pipeline : l’étape continue de
+consommer sa file sans la traiter (l’amont ne bloque jamais sur une file
+pleine), le tour s’interrompt et executer_tour / arreter relèvent l’erreur
+dans le thread principal.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+import queue
+import threading
+
+from bulk_ingest import BulkWriter, resume_lot, lignes_depuis_post
+from enrichissement_comptes import enrichir_comptes
+from client_bluesky import est_rate_limit
+from extraction_async import ErreurRecherche
+from telemetrie import metriques
+
+
+# ========================================
+# === SEAU À JETONS PARTAGÉ ENTRE THREADS ===
+# ========================================
+class TokenBucketThread:
+    """Équivalent threading de extraction_async.TokenBucket."""
+
+    def __init__(self, debit: float, capacite: int):
+        self.debit    = float(debit)
+        self.capacite = float(capacite)
+        self._jetons  = float(capacite)
+        self._dernier = time.monotonic()
+        self._verrou  = threading.Lock()
+
+    def acquerir(self):
+        with self._verrou:
+            while True:
+                maintenant = time.monotonic()
+                self._jetons = min(self.capacite, self._jetons + (maintenant - self._dernier) * self.debit)
+                self._dernier = maintenant
+                if self._jetons >= 1:
+                    self._jetons -= 1
+                    return
+                time.sleep((1 - self._jetons) / self.debit)
+
+
+def rechercher_keyword_sync(client, limiteur: TokenBucketThread, keyword: str, limite: int,
+                            max_tentatives: int = 3, backoff: float = 2.0):
+    """Pagination search_posts bloquante ; retourne (posts, nb_appels), ErreurRecherche en cas d'échec."""
+    posts, cursor_token, appels = [], None, 0
+    while len(posts) < limite:
+        for tentative in range(max_tentatives):
+            limiteur.acquerir()
+            appels += 1
+            try:
+                result = client.app.bsky.feed.search_posts(params={"q": keyword, "cursor": cursor_token})
+                break
+            except Exception as e:
+                if not est_rate_limit(e) or tentative == max_tentatives - 1:
+                    raise ErreurRecherche(keyword, appels) from e
+                metriques.compter_retry("search_posts")
+                time.sleep(backoff * 2 ** tentative)
+
+        if not result.posts:
+            break
+        posts.extend(result.posts)
+        cursor_token = result.cursor
+        if cursor_token is None:
+            break
+    return posts[:limite], appels
+
+
+# ==================
+# === LE PIPELINE ===
+# ==================
+class PipelineExtraction:
+    """
+    pipe = PipelineExtraction(client, get_connexion, urls_connues, cible=TARGET_NEW_POSTS, ...)
+    pipe.demarrer()
+    while not pipe.termine:
+        pipe.executer_tour(plan, seuil_date)     # bloque jusqu’à la fin des recherches du tour
+    pipe.arreter()                               # vide les files et écrit le dernier lot
+    """
+
+    def __init__(self, client, get_connexion, urls_connues, cible: int,
+                 nb_fetchers: int = 4, taille_file: int = 500, taille_lot: int = 200,
+                 delai_flush: float = 2.0, enrich_intervalle: int = 100,
+                 debit: float = 8.0, capacite: int = 10, planif=None):
+        self.client        = client
+        self.get_connexion = get_connexion
+        self.urls_connues  = urls_connues
+        self.cible         = cible
+        self.nb_fetchers   = nb_fetchers
+        self.taille_lot    = taille_lot
+        self.delai_flush   = delai_flush
+        self.enrich_intervalle = enrich_intervalle
+        self.planif        = planif
+        self.limiteur      = TokenBucketThread(debit, capacite)
+
+        # Files bornées : c’est elles qui assurent la contre-pression
+        self.q_jobs   = queue.Queue()                      # plan du tour (taille connue)
+        self.q_bruts  = queue.Queue(maxsize=taille_file)   # résultats search_posts
+        self.q_lignes = queue.Queue(maxsize=taille_file)   # lignes prêtes à écrire
+
+        self.seuil_date  = None
+        self.inseres     = 0
+        self.mis_en_file = 0
+        self._en_vol     = set()   # URIs mises en file, pas encore écrites (doublons du run)
+        self._depuis_enrichissement = 0
+        self._verrou     = threading.Lock()
+        self._stop       = threading.Event()   # cible atteinte ou étape en échec
+        self._fin        = threading.Event()   # arrêt des threads de fond
+        self._enrichir   = threading.Event()
+        self._threads    = []
+        self._erreur     = None    # première exception d'une étape, relevée dans le thread principal
+        self._etape_erreur    = None
+        self._erreur_remontee = False
+
+    @property
+    def termine(self) -> bool:
+        return self._stop.is_set()
+
+    # ---------- cycle de vie ----------
+    def demarrer(self):
+        cibles = [self._boucle_fetch] * self.nb_fetchers + [
+            self._boucle_transformation, self._boucle_writer, self._boucle_enrichissement
+        ]
+        for i, cible in enumerate(cibles):
+            t = threading.Thread(target=cible, name=f"pipeline-{cible.__name__}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def executer_tour(self, plan, seuil_date):
+        """Soumet le plan du tour [(categorie, keyword, limite)] et attend ses recherches."""
+        self._remonter_erreur()
+        self.seuil_date = seuil_date
+        for job in plan:
+            self.q_jobs.put(job)
+        self._attendre(self.q_jobs)
+        self._attendre(self.q_bruts)
+        self._remonter_erreur()
+
+    def arreter(self):
+        for _ in range(self.nb_fetchers):
+            self.q_jobs.put(None)
+        for t in self._threads[:self.nb_fetchers]:
+            t.join()
+        self.q_bruts.put(None)          # → transformation → writer
+        for t in self._threads[self.nb_fetchers:self.nb_fetchers + 2]:
+            t.join()
+        self._fin.set()
+        self._enrichir.set()
+        self._threads[-1].join()
+        self._remonter_erreur()
+
+    # ---------- erreurs ----------
+    def _echouer(self, etape: str, erreur: Exception):
+        """Conserve la première erreur et arrête le run : plus de recherche ni d'enrichissement."""
+        with self._verrou:
+            if self._erreur is None:
+                self._erreur, self._etape_erreur = erreur, etape
+        print(f"❌ Pipeline : échec de l'étape {etape} → {erreur!r}")
+        self._stop.set()
+        self._fin.set()
+        self._enrichir.set()
+
+    def _remonter_erreur(self):
+        if self._erreur is not None and not self._erreur_remontee:
+            self._erreur_remontee = True
+            raise RuntimeError(f"Pipeline d'extraction : échec de l'étape {self._etape_erreur}") from self._erreur
+
+    def _attendre(self, file: queue.Queue, delai: float = 1.0):
+        """file.join() qui rend la main dès qu'une étape a échoué ou qu'un thread est mort."""
+        with file.all_tasks_done:
+            while file.unfinished_tasks and self._erreur is None:
+                morts = [t.name for t in self._threads if not t.is_alive()]
+                if morts:
+                    raise RuntimeError(f"Pipeline d'extraction : threads arrêtés ({', '.join(morts)})")
+                file.all_tasks_done.wait(delai)
+
+    # ---------- étapes ----------
+    def _boucle_fetch(self):
+        while True:
+            job = self.q_jobs.get()
+            try:
+                if job is None:
+                    return
+                categorie, keyword, limite = job
+                if self._stop.is_set():
+                    continue  # cible atteinte ou échec : on vide simplement le plan
+                try:
+                    posts, appels = rechercher_keyword_sync(self.client, self.limiteur, keyword, limite)
+                    self.q_bruts.put((categorie, keyword, posts, None, appels))
+                except ErreurRecherche as e:
+                    self.q_bruts.put((categorie, keyword, [], e.__cause__, e.appels))
+                except Exception as e:
+                    self.q_bruts.put((categorie, keyword, [], e, 0))
+            finally:
+                self.q_jobs.task_done()
+
+    def _boucle_transformation(self):
+        while True:
+            item = self.q_bruts.get()
+            try:
+                if item is None:
+                    self.q_lignes.put(None)
+                    return
+                self._transformer(*item)
+            except Exception as e:
+                self._echouer("transformation", e)   # _stop posé : les items suivants sont ignorés
+            finally:
+                self.q_bruts.task_done()
+
+    def _transformer(self, categorie, keyword, posts, erreur, appels):
+        if erreur is not None:
+            print(f"Erreur récupération '{keyword}' → {erreur}")
+            # Les appels consommés comptent : un mot-clé qui échoue sans cesse est mis en pause
+            metriques.compter_keyword(categorie, keyword, 0, 0, 0, erreurs=1)
+            if self.planif is not None:
+                self.planif.enregistrer(categorie, keyword, appels, 0, 0)
+            return
+
+        nouveaux = doublons = trop_anciens = 0
+        for post in posts:
+            if self._stop.is_set() or self.mis_en_file + nouveaux >= self.cible:
+                break
+            with self._verrou:
+                deja_vu = post.uri in self.urls_connues or post.uri in self._en_vol
+            if deja_vu:
+                doublons += 1
+                continue
+            lignes = lignes_depuis_post(post, categorie, keyword, self.seuil_date)
+            if lignes is None:
+                trop_anciens += 1
+                continue
+            with self._verrou:
+                self._en_vol.add(post.uri)
+            self.q_lignes.put(lignes)   # bloque si le writer est en retard
+            nouveaux += 1
+
+        with self._verrou:
+            self.mis_en_file += nouveaux
+        metriques.compter_keyword(categorie, keyword, nouveaux, doublons, trop_anciens)
+        if self.planif is not None:
+            self.planif.enregistrer(categorie, keyword, appels, nouveaux, doublons)
+
+    def _boucle_writer(self):
+        conn = writer = None
+        urls_lot = []
+        try:
+            conn   = self.get_connexion()
+            writer = BulkWriter(conn, taille_lot=self.taille_lot)
+        except Exception as e:
+            self._echouer("writer", e)
+        try:
+            while True:
+                try:
+                    item = self.q_lignes.get(timeout=self.delai_flush)
+                except queue.Empty:
+                    item = False    # délai écoulé : on écrit le lot partiel
+                if writer is None:
+                    # Writer hors service : on consomme la file pour ne pas bloquer la transformation
+                    if item is None:
+                        return
+                    continue
+                try:
+                    if item is None:
+                        self._ecrire(writer, urls_lot)
+                        return
+                    if item:
+                        writer.ajouter(*item)
+                        urls_lot.append(item[0][0])
+                    if len(writer) >= self.taille_lot or (item is False and len(writer)):
+                        self._ecrire(writer, urls_lot)
+                except Exception as e:
+                    self._echouer("writer", e)
+                    writer = None
+                    if item is None:
+                        return      # sentinelle déjà consommée : personne n'en renverra
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _ecrire(self, writer: BulkWriter, urls_lot: list):
+        en_file = len(writer)
+        stats = writer.flush()
+        if stats["posts_ignores"] or stats["posts_inseres"] or stats["erreur"]:
+            print(resume_lot(stats))
+        with self._verrou:
+            # URLs connues seulement une fois écrites (comme le mode "sync") : un post
+            # rejeté ou d'un lot en échec sera retenté s'il réapparaît
+            for url in stats["urls_ecrites"]:
+                self.urls_connues.add(url)
+            self._en_vol.difference_update(urls_lot)
+            urls_lot.clear()
+            # Posts ignorés (conflit) ou lot en échec : ils ne comptent plus pour la cible
+            self.mis_en_file -= en_file - stats["posts_inseres"]
+            self.inseres += stats["posts_inseres"]
+            self._depuis_enrichissement += stats["posts_inseres"]
+            if self._depuis_enrichissement >= self.enrich_intervalle:
+                self._depuis_enrichissement = 0
+                self._enrichir.set()
+            if self.inseres >= self.cible:
+                self._stop.set()
+
+    def _boucle_enrichissement(self):
+        conn = None
+        try:
+            conn = self.get_connexion()
+            while True:
+                self._enrichir.wait()
+                self._enrichir.clear()
+                if self._fin.is_set():
+                    return
+                st = enrichir_comptes(conn, self.client)
+                print(f"Enrichissement (en tâche de fond) : {st['enrichis']} comptes enrichis, "
+                      f"{st['invalides']} invalides, {st['appels']} appels get_profiles")
+        except Exception as e:
+            self._echouer("enrichissement", e)
+        finally:
+            if conn is not None:
+                conn.close()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Planificateur adaptatif des mots-clés (SCHEDULER_MODE = "adaptatif")
+────────────────────────────────────────────────────────────────────────────
+En round-robin, chaque mot-clé reçoit le même budget à chaque tour : les
+mots-clés morts coûtent autant d’appels que les mots-clés chauds, et ces
+derniers sont tronqués à PER_KEYWORD_LIMIT.
+
+Ici, pour chaque mot-clé, on suit (moyenne mobile exponentielle) :
+ • le rendement = nouveaux posts par appel search_posts ;
+ • le taux de doublons = part des posts déjà connus.
+Ces statistiques sont persistées dans la table `keyword_stats`.
+
+À chaque tour, le budget d’appels (par défaut : autant qu’un tour
+round-robin) est réparti page par page avec une file de priorité : chaque
+page va au mot-clé dont la page suivante rapporte le plus de nouveaux posts
+attendus. Une page supplémentaire sur un même mot-clé vaut un peu moins que
+la précédente (posts plus anciens, plus de doublons).
+Un mot-clé à faible rendement est mis en pause 1, 3, 7… tours
+(backoff exponentiel), et retrouve sa place dès qu’il redevient productif.
+Un mot-clé jamais vu part avec un rendement optimiste pour être exploré.
+Un mot-clé actif resté sans page depuis TOURS_EXPLORATION tours en reçoit
+une d’office : seul un appel met à jour son rendement, sans ce plancher un
+mot-clé sous la barre garderait pour toujours un rendement périmé.
+
+Gain mesuré contre un témoin : PART_TEMOIN du budget de chaque tour est joué
+en round-robin (LIMITE_TEMOIN posts, un appel, comme PER_KEYWORD_LIMIT) sur
+des mots-clés tirés au hasard, pauses comprises. rapport() compare le
+rendement des appels planifiés à celui des appels témoins du même run.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import heapq
+import random
+from datetime import datetime, timezone
+from psycopg2.extras import execute_batch
+
+TAILLE_PAGE        = 25     # posts renvoyés par search_posts sans paramètre limit
+ALPHA              = 0.3    # poids de la dernière observation dans la moyenne mobile
+SEUIL_RENDEMENT    = 0.5    # en dessous (nouveaux posts / appel) → backoff
+NIVEAU_BACKOFF_MAX = 5      # pause maximale : 2**5 - 1 = 31 tours
+DECROISSANCE_PAGE  = 0.6    # valeur relative de chaque page supplémentaire
+TOURS_EXPLORATION  = 8      # un mot-clé actif sans page depuis ce nb de tours en reçoit une
+PART_TEMOIN        = 0.1    # part du budget d’un tour jouée en round-robin témoin
+LIMITE_TEMOIN      = 10     # posts par mot-clé témoin (PER_KEYWORD_LIMIT du round-robin)
+
+SQL_CREATE_KEYWORD_STATS = """
+CREATE TABLE IF NOT EXISTS keyword_stats (
+    categorie        text    NOT NULL,
+    keyword          text    NOT NULL,
+    nb_appels        bigint  NOT NULL DEFAULT 0,
+    nb_nouveaux      bigint  NOT NULL DEFAULT 0,
+    nb_doublons      bigint  NOT NULL DEFAULT 0,
+    rendement        real,
+    ratio_doublons   real,
+    niveau_backoff   integer NOT NULL DEFAULT 0,
+    pause_tours      integer NOT NULL DEFAULT 0,
+    date_maj         timestamptz,
+    PRIMARY KEY (categorie, keyword)
+);
+"""
+
+SQL_SELECT_KEYWORD_STATS = """
+SELECT categorie, keyword, nb_appels, nb_nouveaux, nb_doublons,
+       rendement, ratio_doublons, niveau_backoff, pause_tours
+FROM keyword_stats;
+"""
+
+SQL_UPSERT_KEYWORD_STATS = """
+INSERT INTO keyword_stats (
+    categorie, keyword, nb_appels, nb_nouveaux, nb_doublons,
+    rendement, ratio_doublons, niveau_backoff, pause_tours, date_maj
+) VALUES (
+    %(categorie)s, %(keyword)s, %(nb_appels)s, %(nb_nouveaux)s, %(nb_doublons)s,
+    %(rendement)s, %(ratio_doublons)s, %(niveau_backoff)s, %(pause_tours)s, %(date_maj)s
+)
+ON CONFLICT (categorie, keyword) DO UPDATE SET
+    nb_appels      = EXCLUDED.nb_appels,
+    nb_nouveaux    = EXCLUDED.nb_nouveaux,
+    nb_doublons    = EXCLUDED.nb_doublons,
+    rendement      = EXCLUDED.rendement,
+    ratio_doublons = EXCLUDED.ratio_doublons,
+    niveau_backoff = EXCLUDED.niveau_backoff,
+    pause_tours    = EXCLUDED.pause_tours,
+    date_maj       = EXCLUDED.date_maj;
+"""
+
+
+def _stats_vides() -> dict:
+    """Statistiques d’un mot-clé jamais interrogé."""
+    return {
+        "nb_appels": 0, "nb_nouveaux": 0, "nb_doublons": 0,
+        "rendement": None, "ratio_doublons": None,
+        "niveau_backoff": 0, "pause_tours": 0,
+    }
+
+
+class PlanificateurKeywords:
+    """
+    planif = PlanificateurKeywords.charger(conn, keywords)
+    for categorie, keyword, limite in planif.tour(): ...
+        planif.enregistrer(categorie, keyword, appels, nouveaux, doublons)
+    planif.sauvegarder(conn); print(planif.rapport())
+    """
+
+    def __init__(self, keywords, stats: dict | None = None, pages_max: int = 4,
+                 part_temoin: float = PART_TEMOIN, limite_temoin: int = LIMITE_TEMOIN):
+        self.keywords  = list(keywords)       # [(categorie, keyword)]
+        self.pages_max = pages_max
+        self.part_temoin   = part_temoin
+        self.limite_temoin = limite_temoin
+        self.stats     = {}
+        for cle in self.keywords:
+            self.stats[cle] = (stats or {}).get(cle) or _stats_vides()
+        self._attente  = {}                   # tours sans page, par mot-clé actif
+        self._temoins  = set()                # mots-clés témoins du tour en cours
+        self._tirage   = random.Random()
+        # Compteurs du run courant (pour le rapport)
+        self.run_appels   = 0
+        self.run_nouveaux = 0
+        self.temoin_appels   = 0
+        self.temoin_nouveaux = 0
+
+    # ---------- persistance ----------
+    @classmethod
+    def charger(cls, conn, keywords, pages_max: int = 4,
+                limite_temoin: int = LIMITE_TEMOIN) -> "PlanificateurKeywords":
+        cur = conn.cursor()
+        cur.execute(SQL_CREATE_KEYWORD_STATS)
+        cur.execute(SQL_SELECT_KEYWORD_STATS)
+        stats = {}
+        for (categorie, keyword, appels, nouveaux, doublons,
+             rendement, ratio, niveau, pause) in cur.fetchall():
+            stats[(categorie, keyword)] = {
+                "nb_appels": appels, "nb_nouveaux": nouveaux, "nb_doublons": doublons,
+                "rendement": rendement, "ratio_doublons": ratio,
+                "niveau_backoff": niveau, "pause_tours": pause,
+            }
+        conn.commit()
+        cur.close()
+        return cls(keywords, stats, pages_max, limite_temoin=limite_temoin)
+
+    def sauvegarder(self, conn):
+        maintenant = datetime.now(timezone.utc)
+        lignes = [dict(st, categorie=c, keyword=k, date_maj=maintenant)
+                  for (c, k), st in self.stats.items()]
+        cur = conn.cursor()
+        try:
+            execute_batch(cur, SQL_UPSERT_KEYWORD_STATS, lignes)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Échec sauvegarde keyword_stats → rollback : {e}")
+        finally:
+            cur.close()
+
+    # ---------- planification ----------
+    def _rendement_attendu(self, st: dict) -> float:
+        # Mot-clé jamais interrogé : optimiste pour qu’il soit exploré
+        return TAILLE_PAGE if st["rendement"] is None else st["rendement"]
+
+    def tour(self, budget_appels: int | None = None) -> list[tuple]:
+        """
+        Plan d’un tour : liste de (categorie, keyword, limite_posts).
+        budget_appels par défaut = nb de mots-clés (coût d’un tour round-robin).
+        """
+        budget = budget_appels or len(self.keywords)
+
+        # Les mots-clés en pause consomment un tour de pause
+        actifs = []
+        for cle in self.keywords:
+            st = self.stats[cle]
+            if st["pause_tours"] > 0:
+                st["pause_tours"] -= 1
+            else:
+                actifs.append(cle)
+        if not actifs:
+            actifs = list(self.keywords)
+
+        # Témoin : round-robin tel quel sur des mots-clés tirés au hasard (pauses comprises)
+        nb_temoins = min(len(self.keywords), round(budget * self.part_temoin))
+        self._temoins = set(self._tirage.sample(self.keywords, nb_temoins))
+        budget -= nb_temoins
+        candidats = [cle for cle in actifs if cle not in self._temoins]
+
+        # Plancher d’exploration : une page aux mots-clés oubliés, les plus anciens d’abord
+        en_retard = sorted((cle for cle in candidats if self._attente.get(cle, 0) >= TOURS_EXPLORATION),
+                           key=lambda cle: -self._attente[cle])[:max(budget, 0)]
+        pages = {cle: 1 for cle in en_retard}
+        budget -= len(en_retard)
+
+        # File de priorité (max-heap) sur la valeur de la prochaine page
+        tas = [(-self._rendement_attendu(self.stats[cle]) * DECROISSANCE_PAGE ** pages.get(cle, 0), i, cle)
+               for i, cle in enumerate(candidats) if pages.get(cle, 0) < self.pages_max]
+        heapq.heapify(tas)
+        while tas and budget > 0:
+            valeur, i, cle = heapq.heappop(tas)
+            pages[cle] = pages.get(cle, 0) + 1
+            budget -= 1
+            if pages[cle] < self.pages_max:
+                heapq.heappush(tas, (valeur * DECROISSANCE_PAGE, i, cle))
+
+        for cle in actifs:
+            interroge = cle in pages or cle in self._temoins
+            self._attente[cle] = 0 if interroge else self._attente.get(cle, 0) + 1
+
+        return ([(c, k, n * TAILLE_PAGE) for (c, k), n in pages.items()]
+                + [(c, k, self.limite_temoin) for c, k in self._temoins])
+
+    def enregistrer(self, categorie, keyword, appels: int, nouveaux: int, doublons: int):
+        """Met à jour les statistiques d’un mot-clé après sa recherche."""
+        st = self.stats.setdefault((categorie, keyword), _stats_vides())
+        appels = max(appels, 1)
+        obs_rendement = nouveaux / appels
+        obs_doublons  = doublons / (nouveaux + doublons) if (nouveaux + doublons) else 1.0
+
+        st["nb_appels"]   += appels
+        st["nb_nouveaux"] += nouveaux
+        st["nb_doublons"] += doublons
+        st["rendement"] = obs_rendement if st["rendement"] is None else \
+            ALPHA * obs_rendement + (1 - ALPHA) * st["rendement"]
+        st["ratio_doublons"] = obs_doublons if st["ratio_doublons"] is None else \
+            ALPHA * obs_doublons + (1 - ALPHA) * st["ratio_doublons"]
+
+        if st["rendement"] < SEUIL_RENDEMENT:
+            st["niveau_backoff"] = min(st["niveau_backoff"] + 1, NIVEAU_BACKOFF_MAX)
+            st["pause_tours"]    = 2 ** st["niveau_backoff"] - 1
+        else:
+            st["niveau_backoff"] = 0
+            st["pause_tours"]    = 0
+
+        self.run_appels   += appels
+        self.run_nouveaux += nouveaux
+        if (categorie, keyword) in self._temoins:
+            self.temoin_appels   += appels
+            self.temoin_nouveaux += nouveaux
+
+    # ---------- rapport ----------
+    def rendement_planifie(self) -> float | None:
+        """Nouveaux posts par appel sur les appels choisis par le planificateur (hors témoin)."""
+        appels = self.run_appels - self.temoin_appels
+        return (self.run_nouveaux - self.temoin_nouveaux) / appels if appels else None
+
+    def rendement_temoin(self) -> float | None:
+        """Nouveaux posts par appel mesurés sur les appels round-robin témoins du run."""
+        return self.temoin_nouveaux / self.temoin_appels if self.temoin_appels else None
+
+    def rapport(self) -> str:
+        planifie, temoin = self.rendement_planifie(), self.rendement_temoin()
+        en_pause = sum(1 for st in self.stats.values() if st["pause_tours"] > 0)
+        ligne = (f"Planificateur : {self.run_nouveaux} nouveaux posts / {self.run_appels} appels"
+                 f" | planifiés : {planifie or 0:.2f} par appel | {en_pause} mots-clés en pause")
+        if temoin is not None:
+            ligne += (f" | témoin round-robin : {temoin:.2f} par appel ({self.temoin_appels} appels)"
+                      + (f", gain x{planifie / temoin:.2f}" if temoin and planifie is not None else ""))
+        return ligne
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Quels modèles calculer, et quand (utilisé par 05_POSTS_ANALYSE.py et file_analyse.py)
+────────────────────────────────────────────────────────────────────────────
+05 passait les six modèles sur chaque post anglais, alors que l’aval n’en
+lit que trois :
+ • 07_TRENDS_RESULTS     : categories, emotion, toxicity (→ trends_results,
+                           lue par les endpoints du dashboard) ;
+ • 08_KEYWORDS_RESULTS   : categories (→ keywords_results).
+veracity, irony et tone ne sont lus par aucune étape.
+
+CONSOMMATEURS déclare ces dépendances ; chaque modèle reçoit une politique :
+ • "toujours"      : chemin chaud, chaque post est mis en file ;
+ • "echantillon"   : seulement une fraction déterministe des posts (md5 de
+                     l’URL, même tirage en SQL et en Python, entre workers
+                     et entre runs) ;
+ • "rattrapage"    : chaque post est mis en file en basse priorité — réclamé
+                     seulement quand le chemin chaud n’a plus de travail ;
+ • "a_la_demande"  : jamais mis en file automatiquement (FileAnalyse.demander).
+Un modèle lu par une étape est forcé à "toujours". Par défaut, les modèles
+que personne ne lit passent en "rattrapage".
+
+BilanPlanification chiffre le calcul évité par post sur le chemin chaud.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import hashlib
+
+POLITIQUES = ("toujours", "echantillon", "rattrapage", "a_la_demande")
+
+# Priorités dans analyse_file (la plus basse valeur est réclamée d'abord)
+PRIORITE_CHAUDE     = 0
+PRIORITE_RATTRAPAGE = 1
+
+TAUX_ECHANTILLON = 0.05
+
+# Étape aval → modèles dont elle lit les tables de mesure
+CONSOMMATEURS = {
+    "07_TRENDS_RESULTS":   ("categories", "emotion", "toxicity"),
+    "08_KEYWORDS_RESULTS": ("categories",),
+}
+
+# Tirage d'échantillon : 28 premiers bits du md5 de l'URL, ramenés à [0, 1)
+SQL_TIRAGE_ECHANTILLON = "(('x' || substr(md5({colonne}), 1, 7))::bit(28)::int / 268435456.0)"
+
+
+def tirage(post_url: str) -> float:
+    """Même valeur que SQL_TIRAGE_ECHANTILLON pour cette URL."""
+    return int(hashlib.md5(post_url.encode("utf-8")).hexdigest()[:7], 16) / 2**28
+
+
+def modeles_requis(consommateurs: dict = CONSOMMATEURS) -> set:
+    return {cle for cles in consommateurs.values() for cle in cles}
+
+
+def politiques_modeles(cles, politiques: dict | None = None,
+                       consommateurs: dict = CONSOMMATEURS) -> dict:
+    """
+    {cle: politique} pour chaque modèle de `cles` : "toujours" si une étape le
+    lit, sinon la politique demandée, sinon "rattrapage".
+    """
+    politiques = dict(politiques or {})
+    requis = modeles_requis(consommateurs)
+    resultat = {}
+    for cle in cles:
+        politique = "toujours" if cle in requis else politiques.get(cle, "rattrapage")
+        if politique not in POLITIQUES:
+            raise ValueError(f"Politique inconnue pour {cle} : {politique} (attendu : {', '.join(POLITIQUES)})")
+        if cle in requis and politiques.get(cle, "toujours") != "toujours":
+            print(f"⚠️  {cle} est lu par {', '.join(e for e, c in consommateurs.items() if cle in c)} : "
+                  f"politique « {politiques[cle]} » ignorée, « toujours » appliquée.")
+        resultat[cle] = politique
+    return resultat
+
+
+def decrire_politiques(politiques: dict, taux_echantillon: float = TAUX_ECHANTILLON) -> str:
+    return " | ".join(
+        f"{cle} {p}" + (f" {taux_echantillon:.0%}" if p == "echantillon" else "")
+        for cle, p in politiques.items())
+
+
+class BilanPlanification:
+    """
+    bilan = BilanPlanification(politiques)
+    bilan.observer_post(cles_reclamees)              # une fois par post traité
+    bilan.observer_inference(cle, nb_textes, duree)  # après chaque lot
+    print(bilan.rapport())
+    """
+
+    def __init__(self, politiques: dict):
+        self.politiques  = politiques
+        self.posts       = 0                                 # posts passés par le chemin chaud
+        self.rattrapes   = 0                                 # posts réclamés pour le rattrapage seul
+        self.mesures     = {cle: 0 for cle in politiques}    # couples (post, modèle) traités
+        self.textes      = {cle: 0 for cle in politiques}    # textes réellement inférés
+        self.secondes    = {cle: 0.0 for cle in politiques}
+
+    def observer_post(self, cles):
+        if not any(self.politiques.get(cle) == "toujours" for cle in cles):
+            # Passe de rattrapage d'un post déjà servi : hors bilan du chemin chaud
+            self.rattrapes += 1
+            return
+        self.posts += 1
+        for cle in cles:
+            self.mesures[cle] = self.mesures.get(cle, 0) + 1
+
+    def observer_inference(self, cle: str, nb_textes: int, duree: float):
+        self.textes[cle]   = self.textes.get(cle, 0) + nb_textes
+        self.secondes[cle] = self.secondes.get(cle, 0.0) + duree
+
+    def rapport(self) -> str:
+        if not self.posts:
+            return f"Planification : aucun post sur le chemin chaud ({self.rattrapes} en rattrapage)."
+        tous = self.posts * len(self.politiques)
+        evitees = tous - sum(self.mesures.values())
+        # Coût moyen d'un texte par modèle, mesuré dans ce run
+        couts = {cle: self.secondes[cle] / self.textes[cle] for cle in self.politiques if self.textes[cle]}
+        ms_evitees = sum(couts[cle] * (self.posts - self.mesures[cle]) for cle in couts) / self.posts * 1000
+        detail = ", ".join(f"{cle} {self.mesures[cle] / self.posts:.0%}" for cle in self.politiques)
+        non_chiffres = [cle for cle in self.politiques if cle not in couts]
+        return (f"Planification : {evitees}/{tous} couples (post, modèle) non calculés ({evitees / tous:.1%}), "
+                f"{sum(self.mesures.values()) / self.posts:.2f} modèles par post sur {len(self.politiques)} "
+                f"≈ {ms_evitees:.1f} ms de calcul évitées par post"
+                + (f" (hors {', '.join(non_chiffres)}, jamais lancés dans ce run)" if non_chiffres else "")
+                + f" | part des posts par modèle : {detail}"
+                + (f" | {self.rattrapes} posts complétés en rattrapage" if self.rattrapes else ""))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Accès PostgreSQL poolé des scripts batch (utilisé par 05_POSTS_ANALYSE.py)
+────────────────────────────────────────────────────────────────────────────
+fetch_post_content et insert_result ouvraient chacun une connexion psycopg2
+neuve : pour un post, 1 connexion en lecture + 6 en écriture, avec autant de
+commits. Sur une base distante, l’établissement des connexions dominait le
+temps total.
+
+ • PoolBdd       : ThreadedConnectionPool ouvert une fois pour le run ;
+                   connexion() emprunte/rend une connexion, transaction()
+                   valide ou annule le bloc d’un coup ;
+ • ecrire_mesures : écrit les lignes de plusieurs tables de mesure dans la
+                   transaction de l’appelant, par COPY (voir bulk_ingest.py)
+                   ou par execute_values.
+
+Une passe de l’analyse = 1 lecture groupée + 1 transaction d’écriture, quel
+que soit le nombre de posts et de modèles.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+from contextlib import contextmanager
+
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from bulk_ingest import copier_fusionner
+
+METHODES_ECRITURE = ("copy", "values")
+
+
+class PoolBdd:
+    """
+    pool = PoolBdd(host=..., port=..., dbname=..., user=..., password=...)
+    with pool.transaction() as conn:
+        ecrire_mesures(conn, {table: (colonnes, lignes)})
+    pool.fermer()
+    """
+
+    def __init__(self, mini: int = 1, maxi: int = 4, **params):
+        self._pool = ThreadedConnectionPool(mini, maxi, **params)
+
+    def prendre(self):
+        """Connexion gardée hors bloc with (à rendre par rendre())."""
+        return self._pool.getconn()
+
+    def rendre(self, conn):
+        self._pool.putconn(conn)
+
+    @contextmanager
+    def connexion(self):
+        conn = self._pool.getconn()
+        try:
+            yield conn
+        finally:
+            self._pool.putconn(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connexion() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def fermer(self):
+        self._pool.closeall()
+
+
+def ecrire_mesures(conn, mesures: dict, methode: str = "copy", cle_conflit: str = "post_url") -> int:
+    """
+    mesures : {table: (colonnes, lignes)}, lignes = tuples dans l’ordre de
+    `colonnes`. Insère ON CONFLICT (cle_conflit) DO NOTHING, sans commit.
+    Retourne le nombre de lignes réellement insérées.
+    """
+    if methode not in METHODES_ECRITURE:
+        raise ValueError(f"Méthode d'écriture inconnue : {methode} (attendu : {METHODES_ECRITURE})")
+    nb = 0
+    cur = conn.cursor()
+    try:
+        for table, (colonnes, lignes) in mesures.items():
+            if not lignes:
+                continue
+            if methode == "copy":
+                nb += copier_fusionner(cur, table, colonnes, lignes, cle_conflit)
+            else:
+                execute_values(cur, f"""
+                    INSERT INTO {table} ({", ".join(colonnes)})
+                    VALUES %s
+                    ON CONFLICT ({cle_conflit}) DO NOTHING;
+                """, lignes, page_size=len(lignes))   # une seule requête : rowcount exact
+                nb += cur.rowcount
+    finally:
+        cur.close()
+    return nb
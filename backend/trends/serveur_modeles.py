@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""
+Serveur de modèles partagé, avec micro-lots dynamiques
+────────────────────────────────────────────────────────────────────────────
+Les modèles étaient chargés deux fois : par l’API (analyse_post_unitaire.py,
+les six au démarrage) et par 05_POSTS_ANALYSE.py — chaque copie pèse
+plusieurs Go de poids. Ce serveur local charge chaque modèle une seule fois
+et l’expose en HTTP (localhost) :
+
+ • POST /predire  {"modele": cle, "textes": [...], "priorite": "interactif"|"batch",
+                   "activation": "softmax"|"sigmoid" (facultatif)}
+                  → {"scores": [{label: score}, ...]} dans l’ordre des textes ;
+ • GET  /sante    → modèles servis et backend ;
+ • GET  /stats    → RSS du serveur, lots formés, latences p50 / p99 par priorité.
+
+Un MicroBatcheur par modèle regroupe les requêtes concurrentes (API et
+workers 05) : dès qu’une requête arrive, il attend au plus `delai_max_ms`
+que d’autres la rejoignent (ou que `taille_max` textes soient réunis), puis
+passe le tout en une inférence triée par longueur (inference_lots.py). Les
+requêtes interactives passent devant les requêtes batch en attente ; une
+requête de plus de `taille_max` textes (une passe de 05) est découpée en
+morceaux de `taille_max`, et une requête interactive arrivée en cours de
+route n’attend que la fin du morceau en cours. Sans "activation", le
+modèle la déduit de sa config, comme dans 05 ; une activation imposée
+(function_to_apply de l’API, ex. "sigmoid" pour tox) a son propre
+MicroBatcheur, créé à la première requête, sur une copie du modèle qui
+partage ses poids.
+
+Chaque modèle a son thread de micro-lots. Le nombre de threads intra-op
+de torch est un réglage du process : il est fixé une fois, avant le
+chargement, à cœurs / nb de modèles (threads_par_modele, voir
+execution_modeles.py) ; pas de budget par modèle ici.
+
+Lancer le serveur (dossier contenant les six modèles) :
+    python serveur_modeles.py --dossier <dossier_models> --delai_ms 10 --taille_max 64
+Clients (ClientModeles, client_modeles.py : sans torch) : MODE_EXECUTION =
+"serveur" dans 05, PIGMALION_SERVEUR_MODELES=<url> pour l’API. Charge mixte interactif + batch (latences p50 / p99, RSS) :
+    python serveur_modeles.py --bench --interactifs 4 --batchs 2 --duree 30
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import copy
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import torch
+
+from client_modeles import ClientModeles, PORT_SERVEUR, URL_SERVEUR
+from inference_lots import TAILLE_LOT_INFERENCE, textes_synthetiques
+from inference_onnx import BACKENDS, charger_modele
+from execution_modeles import threads_par_modele
+from memoire_process import rss_mo
+
+DELAI_MAX_MS       = 10
+TAILLE_MAX_LOT     = 64
+PRIORITES          = ("interactif", "batch")
+ACTIVATIONS        = ("softmax", "sigmoid")
+NB_LATENCES_GARDEES = 10_000
+
+# Dossiers des modèles, relatifs au dossier "models" du projet (clés de 05)
+DOSSIERS_MODELES = {
+    "emotion":    "j-hartmann_emotion-english-distilroberta-base",
+    "categories": "cardiffnlp_tweet-topic-21-multi",
+    "veracity":   "ghanashyamvtatti_roberta-fake-news",
+    "irony":      "cardiffnlp_twitter-roberta-base-irony",
+    "toxicity":   "unitary_toxic-bert",
+    "tone":       "finiteautomata_bertweet-base-sentiment-analysis",
+}
+
+
+def percentile(valeurs, q: float) -> float | None:
+    if not valeurs:
+        return None
+    triees = sorted(valeurs)
+    return triees[min(len(triees) - 1, int(q * len(triees)))]
+
+
+# ===========================
+# === MICRO-LOTS DYNAMIQUES ===
+# ===========================
+class _Requete:
+    __slots__ = ("textes", "priorite", "arrivee", "fait", "scores", "erreur")
+
+    def __init__(self, textes: list[str], priorite: str):
+        self.textes   = textes
+        self.priorite = priorite
+        self.arrivee  = time.perf_counter()
+        self.fait     = threading.Event()
+        self.scores   = None
+        self.erreur   = None
+
+
+class MicroBatcheur:
+    """
+    batcheur = MicroBatcheur("emotion", modele)
+    scores = batcheur.soumettre(textes, "interactif")     # bloquant, thread-safe
+    """
+
+    def __init__(self, cle: str, modele, delai_max_ms: float = DELAI_MAX_MS,
+                 taille_max: int = TAILLE_MAX_LOT, taille_lot: int = TAILLE_LOT_INFERENCE):
+        self.cle        = cle
+        self.modele     = modele
+        self.delai_max  = delai_max_ms / 1000
+        self.taille_max = taille_max
+        self.taille_lot = taille_lot
+        self._attente   = {p: deque() for p in PRIORITES}
+        self._condition = threading.Condition()
+        self._latences  = {p: deque(maxlen=NB_LATENCES_GARDEES) for p in PRIORITES}
+        self.nb_lots    = 0
+        self.nb_textes  = 0
+        self._thread    = threading.Thread(target=self._boucle, name=f"batcheur-{cle}", daemon=True)
+        self._thread.start()
+
+    def soumettre(self, textes: list[str], priorite: str = "batch") -> list[dict]:
+        if priorite not in PRIORITES:
+            raise ValueError(f"Priorité inconnue : {priorite} (attendu : {', '.join(PRIORITES)})")
+        if not textes:
+            return []
+        textes = list(textes)
+        # Morceaux d'au plus taille_max textes : un lot ne retient jamais une requête
+        # interactive plus longtemps qu'une inférence de taille_max textes
+        morceaux = [_Requete(textes[i:i + self.taille_max], priorite)
+                    for i in range(0, len(textes), self.taille_max)]
+        with self._condition:
+            self._attente[priorite].extend(morceaux)
+            self._condition.notify()
+        for morceau in morceaux:
+            morceau.fait.wait()
+        erreur = next((m.erreur for m in morceaux if m.erreur is not None), None)
+        if erreur is not None:
+            raise erreur
+        return [score for morceau in morceaux for score in morceau.scores]
+
+    def _nb_en_attente(self) -> int:
+        return sum(len(r.textes) for file in self._attente.values() for r in file)
+
+    def _former_lot(self) -> list[_Requete]:
+        """Attend la première requête, puis jusqu’à delai_max ou taille_max textes."""
+        with self._condition:
+            while not any(self._attente.values()):
+                self._condition.wait()
+            premiere = min((f[0] for f in self._attente.values() if f), key=lambda r: r.arrivee)
+            echeance = premiere.arrivee + self.delai_max
+            while self._nb_en_attente() < self.taille_max:
+                reste = echeance - time.perf_counter()
+                if reste <= 0:
+                    break
+                self._condition.wait(reste)
+
+            # Interactif d'abord ; une requête n'est jamais coupée entre deux lots
+            lot, nb = [], 0
+            for priorite in PRIORITES:
+                file = self._attente[priorite]
+                while file and (not lot or nb + len(file[0].textes) <= self.taille_max):
+                    requete = file.popleft()
+                    lot.append(requete)
+                    nb += len(requete.textes)
+            return lot
+
+    def _boucle(self):
+        while True:
+            lot = self._former_lot()
+            textes = [t for r in lot for t in r.textes]
+            try:
+                scores = self.modele.predire_lot(textes, self.taille_lot)
+            except Exception as e:
+                for requete in lot:
+                    requete.erreur = e
+                    requete.fait.set()
+                continue
+            fin, debut = time.perf_counter(), 0
+            for requete in lot:
+                requete.scores = scores[debut:debut + len(requete.textes)]
+                debut += len(requete.textes)
+                self._latences[requete.priorite].append(fin - requete.arrivee)
+                requete.fait.set()
+            self.nb_lots   += 1
+            self.nb_textes += len(textes)
+
+    def stats(self) -> dict:
+        latences = {}
+        for priorite, valeurs in self._latences.items():
+            valeurs = list(valeurs)
+            latences[priorite] = {
+                "n": len(valeurs),
+                "p50_ms": round(percentile(valeurs, 0.50) * 1000, 2) if valeurs else None,
+                "p99_ms": round(percentile(valeurs, 0.99) * 1000, 2) if valeurs else None,
+            }
+        return {"lots": self.nb_lots, "textes": self.nb_textes,
+                "textes_par_lot": round(self.nb_textes / self.nb_lots, 1) if self.nb_lots else 0.0,
+                "latences": latences}
+
+
+# ===================
+# === SERVEUR HTTP ===
+# ===================
+class ServeurModeles:
+    """
+    serveur = ServeurModeles({"emotion": chemin, ...}, backend="torch")
+    serveur.servir(port)        # bloquant
+    """
+
+    def __init__(self, chemins: dict, device=-1, backend: str = "torch",
+                 delai_max_ms: float = DELAI_MAX_MS, taille_max: int = TAILLE_MAX_LOT,
+                 taille_lot: int = TAILLE_LOT_INFERENCE):
+        self.backend    = backend
+        self.rss_vide   = rss_mo()
+        # Avant le chargement : les sessions ONNX reprennent ce réglage
+        self.nb_threads = threads_par_modele(len(chemins))
+        self.batcheurs, self._alias = {}, {}
+        self._reglages  = (delai_max_ms, taille_max, taille_lot)
+        self._variantes, self._verrou = {}, threading.Lock()
+        for cle, chemin in chemins.items():
+            t0 = time.time()
+            modele = charger_modele(chemin, device, backend)
+            self.batcheurs[cle] = MicroBatcheur(cle, modele, delai_max_ms, taille_max, taille_lot)
+            # L'API désigne un modèle par son dossier, 05 par sa clé
+            self._alias[os.path.basename(os.path.normpath(chemin))] = cle
+            print(f"  • {cle} ← {chemin} ({time.time() - t0:.1f}s)")
+        print(f"  {self.nb_threads} threads torch par modèle (réglage commun du process)")
+        self.rss_charge = rss_mo()
+
+    def batcheur(self, nom: str, activation: str | None = None) -> MicroBatcheur:
+        cle = nom if nom in self.batcheurs else self._alias.get(nom)
+        if cle is None:
+            raise KeyError(f"Modèle non servi : {nom}")
+        base = self.batcheurs[cle]
+        if activation is not None and activation not in ACTIVATIONS:
+            raise ValueError(f"Activation inconnue : {activation} (attendu : {', '.join(ACTIVATIONS)})")
+        if activation is None or (activation == "sigmoid") == base.modele.multi_label:
+            return base
+        with self._verrou:
+            if (cle, activation) not in self._variantes:
+                # Copie superficielle : mêmes poids et tokenizer, seule l'activation change
+                modele = copy.copy(base.modele)
+                modele.multi_label = activation == "sigmoid"
+                self._variantes[(cle, activation)] = MicroBatcheur(f"{cle}-{activation}", modele,
+                                                                   *self._reglages)
+            return self._variantes[(cle, activation)]
+
+    def sante(self) -> dict:
+        return {"status": "ok", "backend": self.backend, "modeles": list(self.batcheurs),
+                "alias": self._alias}
+
+    def stats(self) -> dict:
+        return {"rss_mo": rss_mo(), "rss_avant_modeles_mo": self.rss_vide,
+                "rss_apres_chargement_mo": self.rss_charge,
+                "modeles": {cle: b.stats() for cle, b in self.batcheurs.items()},
+                "variantes": {b.cle: b.stats() for b in list(self._variantes.values())}}
+
+    def servir(self, port: int = PORT_SERVEUR, hote: str = "127.0.0.1"):
+        serveur = self
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            def _repondre(self, code: int, corps: dict):
+                donnees = json.dumps(corps).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(donnees)))
+                self.end_headers()
+                self.wfile.write(donnees)
+
+            def do_GET(self):
+                if self.path == "/sante":
+                    self._repondre(200, serveur.sante())
+                elif self.path == "/stats":
+                    self._repondre(200, serveur.stats())
+                else:
+                    self._repondre(404, {"erreur": f"Route inconnue : {self.path}"})
+
+            def do_POST(self):
+                if self.path != "/predire":
+                    self._repondre(404, {"erreur": f"Route inconnue : {self.path}"})
+                    return
+                try:
+                    corps = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    batcheur = serveur.batcheur(corps["modele"], corps.get("activation"))
+                except KeyError as e:
+                    self._repondre(400, {"erreur": e.args[0] if e.args else "corps invalide"})
+                    return
+                except ValueError as e:
+                    self._repondre(400, {"erreur": str(e)})
+                    return
+                try:
+                    scores = batcheur.soumettre(corps.get("textes", []), corps.get("priorite", "batch"))
+                except ValueError as e:
+                    self._repondre(400, {"erreur": str(e)})
+                    return
+                except Exception as e:
+                    self._repondre(500, {"erreur": str(e)})
+                    return
+                self._repondre(200, {"scores": scores})
+
+            def log_message(self, *args):
+                pass
+
+        httpd = ThreadingHTTPServer((hote, port), Gestionnaire)
+        httpd.daemon_threads = True
+        print(f"🧠 Serveur de modèles sur http://{hote}:{port} ({', '.join(self.batcheurs)})")
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+
+
+# =========================================
+# === BENCH : CHARGE MIXTE INTERACTIF / BATCH ===
+# =========================================
+def bench_charge_mixte(url: str, nb_interactifs: int = 4, nb_batchs: int = 2, duree_s: float = 30,
+                       taille_requete_batch: int = 256, modeles_interactifs=("toxicity", "emotion")) -> dict:
+    """
+    nb_interactifs clients imitent /analyze (un texte, toxicity + emotion),
+    nb_batchs clients imitent 05 (taille_requete_batch textes sur chaque modèle).
+    Latences mesurées côté client, plus les stats du serveur (RSS, lots).
+    """
+    client  = ClientModeles(url)
+    modeles = client.sante()["modeles"]
+    textes  = textes_synthetiques(max(taille_requete_batch, 1000))
+    latences = {p: [] for p in PRIORITES}
+    nb_textes = {p: 0 for p in PRIORITES}
+    verrou  = threading.Lock()
+    fin     = time.perf_counter() + duree_s
+
+    def interactif(graine: int):
+        i = graine
+        while time.perf_counter() < fin:
+            texte = textes[i % len(textes)]
+            t0 = time.perf_counter()
+            for modele in modeles_interactifs:
+                client.predire(modele, [texte], "interactif")
+            with verrou:
+                latences["interactif"].append(time.perf_counter() - t0)
+                nb_textes["interactif"] += 1
+            i += nb_interactifs
+
+    def batch(graine: int):
+        i = graine * taille_requete_batch
+        while time.perf_counter() < fin:
+            lot = [textes[(i + k) % len(textes)] for k in range(taille_requete_batch)]
+            t0 = time.perf_counter()
+            for modele in modeles:
+                client.predire(modele, lot, "batch")
+            with verrou:
+                latences["batch"].append(time.perf_counter() - t0)
+                nb_textes["batch"] += len(lot)
+            i += taille_requete_batch
+
+    threads = ([threading.Thread(target=interactif, args=(k,)) for k in range(nb_interactifs)]
+               + [threading.Thread(target=batch, args=(k,)) for k in range(nb_batchs)])
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    resultat = {"duree_s": duree_s, "interactifs": nb_interactifs, "batchs": nb_batchs, "clients": {}}
+    for priorite, valeurs in latences.items():
+        resultat["clients"][priorite] = {
+            "requetes": len(valeurs),
+            "textes_par_s": round(nb_textes[priorite] / duree_s, 1),
+            "p50_ms": round(percentile(valeurs, 0.50) * 1000, 1) if valeurs else None,
+            "p99_ms": round(percentile(valeurs, 0.99) * 1000, 1) if valeurs else None,
+        }
+    resultat["serveur"] = client.stats()
+    return resultat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur de modèles partagé (micro-lots dynamiques)")
+    parser.add_argument("--dossier", help="Dossier contenant les dossiers des modèles")
+    parser.add_argument("--modeles", default=",".join(DOSSIERS_MODELES),
+                        help="Clés des modèles à servir (défaut : les six)")
+    parser.add_argument("--backend", default="torch", choices=BACKENDS)
+    parser.add_argument("--port", type=int, default=PORT_SERVEUR)
+    parser.add_argument("--delai_ms", type=float, default=DELAI_MAX_MS,
+                        help="Attente max d'une requête avant le départ de son micro-lot")
+    parser.add_argument("--taille_max", type=int, default=TAILLE_MAX_LOT, help="Textes max par micro-lot")
+    parser.add_argument("--taille_lot", type=int, default=TAILLE_LOT_INFERENCE)
+    parser.add_argument("--bench", action="store_true", help="Charge mixte contre un serveur lancé")
+    parser.add_argument("--url", default=URL_SERVEUR)
+    parser.add_argument("--interactifs", type=int, default=4)
+    parser.add_argument("--batchs", type=int, default=2)
+    parser.add_argument("--duree", type=float, default=30)
+    parser.add_argument("--sortie", help="Écrit le résultat du bench (JSON) dans ce fichier")
+    args = parser.parse_args()
+
+    if args.bench:
+        resultat = bench_charge_mixte(args.url, args.interactifs, args.batchs, args.duree)
+        for priorite, m in resultat["clients"].items():
+            print(f"  {priorite:<10} {m['requetes']:>6} requêtes | {m['textes_par_s']:>8} textes/s | "
+                  f"p50 {m['p50_ms']} ms | p99 {m['p99_ms']} ms")
+        serveur = resultat["serveur"]
+        print(f"  RSS serveur : {serveur['rss_mo']} Mo (avant modèles {serveur['rss_avant_modeles_mo']} Mo, "
+              f"après chargement {serveur['rss_apres_chargement_mo']} Mo) — une seule copie des poids")
+        for cle, s in resultat["serveur"]["modeles"].items():
+            print(f"  {cle:<11} {s['lots']:>6} lots | {s['textes_par_lot']:>6} textes/lot")
+        if args.sortie:
+            with open(args.sortie, "w", encoding="utf-8") as f:
+                json.dump(resultat, f, indent=2)
+    else:
+        if not args.dossier:
+            parser.error("--dossier est requis pour lancer le serveur")
+        DEVICE = 0 if torch.cuda.is_available() else -1
+        chemins = {cle: os.path.join(args.dossier, DOSSIERS_MODELES[cle]) for cle in args.modeles.split(",")}
+        print(f"📦 Chargement des modèles ({args.backend})...")
+        ServeurModeles(chemins, DEVICE, args.backend, args.delai_ms, args.taille_max,
+                       args.taille_lot).servir(args.port)
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Télémétrie de l’extraction (latences API, rendement des mots-clés, débit)
+────────────────────────────────────────────────────────────────────────────
+Remplace la lecture des barres tqdm et des print par des mesures exploitables :
+ • latence des appels API par endpoint (histogramme), statut ok / 429 / erreur,
+   nombre de retries ;
+ • posts nouveaux / doublons / trop anciens par mot-clé, recherches en erreur ;
+ • latence des lots d’insertion (BulkWriter.flush) et posts insérés ;
+ • temps cumulé par étape (API, insertion, enrichissement) et posts/s.
+
+Un objet unique `metriques` est partagé par tout le process (thread-safe) ;
+les modules l’alimentent directement, le script principal l’exporte :
+ • exporter_prometheus(chemin) : format texte Prometheus (collecteur
+   « textfile » de node_exporter, ou simple lecture) ;
+ • sauvegarder(conn) : une ligne par échantillon dans `pipeline_metrics`.
+
+resume() indique aussi quelle étape consomme le plus de temps cumulé, pour
+voir d’un coup d’œil ce qui limite le débit.
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import json
+import time
+import uuid
+import threading
+from datetime import datetime, timezone
+
+from client_bluesky import espaces_client, est_rate_limit
+
+PREFIXE = "pigmalion_"
+
+# Bornes des histogrammes de latence (secondes)
+BORNES_LATENCE = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Type Prometheus de chaque métrique exportée
+TYPES_METRIQUES = {
+    "api_latence_secondes":   "histogram",
+    "api_appels_total":       "counter",
+    "api_retries_total":      "counter",
+    "keyword_posts_total":    "counter",
+    "lot_insertion_secondes": "histogram",
+    "lots_echecs_total":      "counter",
+    "posts_inseres_total":    "counter",
+    "posts_ignores_total":    "counter",
+    "posts_rejetes_total":    "counter",
+    "etape_secondes_total":   "counter",
+    "run_duree_secondes":     "gauge",
+    "posts_par_seconde":      "gauge",
+}
+
+SQL_CREATE_PIPELINE_METRICS = """
+CREATE TABLE IF NOT EXISTS pipeline_metrics (
+    run_id       text             NOT NULL,
+    date_mesure  timestamptz      NOT NULL,
+    metrique     text             NOT NULL,
+    labels       jsonb            NOT NULL DEFAULT '{}',
+    valeur       double precision
+);
+"""
+
+SQL_INSERT_PIPELINE_METRICS = """
+INSERT INTO pipeline_metrics (run_id, date_mesure, metrique, labels, valeur)
+VALUES (%s, %s, %s, %s, %s);
+"""
+
+
+def _echapper(valeur) -> str:
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogramme:
+    """Histogramme cumulatif à bornes fixes (même sémantique que Prometheus)."""
+
+    def __init__(self, bornes=BORNES_LATENCE):
+        self.bornes  = tuple(bornes)
+        self.compte  = [0] * len(self.bornes)
+        self.nb      = 0
+        self.somme   = 0.0
+
+    def observer(self, valeur: float):
+        self.nb    += 1
+        self.somme += valeur
+        for i, borne in enumerate(self.bornes):
+            if valeur <= borne:
+                self.compte[i] += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Estimation grossière : borne du premier seau atteignant le quantile."""
+        if not self.nb:
+            return None
+        for borne, n in zip(self.bornes, self.compte):
+            if n >= q * self.nb:
+                return borne
+        return float("inf")
+
+
+class Telemetrie:
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.reinitialiser()
+
+    def reinitialiser(self):
+        with self._verrou:
+            self.run_id      = uuid.uuid4().hex[:12]
+            self.debut       = time.time()
+            self.latences    = {}   # endpoint → Histogramme
+            self.appels      = {}   # (endpoint, statut) → nb
+            self.retries     = {}   # endpoint → nb
+            self.keywords    = {}   # (categorie, keyword) → {nouveau, doublon, trop_ancien, erreur}
+            self.lots        = Histogramme()
+            self.lots_echecs = 0
+            self.inseres     = 0
+            self.ignores     = 0
+            self.rejetes     = 0    # lignes fautives écartées d’un lot
+            self.etapes      = {}   # étape → secondes cumulées
+
+    # ---------- alimentation ----------
+    def observer_appel(self, endpoint: str, duree: float, statut: str = "ok"):
+        with self._verrou:
+            self.latences.setdefault(endpoint, Histogramme()).observer(duree)
+            self.appels[(endpoint, statut)] = self.appels.get((endpoint, statut), 0) + 1
+            self.etapes["api"] = self.etapes.get("api", 0.0) + duree
+
+    def compter_retry(self, endpoint: str):
+        with self._verrou:
+            self.retries[endpoint] = self.retries.get(endpoint, 0) + 1
+
+    def compter_keyword(self, categorie, keyword, nouveaux: int, doublons: int, trop_anciens: int,
+                        erreurs: int = 0):
+        with self._verrou:
+            c = self.keywords.setdefault((categorie, keyword),
+                                         {"nouveau": 0, "doublon": 0, "trop_ancien": 0, "erreur": 0})
+            c["nouveau"]     += nouveaux
+            c["doublon"]     += doublons
+            c["trop_ancien"] += trop_anciens
+            c["erreur"]      += erreurs
+
+    def observer_lot(self, stats: dict):
+        """Stats renvoyées par BulkWriter.flush()."""
+        with self._verrou:
+            if stats["erreur"] is not None:
+                self.lots_echecs += 1
+                return
+            self.lots.observer(stats["duree"])
+            self.inseres += stats["posts_inseres"]
+            self.ignores += stats["posts_ignores"]
+            self.rejetes += stats["posts_rejetes"]
+            self.etapes["insertion"] = self.etapes.get("insertion", 0.0) + stats["duree"]
+
+    def observer_etape(self, etape: str, duree: float):
+        with self._verrou:
+            self.etapes[etape] = self.etapes.get(etape, 0.0) + duree
+
+    # ---------- lecture ----------
+    def _echantillons(self):
+        """(nom, labels, valeur) de toutes les métriques, au format Prometheus."""
+        duree_run = time.time() - self.debut
+        with self._verrou:
+            for endpoint, h in self.latences.items():
+                for borne, n in zip(h.bornes, h.compte):
+                    yield "api_latence_secondes_bucket", {"endpoint": endpoint, "le": str(borne)}, n
+                yield "api_latence_secondes_bucket", {"endpoint": endpoint, "le": "+Inf"}, h.nb
+                yield "api_latence_secondes_sum", {"endpoint": endpoint}, round(h.somme, 6)
+                yield "api_latence_secondes_count", {"endpoint": endpoint}, h.nb
+            for (endpoint, statut), n in self.appels.items():
+                yield "api_appels_total", {"endpoint": endpoint, "statut": statut}, n
+            for endpoint, n in self.retries.items():
+                yield "api_retries_total", {"endpoint": endpoint}, n
+            for (categorie, keyword), c in self.keywords.items():
+                for resultat, n in c.items():
+                    yield "keyword_posts_total", {"categorie": categorie, "keyword": keyword,
+                                                  "resultat": resultat}, n
+            for borne, n in zip(self.lots.bornes, self.lots.compte):
+                yield "lot_insertion_secondes_bucket", {"le": str(borne)}, n
+            yield "lot_insertion_secondes_bucket", {"le": "+Inf"}, self.lots.nb
+            yield "lot_insertion_secondes_sum", {}, round(self.lots.somme, 6)
+            yield "lot_insertion_secondes_count", {}, self.lots.nb
+            yield "lots_echecs_total", {}, self.lots_echecs
+            yield "posts_inseres_total", {}, self.inseres
+            yield "posts_ignores_total", {}, self.ignores
+            yield "posts_rejetes_total", {}, self.rejetes
+            for etape, s in self.etapes.items():
+                yield "etape_secondes_total", {"etape": etape}, round(s, 3)
+            yield "run_duree_secondes", {}, round(duree_run, 3)
+            yield "posts_par_seconde", {}, round(self.inseres / duree_run, 3) if duree_run else 0.0
+
+    def en_prometheus(self) -> str:
+        lignes, types_vus = [], set()
+        for nom, labels, valeur in self._echantillons():
+            base = nom
+            for suffixe in ("_bucket", "_sum", "_count"):
+                if nom.endswith(suffixe) and nom[:-len(suffixe)] in TYPES_METRIQUES:
+                    base = nom[:-len(suffixe)]
+            if base not in types_vus:
+                types_vus.add(base)
+                lignes.append(f"# TYPE {PREFIXE}{base} {TYPES_METRIQUES[base]}")
+            etiquettes = ",".join(f'{k}="{_echapper(v)}"' for k, v in labels.items())
+            lignes.append(f"{PREFIXE}{nom}{{{etiquettes}}} {valeur}" if etiquettes
+                          else f"{PREFIXE}{nom} {valeur}")
+        return "\n".join(lignes) + "\n"
+
+    def exporter_prometheus(self, chemin: str):
+        with open(chemin, "w", encoding="utf-8") as f:
+            f.write(self.en_prometheus())
+
+    def sauvegarder(self, conn):
+        maintenant = datetime.now(timezone.utc)
+        lignes = [(self.run_id, maintenant, nom, json.dumps(labels, ensure_ascii=False), valeur)
+                  for nom, labels, valeur in self._echantillons()]
+        cur = conn.cursor()
+        try:
+            cur.execute(SQL_CREATE_PIPELINE_METRICS)
+            cur.executemany(SQL_INSERT_PIPELINE_METRICS, lignes)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Échec sauvegarde pipeline_metrics → rollback : {e}")
+        finally:
+            cur.close()
+
+    def resume(self) -> str:
+        duree_run = time.time() - self.debut
+        with self._verrou:
+            lignes = [f"Télémétrie run {self.run_id} : {self.inseres} posts insérés en {duree_run:.0f}s "
+                      f"({self.inseres / duree_run if duree_run else 0:.2f} posts/s)"]
+            for endpoint, h in sorted(self.latences.items()):
+                nb_429 = self.appels.get((endpoint, "429"), 0)
+                lignes.append(f"  {endpoint:<38} {h.nb:>6} appels | moy {h.somme / h.nb * 1000:.0f} ms"
+                              f" | p95 ≤ {h.quantile(0.95)} s | {nb_429} × 429"
+                              f" | {self.retries.get(endpoint, 0)} retries")
+            if self.lots.nb:
+                lignes.append(f"  lots d’insertion : {self.lots.nb} | moy {self.lots.somme / self.lots.nb:.3f} s"
+                              f" | {self.lots_echecs} échecs | {self.rejetes} posts rejetés")
+            if self.etapes:
+                # Temps cumulé (les appels concurrents se recouvrent : la part API peut dépasser 100 %)
+                parts = ", ".join(f"{e} {s:.1f}s ({s / duree_run:.0%})"
+                                  for e, s in sorted(self.etapes.items(), key=lambda x: -x[1]))
+                lignes.append(f"  temps cumulé par étape : {parts}")
+                lignes.append(f"  étape dominante : {max(self.etapes, key=self.etapes.get)}")
+        return "\n".join(lignes)
+
+
+# Instance partagée par tout le process
+metriques = Telemetrie()
+
+
+# ==================================
+# === CLIENT BLUESKY INSTRUMENTÉ ===
+# ==================================
+class ClientInstrumente:
+    """Mesure chaque appel des METHODES du client (live, record ou replay)."""
+
+    def __init__(self, client, telemetrie: Telemetrie = metriques):
+        self._client     = client
+        self._telemetrie = telemetrie
+        espaces = espaces_client(self._appeler)
+        self.app, self.com = espaces.app, espaces.com
+
+    def __getattr__(self, nom):
+        # login, fermer, posts_enregistres… : délégués au client enveloppé
+        return getattr(self._client, nom)
+
+    def _appeler(self, methode: str, *args, **kwargs):
+        fonction = self._client
+        for partie in methode.split("."):
+            fonction = getattr(fonction, partie)
+        endpoint = methode.rsplit(".", 1)[-1]
+        t0 = time.perf_counter()
+        statut = "ok"
+        try:
+            return fonction(*args, **kwargs)
+        except Exception as e:
+            statut = "429" if est_rate_limit(e) else "erreur"
+            raise
+        finally:
+            self._telemetrie.observer_appel(endpoint, time.perf_counter() - t0, statut)
+
+
+def instrumenter(client, telemetrie: Telemetrie = metriques) -> ClientInstrumente:
+    return ClientInstrumente(client, telemetrie)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Parité de la tokenisation partagée (tokenisation_partagee.py)
+────────────────────────────────────────────────────────────────────────────
+Deux PreTrainedTokenizerFast construits séparément à partir d’une même
+petite définition BPE en mémoire : même empreinte, mêmes input_ids, et
+empreinte distincte dès que la longueur de troncature change. Sans modèle
+ni réseau ; ignoré si tokenizers / transformers / torch manquent.
+    python -m pytest backend/trends/tests -q
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("tokenizers")
+pytest.importorskip("transformers")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+
+from tokenisation_partagee import TokenisationPartagee, empreinte_tokenizer
+from inference_lots import tokeniser_textes
+
+TEXTES = ["the new policy looks great", "prices again today", "i love this song",
+          "what a game last night", "the the the the the the the the the the the the"]
+
+
+def tokenizer_bpe(longueur_max: int = 16) -> PreTrainedTokenizerFast:
+    """Petit BPE (caractères + quelques fusions), reconstruit à chaque appel."""
+    caracteres = sorted(set("".join(TEXTES).replace(" ", "")))
+    fusions = [("t", "h"), ("th", "e"), ("a", "t"), ("i", "n"), ("o", "n")]
+    vocab = {"<pad>": 0, "<unk>": 1}
+    for jeton in caracteres + ["".join(f) for f in fusions]:
+        vocab.setdefault(jeton, len(vocab))
+    tok = Tokenizer(models.BPE(vocab, fusions, unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=tok, model_max_length=longueur_max,
+                                   pad_token="<pad>", unk_token="<unk>")
+
+
+def test_empreinte_identique_pour_une_meme_definition():
+    a, b = tokenizer_bpe(), tokenizer_bpe()
+    assert a is not b
+    assert empreinte_tokenizer(a) == empreinte_tokenizer(b)
+    assert tokeniser_textes(a, TEXTES, 16) == tokeniser_textes(b, TEXTES, 16)
+
+
+def test_empreinte_change_avec_la_longueur_max():
+    a, b = tokenizer_bpe(16), tokenizer_bpe(8)
+    assert empreinte_tokenizer(a) != empreinte_tokenizer(b)
+    assert empreinte_tokenizer(a, 16) != empreinte_tokenizer(a, 8)
+
+
+def test_empreinte_stable_apres_un_appel_tronque():
+    # tokeniser_textes laisse truncation / padding sur le backend : sans effet sur l'empreinte
+    a = tokenizer_bpe()
+    avant = empreinte_tokenizer(a)
+    tokeniser_textes(a, TEXTES, 4)
+    assert empreinte_tokenizer(a) == avant
+
+
+def test_tokenisation_partagee_identique_a_celle_de_chaque_modele():
+    tokenizers = {"emotion": tokenizer_bpe(), "irony": tokenizer_bpe(), "courte": tokenizer_bpe(8)}
+    partage = TokenisationPartagee(tokenizers)
+    assert partage.groupes == [["emotion", "irony"]]
+
+    # Ordres différents par modèle : couvre la correspondance texte → ids de l'union
+    travaux = {"emotion": TEXTES, "irony": TEXTES[2:] + TEXTES[:2], "courte": TEXTES}
+    ids = partage.tokeniser(travaux)
+    assert set(ids) == {"emotion", "irony"}
+    for cle in ids:
+        assert ids[cle] == tokeniser_textes(tokenizers[cle], travaux[cle], 16)
+    assert partage.textes_tokenises == len(TEXTES)
+    assert partage.tokenisations_evitees == len(TEXTES)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Tokenisation partagée entre modèles de même tokenizer (utilisée par execution_modeles.py)
+────────────────────────────────────────────────────────────────────────────
+Quatre des six modèles — cardiffnlp_tweet-topic-21-multi (categories),
+cardiffnlp_twitter-roberta-base-irony (irony), ghanashyamvtatti_roberta-fake-news
+(veracity) et j-hartmann_emotion-english-distilroberta-base (emotion) —
+partagent le vocabulaire BPE de RoBERTa : chaque texte d’une passe était
+tokenisé quatre fois, une par modèle.
+
+ • empreinte_tokenizer : sha1 de la définition complète d’un tokenizer
+   rapide (normaliseur, pré-tokeniseur, vocabulaire et fusions BPE,
+   post-traitement, tokens ajoutés) et de la longueur de troncature ; deux
+   tokenizers de même empreinte produisent les mêmes input_ids. Un
+   tokenizer lent (sans backend_tokenizer) n’est jamais partagé ;
+ • TokenisationPartagee : regroupe les modèles par empreinte ; pour une
+   passe {cle: [textes]}, tokenise une seule fois l’union des textes de
+   chaque groupe et rend {cle: [input_ids]}, que chaque modèle consomme par
+   predire_ids (padding, tri par longueur et mini-lots restent les siens).
+
+Harnais de parité — input_ids et scores identiques à la tokenisation par
+modèle, et temps de tokenisation avant / après :
+    python tokenisation_partagee.py --modeles <dossier1>,<dossier2>,... --textes posts.txt
+(code de sortie 1 si un modèle diverge)
+────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+from inference_lots import (
+    ModeleClassification, TAILLE_LOT_INFERENCE, longueur_max_tokens, textes_synthetiques, tokeniser_textes
+)
+
+
+def empreinte_tokenizer(tokenizer, longueur_max: int | None = None) -> str | None:
+    """Empreinte courte du tokenizer, ou None s'il n'est pas partageable (tokenizer lent)."""
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is None:
+        return None
+    definition = json.loads(backend.to_str())
+    # Réglages laissés par un appel précédent : fixés à chaque appel par tokeniser_textes
+    definition.pop("truncation", None)
+    definition.pop("padding", None)
+    longueur_max = longueur_max or longueur_max_tokens(tokenizer)
+    contenu = f"{type(tokenizer).__name__}|{longueur_max}|{json.dumps(definition, sort_keys=True)}"
+    return hashlib.sha1(contenu.encode("utf-8")).hexdigest()[:12]
+
+
+class TokenisationPartagee:
+    """
+    partage = TokenisationPartagee({"emotion": tokenizer, "irony": tokenizer, ...})
+    ids = partage.tokeniser({"emotion": textes, "irony": autres_textes})   # {cle: [input_ids]}
+    # clés absentes de `ids` : modèle seul de son groupe, à tokeniser par lui-même
+    """
+
+    def __init__(self, tokenizers: dict):
+        self.tokenizers = tokenizers
+        self.longueurs  = {cle: longueur_max_tokens(tok) for cle, tok in tokenizers.items()}
+        groupes = {}
+        for cle, tok in tokenizers.items():
+            empreinte = empreinte_tokenizer(tok, self.longueurs[cle])
+            groupes.setdefault(empreinte or f"seul:{cle}", []).append(cle)
+        self.groupes = [cles for cles in groupes.values() if len(cles) > 1]
+        self.textes_tokenises      = 0    # textes réellement passés au tokenizer
+        self.tokenisations_evitees = 0    # (texte, modèle) servis par une tokenisation commune
+        self.secondes              = 0.0
+
+    def tokeniser(self, travaux: dict) -> dict:
+        """travaux = {cle: [textes]} → {cle: [input_ids]} pour les modèles d'un groupe partagé."""
+        ids = {}
+        for cles in self.groupes:
+            actives = [cle for cle in cles if travaux.get(cle)]
+            if len(actives) < 2:
+                continue
+            union = list(dict.fromkeys(texte for cle in actives for texte in travaux[cle]))
+            t0 = time.perf_counter()
+            par_texte = dict(zip(union, tokeniser_textes(self.tokenizers[actives[0]], union,
+                                                         self.longueurs[actives[0]])))
+            self.secondes += time.perf_counter() - t0
+            for cle in actives:
+                ids[cle] = [par_texte[texte] for texte in travaux[cle]]
+            self.textes_tokenises += len(union)
+            self.tokenisations_evitees += sum(len(travaux[cle]) for cle in actives) - len(union)
+        return ids
+
+    def decrire(self) -> str:
+        if not self.groupes:
+            return "tokenisation par modèle"
+        return "tokenisation partagée : " + " | ".join("+".join(cles) for cles in self.groupes)
+
+    def rapport(self) -> str:
+        return (f"Tokenisation partagée : {self.textes_tokenises} textes tokenisés en {self.secondes:.1f}s, "
+                f"{self.tokenisations_evitees} tokenisations évitées "
+                f"(groupes : {' | '.join('+'.join(cles) for cles in self.groupes) or 'aucun'})")
+
+
+# =========================
+# === HARNAIS DE PARITÉ ===
+# =========================
+def verifier_parite(chemins: dict, textes: list[str], taille_lot: int = TAILLE_LOT_INFERENCE) -> list[dict]:
+    """
+    Pour chaque modèle d'un groupe partagé : input_ids et scores obtenus par la
+    tokenisation commune comparés à ceux de sa propre tokenisation. Chaque
+    modèle reçoit les textes dans un ordre différent (décalage), pour couvrir
+    la correspondance texte → ids de l'union.
+    """
+    modeles = {cle: ModeleClassification.charger(chemin) for cle, chemin in chemins.items()}
+    partage = TokenisationPartagee({cle: m.tokenizer for cle, m in modeles.items()})
+    travaux = {cle: textes[i:] + textes[:i] for i, cle in enumerate(modeles)}
+    ids_partages = partage.tokeniser(travaux)
+
+    mesures = []
+    secondes_par_modele = 0.0
+    for cle, modele in modeles.items():
+        t0 = time.perf_counter()
+        ids_propres = modele.tokeniser(travaux[cle])
+        secondes_par_modele += time.perf_counter() - t0
+        if cle not in ids_partages:
+            mesures.append({"modele": cle, "partage": False})
+            print(f"  {cle:<28} non partagé")
+            continue
+        scores_propres  = modele.predire_ids(ids_propres, taille_lot)
+        scores_partages = modele.predire_ids(ids_partages[cle], taille_lot)
+        ecart = max((abs(a[lbl] - b[lbl]) for a, b in zip(scores_propres, scores_partages) for lbl in a),
+                    default=0.0)
+        mesure = {"modele": cle, "partage": True, "ids_identiques": ids_propres == ids_partages[cle],
+                  "scores_identiques": scores_propres == scores_partages, "ecart_score_max": ecart}
+        mesures.append(mesure)
+        print(f"  {cle:<28} ids {'identiques' if mesure['ids_identiques'] else 'DIFFÉRENTS'} | "
+              f"scores {'identiques' if mesure['scores_identiques'] else 'DIFFÉRENTS'} (écart max {ecart:.2e})")
+    print(f"→ {partage.decrire()} | tokenisation : {secondes_par_modele:.2f}s par modèle "
+          f"→ {partage.secondes:.2f}s partagée (groupes seulement)")
+    return mesures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parité de la tokenisation partagée")
+    parser.add_argument("--modeles", required=True, help="Dossiers locaux des modèles, séparés par des virgules")
+    parser.add_argument("--textes", help="Échantillon de test : un post nettoyé par ligne")
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--taille_lot", type=int, default=TAILLE_LOT_INFERENCE)
+    args = parser.parse_args()
+
+    if args.textes:
+        with open(args.textes, encoding="utf-8") as f:
+            textes = [ligne.strip() for ligne in f if ligne.strip()][:args.n]
+    else:
+        textes = textes_synthetiques(args.n)
+    chemins = {os.path.basename(os.path.normpath(c)): c for c in args.modeles.split(",") if c}
+
+    print(f"📊 Parité de tokenisation sur {len(textes)} textes | {len(chemins)} modèles")
+    mesures = verifier_parite(chemins, textes, args.taille_lot)
+    divergents = [m["modele"] for m in mesures
+                  if m["partage"] and not (m["ids_identiques"] and m["scores_identiques"])]
+    if divergents:
+        print(f"❌ Divergence : {', '.join(divergents)}")
+    sys.exit(1 if divergents else 0)